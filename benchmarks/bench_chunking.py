@@ -0,0 +1,120 @@
+"""Benchmark: CodeParser chunking speed and chunk sizes on large generated files
+
+Generates Python, JavaScript and plain-text files of increasing size and
+chunks each one with a character budget and, if the embedding model can be
+loaded, with the model's token budget. Time per line should stay flat as
+files grow; every chunk is re-measured as a whole to check that none
+exceeds the budget (i.e. nothing would be truncated when embedded).
+
+Usage:
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --lines 1000 10000 100000 --model all-MiniLM-L6-v2 --backend onnx
+    python -m benchmarks.bench_chunking --chunk-size 20000      # a few very long chunks
+"""
+
+import argparse
+import random
+import time
+
+from src.code_parser import CodeParser
+from src.encoders import DEFAULT_ONNX_DIR, ENCODER_BACKENDS, create_encoder
+
+WORDS = ["index", "chunk", "query", "vector", "token", "cache", "model", "path", "value", "result"]
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def python_source(lines: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    out = []
+    while len(out) < lines:
+        name = f"{rng.choice(WORDS)}_{len(out)}"
+        if rng.random() < 0.2:
+            out.append(f"class {name.title()}:")
+            out.append(f'    """{_words(rng, 8)}"""')
+            indent = "    "
+        else:
+            indent = ""
+        for _ in range(rng.randint(1, 4)):
+            out.append(f"{indent}def {rng.choice(WORDS)}_{len(out)}(self, {rng.choice(WORDS)}):")
+            for _ in range(rng.randint(3, 40)):
+                out.append(f"{indent}    {rng.choice(WORDS)} = {rng.choice(WORDS)}({_words(rng, rng.randint(1, 12)).replace(' ', ', ')})")
+            out.append(f"{indent}    return {rng.choice(WORDS)}")
+        out.append("")
+    return "\n".join(out[:lines])
+
+
+def javascript_source(lines: int, seed: int = 2) -> str:
+    rng = random.Random(seed)
+    out = []
+    while len(out) < lines:
+        out.append(f"function {rng.choice(WORDS)}{len(out)}({rng.choice(WORDS)}) {{")
+        for _ in range(rng.randint(3, 40)):
+            out.append(f"  {rng.choice(WORDS)}.{rng.choice(WORDS)}({_words(rng, rng.randint(1, 12)).replace(' ', ', ')});")
+        out.append("}")
+        if rng.random() < 0.05:
+            # A minified bundle line
+            out.append(";".join(f"{rng.choice(WORDS)}={rng.randint(0, 999)}" for _ in range(2000)))
+    return "\n".join(out[:lines])
+
+
+def text_source(lines: int, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    return "\n".join(_words(rng, rng.randint(0, 25)) for _ in range(lines))
+
+
+SOURCES = {".py": python_source, ".js": javascript_source, ".txt": text_source}
+
+
+def chunk_size_of(parser: CodeParser, counter, content: str) -> int:
+    """Size of a whole chunk as the embedding model sees it"""
+    if counter is None:
+        return len(content)
+    return counter.count(content)
+
+
+def run(parser: CodeParser, counter, content: str, extension: str, line_count: int):
+    start = time.perf_counter()
+    chunks = parser.parse_file(content, extension)
+    seconds = time.perf_counter() - start
+    sizes = [chunk_size_of(parser, counter, chunk["content"]) for chunk in chunks]
+    return {
+        "seconds": seconds,
+        "us_per_line": seconds / line_count * 1e6,
+        "chunks": len(chunks),
+        "max_size": max(sizes, default=0),
+        "over_budget": sum(size > parser.chunk_size for size in sizes),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Character budget")
+    parser.add_argument("--model", default=None, help="Embedding model for the token budget")
+    parser.add_argument("--backend", default="onnx", choices=ENCODER_BACKENDS)
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    args = parser.parse_args()
+
+    parsers = [(CodeParser(chunk_size=args.chunk_size, chunk_overlap=args.chunk_size // 5), None)]
+    if args.model:
+        encoder = create_encoder(args.model, args.backend, onnx_dir=args.onnx_dir)
+        token_parser = CodeParser.for_encoder(encoder)
+        parsers.append((token_parser, token_parser.token_counter))
+
+    for chunk_parser, counter in parsers:
+        print(f"Budget: {chunk_parser.chunk_size} {chunk_parser.unit}")
+        print(f"  {'file':<5} {'lines':>8} {'seconds':>8} {'us/line':>8} {'chunks':>7} {'max size':>9} {'over':>5}")
+        for extension, make in SOURCES.items():
+            for line_count in args.lines:
+                content = make(line_count)
+                stats = run(chunk_parser, counter, content, extension, line_count)
+                print(f"  {extension:<5} {line_count:8d} {stats['seconds']:8.3f} {stats['us_per_line']:8.2f} "
+                      f"{stats['chunks']:7d} {stats['max_size']:9d} {stats['over_budget']:5d}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
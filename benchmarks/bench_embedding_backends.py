@@ -0,0 +1,137 @@
+"""Benchmark: PyTorch vs ONNX Runtime (fp32 and int8) embedding backends
+
+Encodes the same code chunks with every backend and reports indexing
+throughput, single-query latency and how closely each backend's vectors
+match the PyTorch ones (cosine similarity and top-k neighbour overlap).
+
+Usage:
+    python -m benchmarks.bench_embedding_backends                       # this repo's src/
+    python -m benchmarks.bench_embedding_backends --path /mnt/c/Projects/MyRepo
+    python -m benchmarks.bench_embedding_backends --models all-MiniLM-L6-v2 --backends torch onnx_int8
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.encoders import DEFAULT_ONNX_DIR, ENCODER_BACKENDS, create_encoder
+from src.file_discovery import DEFAULT_EXTENSIONS, iter_source_files
+
+DEFAULT_MODELS = ["all-MiniLM-L6-v2", "paraphrase-multilingual-MiniLM-L12-v2"]
+
+QUERIES = [
+    "how are embeddings cached",
+    "start the file watcher",
+    "def index_project",
+    "token budget for the prompt",
+    "delete chunks of a removed file",
+]
+
+
+def load_chunks(root: Path, limit: int, lines_per_chunk: int = 40):
+    """Split source files into fixed windows of lines"""
+    chunks = []
+    for entry in iter_source_files(str(root), DEFAULT_EXTENSIONS):
+        try:
+            lines = Path(entry.path).read_text(encoding="utf-8", errors="ignore").splitlines()
+        except OSError:
+            continue
+        for start in range(0, len(lines), lines_per_chunk):
+            text = "\n".join(lines[start:start + lines_per_chunk]).strip()
+            if text:
+                chunks.append(text)
+            if len(chunks) >= limit:
+                return chunks
+    return chunks
+
+
+def top_k(vectors: np.ndarray, queries: np.ndarray, k: int):
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def bench_backend(model_name: str, backend: str, chunks, batch_size: int, onnx_dir: str):
+    start = time.perf_counter()
+    encoder = create_encoder(model_name, backend, onnx_dir=onnx_dir)
+    load_seconds = time.perf_counter() - start
+
+    encoder.encode(chunks[:batch_size], batch_size=batch_size)  # warm-up
+    start = time.perf_counter()
+    vectors = encoder.encode(chunks, batch_size=batch_size)
+    encode_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in QUERIES * 4:
+        start = time.perf_counter()
+        encoder.encode([query])
+        latencies.append(time.perf_counter() - start)
+    query_vectors = encoder.encode(QUERIES)
+
+    return {
+        "backend": encoder.backend,
+        "load_seconds": load_seconds,
+        "chunks_per_second": len(chunks) / encode_seconds,
+        "query_ms": statistics.median(latencies) * 1000.0,
+        "memory_mb": encoder.memory_bytes() / (1024 * 1024),
+        "vectors": np.asarray(vectors, dtype=np.float32),
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=str(Path(__file__).resolve().parent.parent / "src"))
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    parser.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    parser.add_argument("--min-similarity", type=float, default=0.98,
+                        help="Exit non-zero if any vector's cosine to PyTorch is below this")
+    args = parser.parse_args()
+
+    chunks = load_chunks(Path(args.path), args.chunks)
+    print(f"{len(chunks)} chunks from {args.path}\n")
+    failed = False
+
+    for model_name in args.models:
+        print(f"Model: {model_name}")
+        print(f"  {'backend':<10} {'load s':>8} {'chunks/s':>9} {'query ms':>9} {'MB':>8} "
+              f"{'cos mean':>9} {'cos min':>8} {f'top{args.top_k}':>7}")
+        reference = None
+        for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+            result = bench_backend(model_name, backend, chunks, args.batch_size, args.onnx_dir)
+            vectors = normalized(result["vectors"])
+            query_vectors = normalized(result["query_vectors"])
+            if reference is None:
+                reference = (vectors, query_vectors, top_k(vectors, query_vectors, args.top_k))
+                similarity = "-"
+            else:
+                cosines = (vectors * reference[0]).sum(axis=1)
+                overlap = statistics.mean(
+                    len(a & b) / args.top_k
+                    for a, b in zip(top_k(vectors, query_vectors, args.top_k), reference[2])
+                )
+                similarity = f"{cosines.mean():9.4f} {cosines.min():8.4f} {overlap:7.2f}"
+                if cosines.min() < args.min_similarity:
+                    failed = True
+            print(f"  {result['backend']:<10} {result['load_seconds']:8.2f} {result['chunks_per_second']:9.1f} "
+                  f"{result['query_ms']:9.2f} {result['memory_mb']:8.1f} {similarity}")
+        print()
+
+    if failed:
+        print(f"FAIL: some vectors have cosine < {args.min_similarity} to the PyTorch backend")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
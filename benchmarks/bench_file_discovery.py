@@ -0,0 +1,86 @@
+"""Benchmark: single scandir walk vs. one rglob per extension
+
+Usage:
+    python -m benchmarks.bench_file_discovery                 # synthetic tree
+    python -m benchmarks.bench_file_discovery --path /mnt/c/Projects/MyRepo
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.file_discovery import DEFAULT_EXTENSIONS, DEFAULT_SKIP_DIRS, iter_source_files
+
+
+def legacy_discover(root: Path, extensions, skip_dirs):
+    """The previous approach: a full tree walk per extension, filtered afterwards"""
+    files = []
+    for ext in extensions:
+        files.extend(root.rglob(f"*{ext}"))
+    return [f for f in files if not any(skip in f.relative_to(root).parts for skip in skip_dirs)]
+
+
+def build_tree(root: Path, source_dirs: int, files_per_dir: int, vendored_dirs: int) -> None:
+    """Create a project with source folders plus a large node_modules and .git"""
+    rng = random.Random(42)
+    extensions = DEFAULT_EXTENSIONS + [".md", ".json", ".txt", ".png"]
+
+    def fill(directory: Path, count: int) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(count):
+            (directory / f"file_{i}{rng.choice(extensions)}").write_text("x = 1\n")
+
+    for d in range(source_dirs):
+        fill(root / "src" / f"pkg_{d // 10}" / f"mod_{d}", files_per_dir)
+    for d in range(vendored_dirs):
+        fill(root / "node_modules" / f"dep_{d}" / "lib", files_per_dir)
+        fill(root / ".git" / "objects" / f"{d:02x}", files_per_dir // 2)
+
+
+def time_it(func, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="Existing project to scan instead of a synthetic tree")
+    parser.add_argument("--source-dirs", type=int, default=200)
+    parser.add_argument("--vendored-dirs", type=int, default=600)
+    parser.add_argument("--files-per-dir", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.path:
+            root = Path(args.path)
+        else:
+            root = Path(tmp)
+            build_tree(root, args.source_dirs, args.files_per_dir, args.vendored_dirs)
+
+        legacy_time, legacy_files = time_it(
+            lambda: legacy_discover(root, DEFAULT_EXTENSIONS, DEFAULT_SKIP_DIRS), args.repeat
+        )
+        walk_time, walk_files = time_it(
+            lambda: [entry.path for entry in iter_source_files(str(root), DEFAULT_EXTENSIONS)],
+            args.repeat
+        )
+
+        legacy_set = {str(f) for f in legacy_files}
+        print(f"Project:          {root}")
+        print(f"rglob x {len(DEFAULT_EXTENSIONS)}:        {legacy_time * 1000:9.1f} ms  ({len(legacy_set)} files)")
+        print(f"scandir walk:     {walk_time * 1000:9.1f} ms  ({len(walk_files)} files)")
+        print(f"Speedup:          {legacy_time / walk_time:9.1f}x")
+        if legacy_set != set(walk_files):
+            print(f"WARNING: file sets differ ({len(legacy_set ^ set(walk_files))} paths)")
+
+
+if __name__ == "__main__":
+    main()
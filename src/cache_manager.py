@@ -1,18 +1,125 @@
-"""Cache Manager using Redis"""
+"""Cache Manager with an in-process L1 in front of optional Redis"""
 
 import logging
 import json
-from typing import Optional, Any
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+# Keys requested per SCAN round trip and removed per UNLINK
+_SCAN_COUNT = 500
+
+
+class LocalCache:
+    """Thread-safe LRU cache with per-entry TTL, bounded by entry count and bytes"""
+    
+    def __init__(self, max_entries: int = 1000, max_size_mb: float = 64.0):
+        self.max_entries = max(max_entries, 0)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        # key -> (expires_at, value, size in bytes); most recently used last
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value)
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._total_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: str, ttl: float) -> None:
+        size = self._entry_size(key, value)
+        if self.max_entries == 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[2]
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[2]
+    
+    def delete_prefix(self, prefix: str) -> int:
+        """Drop every entry whose key starts with prefix"""
+        with self._lock:
+            victims = [key for key in self._entries if key.startswith(prefix)]
+            for key in victims:
+                self._total_bytes -= self._entries.pop(key)[2]
+            return len(victims)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.max_entries > 0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 3),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
 
 class CacheManager:
-    """Manages caching with Redis for faster query responses"""
+    """Two-tier query result cache
+    
+    L1 is a bounded in-process LRU/TTL cache that answers repeated queries
+    without a network round trip. Redis, when configured, is a shared L2:
+    L1 misses fall through to it and its hits are promoted into L1.
+    """
     
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        l1_max_entries: int = 1000,
+        l1_max_size_mb: float = 64.0,
+        l1_ttl_seconds: float = 300.0
+    ):
+        self.local = LocalCache(max_entries=l1_max_entries, max_size_mb=l1_max_size_mb)
+        self.l1_ttl_seconds = l1_ttl_seconds
         self.redis_client = None
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_writes = 0
+        self.l2_errors = 0
         
         if redis_url:
             try:
@@ -29,7 +136,7 @@ class CacheManager:
             except ImportError:
                 logger.warning("Redis package not installed. Install with: pip install redis")
             except Exception as e:
-                logger.warning(f"Redis connection failed: {e}. Cache disabled.")
+                logger.warning(f"Redis connection failed: {e}. Using the in-process cache only.")
                 self.redis_client = None
     
     def _generate_key(self, project_id: str, query: str) -> str:
@@ -39,41 +146,66 @@ class CacheManager:
         query_hash = hashlib.sha256(query.encode()).hexdigest()
         return f"rag:query:{project_hash}:{query_hash}"
     
-    def get(self, project_id: str, query: str) -> Optional[str]:
-        """Get cached result for query in a project"""
+    def get_local(self, project_id: str, query: str) -> Optional[str]:
+        """Look up a result in the in-process L1 only; never blocks on the network"""
+        return self.local.get(self._generate_key(project_id, query))
+    
+    @property
+    def has_remote(self) -> bool:
+        """Whether a Redis L2 is connected"""
+        return self.redis_client is not None
+    
+    def get(self, project_id: str, query: str, check_local: bool = True) -> Optional[str]:
+        """Get cached result for query in a project, from L1 or else from Redis
+        
+        Pass check_local=False after a get_local miss to consult only Redis.
+        """
+        key = self._generate_key(project_id, query)
+        if check_local:
+            result = self.local.get(key)
+            if result is not None:
+                logger.debug(f"L1 cache hit for project: {project_id}, query: {query[:50]}...")
+                return result
         if not self.redis_client:
             return None
         try:
-            key = self._generate_key(project_id, query)
             result = self.redis_client.get(key)
             if result:
+                self.l2_hits += 1
                 logger.debug(f"Cache hit for project: {project_id}, query: {query[:50]}...")
+                self.local.set(key, result, self.l1_ttl_seconds)
                 return result
+            self.l2_misses += 1
             logger.debug(f"Cache miss for project: {project_id}, query: {query[:50]}...")
             return None
         except Exception as e:
+            self.l2_errors += 1
             logger.error(f"Cache get error: {e}")
             return None
     
     def set(self, project_id: str, query: str, result: str, ttl: int = 3600) -> bool:
         """Set cached result for a project with TTL (time to live in seconds)"""
+        key = self._generate_key(project_id, query)
+        self.local.set(key, result, min(ttl, self.l1_ttl_seconds))
         if not self.redis_client:
-            return False
+            return True
         try:
-            key = self._generate_key(project_id, query)
             self.redis_client.setex(key, ttl, result)
+            self.l2_writes += 1
             logger.debug(f"Cached result for project: {project_id}, query: {query[:50]}... (TTL: {ttl}s)")
             return True
         except Exception as e:
+            self.l2_errors += 1
             logger.error(f"Cache set error: {e}")
             return False
     
     def delete(self, project_id: str, query: str) -> bool:
         """Delete cached result for query in a project"""
+        key = self._generate_key(project_id, query)
+        self.local.delete(key)
         if not self.redis_client:
-            return False
+            return True
         try:
-            key = self._generate_key(project_id, query)
             self.redis_client.delete(key)
             logger.debug(f"Deleted cache for project: {project_id}, query: {query[:50]}...")
             return True
@@ -81,41 +213,70 @@ class CacheManager:
             logger.error(f"Cache delete error: {e}")
             return False
     
+    @staticmethod
+    def _key_prefix(project_id: Optional[str]) -> str:
+        if project_id:
+            project_hash = hashlib.sha256(project_id.encode()).hexdigest()[:8]
+            return f"rag:query:{project_hash}:"
+        return "rag:query:"
+    
+    def clear_local(self, project_id: Optional[str] = None) -> int:
+        """Drop L1 entries of a project (or all); Redis is left to expire by TTL"""
+        return self.local.delete_prefix(self._key_prefix(project_id))
+    
     def clear_all(self, project_id: str = None) -> bool:
-        """Clear all cached results, or only for a specific project if project_id is given"""
+        """Clear all cached results, or only for a specific project if project_id is given
+        
+        Redis keys are found with incremental SCAN and removed with UNLINK, so
+        the server is never blocked by a scan over the whole keyspace.
+        """
+        prefix = self._key_prefix(project_id)
+        self.local.delete_prefix(prefix)
         if not self.redis_client:
-            return False
+            return True
         try:
-            if project_id:
-                project_hash = hashlib.sha256(project_id.encode()).hexdigest()[:8]
-                pattern = f"rag:query:{project_hash}:*"
-            else:
-                pattern = "rag:query:*"
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
-                logger.info(f"Cleared {len(keys)} cached queries for pattern {pattern}")
+            pattern = f"{prefix}*"
+            deleted = 0
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=_SCAN_COUNT):
+                batch.append(key)
+                if len(batch) >= _SCAN_COUNT:
+                    deleted += self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis_client.unlink(*batch)
+            if deleted:
+                logger.info(f"Cleared {deleted} cached queries for pattern {pattern}")
             return True
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
             return False
     
     def get_stats(self) -> dict:
-        """Get cache statistics"""
+        """Get L1 and Redis cache statistics from counters maintained by this process"""
+        stats = {"enabled": True, "l1": self.local.get_stats()}
         if not self.redis_client:
-            return {"enabled": False}
+            stats["l2"] = {"enabled": False}
+            return stats
         
+        lookups = self.l2_hits + self.l2_misses
+        stats["l2"] = {
+            "enabled": True,
+            "hits": self.l2_hits,
+            "misses": self.l2_misses,
+            "hit_rate": round(self.l2_hits / lookups, 3) if lookups else 0.0,
+            "writes": self.l2_writes,
+            "errors": self.l2_errors,
+        }
         try:
+            # O(1) server-wide counters; no key enumeration
             info = self.redis_client.info("stats")
-            keys_count = len(self.redis_client.keys("rag:query:*"))
-            
-            return {
-                "enabled": True,
-                "total_connections": info.get("total_connections_received", 0),
-                "cached_queries": keys_count,
-                "hits": info.get("keyspace_hits", 0),
-                "misses": info.get("keyspace_misses", 0),
-            }
+            stats["l2"].update(
+                total_connections=info.get("total_connections_received", 0),
+                server_hits=info.get("keyspace_hits", 0),
+                server_misses=info.get("keyspace_misses", 0),
+            )
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
-            return {"enabled": True, "error": str(e)}
+            stats["l2"]["error"] = str(e)
+        return stats
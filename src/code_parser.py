@@ -1,208 +1,329 @@
 """Code Parser for intelligent chunking"""
 
 import logging
-from typing import List, Dict, Any
+from itertools import accumulate
+from typing import List, Dict, Any, Optional, Tuple
 import re
 
+from .code_structure import CodeUnit, brace_units, python_units
+from .tokenization import TokenCounter
+
 logger = logging.getLogger(__name__)
 
+# Lines carried over into the next chunk when a code chunk is split for size
+OVERLAP_LINES = 5
+
+# (line number, text, size) of one line, or of one piece of an overlong line
+Segment = Tuple[int, str, int]
+
+# Lines between units with nothing worth a chunk: braces, comments, a namespace header
+_TRIVIAL_GAP = re.compile(r'(?:\s+|[{}();,]|//[^\n]*|/\*.*?\*/|namespace\s+[\w.:]+)*', re.S)
+
+
+class _ChunkBuilder:
+    """Groups consecutive segments into chunks, keeping a running size
+
+    Sizes come precomputed per line, so deciding where a chunk ends costs
+    one addition per line instead of re-measuring the whole chunk. The
+    current chunk is segments[first:end]; add() always takes segments[end].
+    """
+
+    def __init__(
+        self,
+        parser: "CodeParser",
+        segments: List[Segment],
+        overlap_lines: Optional[int] = OVERLAP_LINES,
+        start: int = 0,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.parser = parser
+        self.segments = segments
+        # At most this many lines of overlap; None lets chunk_overlap alone decide
+        self.overlap_lines = overlap_lines
+        self.chunks: List[Dict[str, Any]] = []
+        self.first = start
+        self.end = start
+        self.size = 0
+        # Given metadata describes every chunk built here, including continuations
+        self.keep_metadata = metadata is not None
+        self.metadata: Dict[str, Any] = metadata or {}
+
+    @property
+    def start_line(self) -> int:
+        return self.segments[self.first][0] if self.first < len(self.segments) else 0
+
+    def begin(self, metadata: Dict[str, Any]) -> None:
+        """End the current chunk; the next one starts with the next segment"""
+        self.flush()
+        self.metadata = metadata
+
+    def add(self, size: int) -> None:
+        if self.size + size > self.parser.chunk_size and self.end > self.first:
+            self._split(size)
+        self.end += 1
+        self.size += size
+
+    def flush(self) -> None:
+        if self.end > self.first:
+            part = self.segments[self.first:self.end]
+            self.chunks.append(self.parser._create_chunk(
+                [segment[1] for segment in part], part[0][0], part[-1][0], self.metadata
+            ))
+        self.first = self.end
+        self.size = 0
+
+    def _split(self, incoming: int) -> None:
+        """Emit the full chunk and keep a tail of it as overlap for the next"""
+        limit = self.end - self.first - 1
+        if self.overlap_lines is not None:
+            limit = min(limit, self.overlap_lines)
+        budget = min(self.parser.chunk_overlap, self.parser.chunk_size - incoming)
+        keep = kept = 0
+        while keep < limit and kept + self.segments[self.end - 1 - keep][2] <= budget:
+            kept += self.segments[self.end - 1 - keep][2]
+            keep += 1
+
+        self.flush()
+        self.first = self.end - keep
+        self.size = kept
+        if not self.keep_metadata:
+            self.metadata = {}
+
+
+class _UnitChunker:
+    """Chunks along code units: one per unit that fits, packed lines in between
+
+    A unit too large for one chunk is split along its members (the methods
+    of a class, the declarations of a namespace) if it has any, else into
+    consecutive chunks that all keep its metadata.
+    """
+
+    def __init__(self, parser: "CodeParser", segments: List[Segment]):
+        self.parser = parser
+        self.segments = segments
+        last_line = segments[-1][0]
+        # Index of the first segment of each line, and one past the last
+        self.first_segment = [0] * (last_line + 2)
+        for i in range(len(segments) - 1, -1, -1):
+            self.first_segment[segments[i][0]] = i
+        self.first_segment[last_line + 1] = len(segments)
+        self.offsets = list(accumulate((segment[2] for segment in segments), initial=0))
+        self.chunks: List[Dict[str, Any]] = []
+
+    def size(self, start_line: int, end_line: int) -> int:
+        return self.offsets[self.first_segment[end_line + 1]] - self.offsets[self.first_segment[start_line]]
+
+    def emit(self, units: List[CodeUnit], start_line: int, end_line: int, metadata: Dict[str, Any]) -> None:
+        """Chunks for lines start_line..end_line, which contain the given units"""
+        gap_start = start_line
+        for unit in units:
+            unit_start = max(unit.start_line, gap_start)
+            unit_end = min(unit.end_line, end_line)
+            if unit_end < unit_start:
+                continue
+            if unit.kind == 'block' and self.size(unit_start, unit_end) <= self.parser.chunk_size:
+                # Small unnamed blocks (initializers, properties) stay with the lines around them
+                continue
+            self.gap(gap_start, unit_start - 1, metadata)
+            self.unit(unit, unit_start, unit_end)
+            gap_start = unit_end + 1
+        self.gap(gap_start, end_line, metadata)
+
+    def gap(self, start_line: int, end_line: int, metadata: Dict[str, Any]) -> None:
+        if start_line > end_line:
+            return
+        text = '\n'.join(
+            segment[1] for segment in
+            self.segments[self.first_segment[start_line]:self.first_segment[end_line + 1]]
+        )
+        if not _TRIVIAL_GAP.fullmatch(text):
+            self.lines(start_line, end_line, metadata)
+
+    def unit(self, unit: CodeUnit, start_line: int, end_line: int) -> None:
+        # A namespace is only a wrapper; its declarations are chunked on their own
+        if unit.members is not None and (
+            unit.kind == 'namespace' or self.size(start_line, end_line) > self.parser.chunk_size
+        ):
+            members = unit.members()
+            if members:
+                self.emit(members, start_line, end_line, unit.metadata)
+                return
+        self.lines(start_line, end_line, unit.metadata)
+
+    def lines(self, start_line: int, end_line: int, metadata: Dict[str, Any]) -> None:
+        """Lines as chunks of at most chunk_size; blank lines at either end are dropped"""
+        segments = self.segments
+        start, end = self.first_segment[start_line], self.first_segment[end_line + 1]
+        while start < end and not segments[start][1].strip():
+            start += 1
+        while end > start and not segments[end - 1][1].strip():
+            end -= 1
+        if start == end:
+            return
+        chunk = _ChunkBuilder(self.parser, segments, start=start, metadata=dict(metadata))
+        for i in range(start, end):
+            chunk.add(segments[i][2])
+        chunk.flush()
+        self.chunks.extend(chunk.chunks)
+
 
 class CodeParser:
-    """Parse source code files into intelligent chunks"""
-    
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Parse source code files into intelligent chunks
+
+    chunk_size and chunk_overlap count characters, or tokens of the
+    embedding model when a token_counter is given. Token budgets keep every
+    chunk within the model's max sequence length, so no content is cut off
+    when the chunk is embedded.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        token_counter: Optional[TokenCounter] = None
+    ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-    
+        self.token_counter = token_counter
+
+    @classmethod
+    def for_encoder(cls, encoder) -> "CodeParser":
+        """Parser whose chunks fit the encoder's max sequence length"""
+        counter = encoder.token_counter()
+        max_seq_length = encoder.get_max_seq_length()
+        if counter is None or not max_seq_length:
+            logger.warning(f"No tokenizer for {encoder.model_name}; chunk size is measured in characters")
+            return cls()
+        chunk_size = max_seq_length - counter.special_tokens
+        return cls(chunk_size=chunk_size, chunk_overlap=chunk_size // 5, token_counter=counter)
+
+    @property
+    def unit(self) -> str:
+        return "tokens" if self.token_counter is not None else "chars"
+
     def parse_file(self, content: str, file_extension: str) -> List[Dict[str, Any]]:
         """Parse file content into chunks with metadata"""
-        
+        segments = self._segments(content)
+
         # Choose parsing strategy based on file type
         if file_extension in ['.py']:
-            return self._parse_python(content)
+            return self._parse_python(content, segments)
         elif file_extension in ['.js', '.ts', '.jsx', '.tsx']:
-            return self._parse_javascript(content)
+            return self._parse_javascript(content, segments)
         elif file_extension in ['.java', '.cs', '.cpp', '.c', '.h']:
-            return self._parse_c_like(content)
+            return self._parse_c_like(content, segments)
         else:
             # Generic chunking for unknown file types
-            return self._parse_generic(content)
-    
-    def _parse_python(self, content: str) -> List[Dict[str, Any]]:
-        """Parse Python code into semantic chunks"""
-        chunks = []
+            return self._parse_generic(segments)
+
+    def _measure(self, lines: List[str]) -> List[int]:
+        if self.token_counter is None:
+            # +1 for the newline joining it to the next line
+            return [len(line) + 1 for line in lines]
+        return self.token_counter.count_lines(lines)
+
+    def _segments(self, content: str) -> List[Segment]:
+        """Number and measure every line once; lines over chunk_size are cut into pieces"""
         lines = content.split('\n')
-        
+        sizes = self._measure(lines)
+        if max(sizes) <= self.chunk_size:
+            return list(zip(range(1, len(lines) + 1), lines, sizes))
+        segments = []
+        for line_num, (line, size) in enumerate(zip(lines, sizes), 1):
+            if size <= self.chunk_size:
+                segments.append((line_num, line, size))
+            else:
+                segments.extend(self._cut(line_num, line, size))
+        return segments
+
+    def _cut(self, line_num: int, line: str, size: int) -> List[Segment]:
+        """Cut a line longer than a whole chunk (minified code, data) into pieces that fit"""
+        # Aim for 90% of a chunk; pieces that still do not fit are cut again
+        width = max(int(len(line) * self.chunk_size * 0.9 / size), 1)
+        pieces = [line[i:i + width] for i in range(0, len(line), width)]
+        segments = []
+        for piece, piece_size in zip(pieces, self._measure(pieces)):
+            if piece_size <= self.chunk_size or len(piece) == 1:
+                segments.append((line_num, piece, piece_size))
+            else:
+                segments.extend(self._cut(line_num, piece, piece_size))
+        return segments
+
+    def _parse_python(self, content: str, segments: List[Segment]) -> List[Dict[str, Any]]:
+        """Parse Python code into semantic chunks"""
+        units = python_units(content)
+        if units is None:
+            return self._parse_python_lines(segments)
+        return self._parse_units(units, segments)
+
+    def _parse_python_lines(self, segments: List[Segment]) -> List[Dict[str, Any]]:
+        """Line-based fallback for Python the ast module cannot parse"""
+        chunk = _ChunkBuilder(self, segments)
+
         # Try to identify functions and classes
-        current_chunk = []
-        current_metadata = {}
         in_function = False
         in_class = False
         indent_level = 0
-        start_line = 1
-        
-        for line_num, line in enumerate(lines, 1):
+
+        for line_num, line, size in segments:
             stripped = line.lstrip()
-            
+
             # Detect class definition
             if stripped.startswith('class '):
-                if current_chunk:
-                    chunks.append(self._create_chunk(
-                        current_chunk, start_line, line_num - 1, current_metadata
-                    ))
-                current_chunk = [line]
                 match = re.match(r'class\s+(\w+)', stripped)
-                current_metadata = {'class_name': match.group(1) if match else 'Unknown'}
+                chunk.begin({'class_name': match.group(1) if match else 'Unknown'})
                 in_class = True
                 indent_level = len(line) - len(stripped)
-                start_line = line_num
-            
+
             # Detect function definition
             elif stripped.startswith('def '):
-                if current_chunk and not in_class:
-                    chunks.append(self._create_chunk(
-                        current_chunk, start_line, line_num - 1, current_metadata
-                    ))
-                    current_chunk = []
-                    start_line = line_num
-                
                 match = re.match(r'def\s+(\w+)', stripped)
+                name = match.group(1) if match else 'Unknown'
                 if in_class:
-                    current_metadata['function_name'] = match.group(1) if match else 'Unknown'
+                    chunk.metadata['function_name'] = name
                 else:
-                    current_metadata = {'function_name': match.group(1) if match else 'Unknown'}
+                    chunk.begin({'function_name': name})
                     in_function = True
                     indent_level = len(line) - len(stripped)
-                
-                current_chunk.append(line)
-            
+
             # Check if we're exiting a function/class (dedent to same or less level)
             elif (in_function or in_class) and stripped and not stripped.startswith('#'):
                 current_indent = len(line) - len(stripped)
-                if current_indent <= indent_level and line_num > start_line + 1:
+                if current_indent <= indent_level and line_num > chunk.start_line + 1:
                     # End of function/class
-                    chunks.append(self._create_chunk(
-                        current_chunk, start_line, line_num - 1, current_metadata
-                    ))
-                    current_chunk = [line]
-                    current_metadata = {}
+                    chunk.begin({})
                     in_function = False
                     in_class = False
-                    start_line = line_num
-                else:
-                    current_chunk.append(line)
-            else:
-                current_chunk.append(line)
-            
-            # If chunk is getting too large, split it
-            if len('\n'.join(current_chunk)) > self.chunk_size:
-                chunks.append(self._create_chunk(
-                    current_chunk, start_line, line_num, current_metadata
-                ))
-                # Keep overlap
-                overlap_lines = current_chunk[-5:] if len(current_chunk) > 5 else current_chunk
-                current_chunk = overlap_lines
-                start_line = line_num - len(overlap_lines) + 1
-                current_metadata = {}
-        
-        # Add remaining chunk
-        if current_chunk:
-            chunks.append(self._create_chunk(
-                current_chunk, start_line, len(lines), current_metadata
-            ))
-        
-        return chunks if chunks else self._parse_generic(content)
-    
-    def _parse_javascript(self, content: str) -> List[Dict[str, Any]]:
+
+            # Splits with overlap if the chunk is getting too large
+            chunk.add(size)
+
+        chunk.flush()
+        return chunk.chunks if chunk.chunks else self._parse_generic(segments)
+
+    def _parse_javascript(self, content: str, segments: List[Segment]) -> List[Dict[str, Any]]:
         """Parse JavaScript/TypeScript code"""
-        chunks = []
-        lines = content.split('\n')
-        
-        current_chunk = []
-        current_metadata = {}
-        start_line = 1
-        
-        for line_num, line in enumerate(lines, 1):
-            stripped = line.strip()
-            
-            # Detect function/class definitions
-            if any(keyword in stripped for keyword in ['function ', 'class ', 'const ', 'let ', 'var ']):
-                if '=' in stripped or stripped.startswith('function') or stripped.startswith('class'):
-                    if current_chunk:
-                        chunks.append(self._create_chunk(
-                            current_chunk, start_line, line_num - 1, current_metadata
-                        ))
-                    current_chunk = [line]
-                    start_line = line_num
-                    
-                    # Try to extract name
-                    for pattern in [r'function\s+(\w+)', r'class\s+(\w+)', r'(?:const|let|var)\s+(\w+)']:
-                        match = re.search(pattern, stripped)
-                        if match:
-                            current_metadata = {'function_name': match.group(1)}
-                            break
-            else:
-                current_chunk.append(line)
-            
-            # Split if too large
-            if len('\n'.join(current_chunk)) > self.chunk_size:
-                chunks.append(self._create_chunk(
-                    current_chunk, start_line, line_num, current_metadata
-                ))
-                overlap_lines = current_chunk[-5:] if len(current_chunk) > 5 else current_chunk
-                current_chunk = overlap_lines
-                start_line = line_num - len(overlap_lines) + 1
-                current_metadata = {}
-        
-        if current_chunk:
-            chunks.append(self._create_chunk(
-                current_chunk, start_line, len(lines), current_metadata
-            ))
-        
-        return chunks if chunks else self._parse_generic(content)
-    
-    def _parse_c_like(self, content: str) -> List[Dict[str, Any]]:
+        return self._parse_units(brace_units(content, regex_literals=True), segments)
+
+    def _parse_c_like(self, content: str, segments: List[Segment]) -> List[Dict[str, Any]]:
         """Parse C-like languages (Java, C#, C++)"""
-        # Similar to JavaScript parsing but with different patterns
-        return self._parse_javascript(content)
-    
-    def _parse_generic(self, content: str) -> List[Dict[str, Any]]:
+        return self._parse_units(brace_units(content), segments)
+
+    def _parse_units(self, units: List[CodeUnit], segments: List[Segment]) -> List[Dict[str, Any]]:
+        """A chunk per function or class, split further only where one is too large"""
+        chunker = _UnitChunker(self, segments)
+        chunker.emit(units, 1, segments[-1][0], {})
+        return chunker.chunks if chunker.chunks else self._parse_generic(segments)
+
+    def _parse_generic(self, segments: List[Segment]) -> List[Dict[str, Any]]:
         """Generic chunking strategy for unknown file types"""
-        chunks = []
-        lines = content.split('\n')
-        
-        current_chunk = []
-        start_line = 1
-        
-        for line_num, line in enumerate(lines, 1):
-            current_chunk.append(line)
-            
-            # Split at chunk size with overlap
-            if len('\n'.join(current_chunk)) > self.chunk_size:
-                chunks.append(self._create_chunk(
-                    current_chunk, start_line, line_num, {}
-                ))
-                
-                # Calculate overlap
-                overlap_chars = 0
-                overlap_lines = []
-                for rev_line in reversed(current_chunk):
-                    overlap_chars += len(rev_line)
-                    overlap_lines.insert(0, rev_line)
-                    if overlap_chars >= self.chunk_overlap:
-                        break
-                
-                current_chunk = overlap_lines
-                start_line = line_num - len(overlap_lines) + 1
-        
-        # Add remaining chunk
-        if current_chunk:
-            chunks.append(self._create_chunk(
-                current_chunk, start_line, len(lines), {}
-            ))
-        
-        return chunks
-    
+        # Split at chunk size, overlapping by up to chunk_overlap
+        chunk = _ChunkBuilder(self, segments, overlap_lines=None)
+        for _, _, size in segments:
+            chunk.add(size)
+        chunk.flush()
+        return chunk.chunks
+
     def _create_chunk(
         self,
         lines: List[str],
@@ -212,7 +333,7 @@ class CodeParser:
     ) -> Dict[str, Any]:
         """Create a chunk dictionary"""
         content = '\n'.join(lines)
-        
+
         chunk = {
             'content': content,
             'type': 'code',
@@ -220,5 +341,5 @@ class CodeParser:
             'end_line': end_line,
             **metadata
         }
-        
+
         return chunk
@@ -0,0 +1,342 @@
+"""Declarations of a source file as line spans, for chunking along them
+
+Python is read with the ast module. JavaScript/TypeScript, Java, C#, C and
+C++ go through a small scanner that skips comments, string, template and
+regex literals and matches brackets; statements are then cut at `;`, `,`
+and closing braces on each nesting level. Neither needs grammars or
+compiled extensions.
+"""
+
+import ast
+import bisect
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class CodeUnit:
+    """A function, class or other block spanning whole lines"""
+    start_line: int
+    end_line: int
+    metadata: Dict[str, Any]
+    # "function", "class", "namespace", or "block" for anything unnamed
+    kind: str
+    # Declarations directly inside, for splitting a unit too large for one chunk
+    members: Optional[Callable[[], List["CodeUnit"]]] = None
+
+
+def _leading_comments(lines: List[str], start_line: int, floor: int, prefixes: Tuple[str, ...]) -> int:
+    """Move start_line up over comment lines directly above it, not past floor"""
+    while start_line - 1 > floor and lines[start_line - 2].strip().startswith(prefixes):
+        start_line -= 1
+    return start_line
+
+
+# Python
+
+def python_units(content: str) -> Optional[List[CodeUnit]]:
+    """Top-level functions and classes, or None if the code does not parse"""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    return _python_units(tree.body, content.split('\n'), {}, 0)
+
+
+def _python_units(body: List[ast.stmt], lines: List[str], enclosing: Dict[str, Any], floor: int) -> List[CodeUnit]:
+    units = []
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            metadata = {**enclosing, 'function_name': node.name}
+            kind = 'function'
+            members = None
+        elif isinstance(node, ast.ClassDef):
+            metadata = {'class_name': node.name}
+            kind = 'class'
+            members = (
+                lambda node=node, metadata=metadata:
+                _python_units(node.body, lines, metadata, node.lineno)
+            )
+        else:
+            floor = getattr(node, 'end_lineno', node.lineno)
+            continue
+        # Decorators and the comments right above belong to the definition
+        start_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        start_line = _leading_comments(lines, start_line, floor, ('#',))
+        units.append(CodeUnit(start_line, node.end_lineno, metadata, kind, members))
+        floor = node.end_lineno
+    return units
+
+
+# Brace languages
+
+# Comments and literals are matched whole so brackets inside them are skipped.
+# Single-line strings end at the line end even if unterminated.
+_BRACE_TOKENS = re.compile(
+    r'//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)'
+    r'|@"(?:[^"]|"")*"?'
+    r'|"(?:\\.|[^"\\\n])*"?'
+    r"|'(?:\\.|[^'\\\n])*'?"
+    r'|`(?:\\.|[^`\\])*`?'
+    r'|[{}()\[\];,/]',
+    re.S
+)
+_REGEX_LITERAL = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*')
+# A `/` after one of these (or at the start of a line) opens a JS regex literal
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^\n')
+_OPENERS = {'{': '}', '(': ')', '[': ']'}
+_CLOSERS = {'}': '{', ')': '(', ']': '['}
+
+_CLASS_HEADER = re.compile(
+    r'\b(enum\s+(?:class|struct)|class|interface|struct|enum|record|trait|namespace|module|impl|object)'
+    r'\s+([A-Za-z_$][\w$]*(?:(?:\.|::)[A-Za-z_$][\w$]*)*)'
+)
+_FUNCTION_HEADERS = [
+    re.compile(r'\bfunction\b\s*\*?\s*([A-Za-z_$][\w$]*)'),
+    re.compile(r'\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]*)?='),
+    # name( for methods and C/C++ functions, incl. Foo::bar( and generic<T>(
+    re.compile(r'(?<![.\w$])(~?[A-Za-z_$][\w$]*(?:::~?[A-Za-z_$][\w$]*)*)\s*(?:<[^<>()]*>)?\s*\('),
+]
+_NOT_NAMES = {
+    'if', 'for', 'foreach', 'while', 'switch', 'catch', 'return', 'function', 'typeof', 'sizeof',
+    'new', 'await', 'using', 'lock', 'synchronized', 'super', 'this', 'with', 'fixed', 'checked',
+}
+_ANNOTATION = re.compile(r'@[\w.]+(?:\s*\([^()]*\))?')
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?(?:\*/|\Z)', re.S)
+# Lines that start a new statement in JavaScript written without semicolons
+_JS_STATEMENT_START = re.compile(
+    r'\s*(?:export|import|const|let|var|function|class|async\s+function|interface|type|enum|declare|abstract)\b'
+)
+_NON_SPACE = re.compile(r'\S')
+_PREPROCESSOR = re.compile(
+    r'\s*#\s*(?:include|define|undef|if|ifdef|ifndef|elif|else|endif|pragma|region|endregion|error|warning|line)\b'
+)
+# Declarations that carry no name of their own, and C# attributes on their own line
+_HEADER_NOISE = re.compile(r'^\s*(?:#.*|\[[^\n]*\]\s*)$', re.M)
+
+
+def _header_metadata(header: str, enclosing: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Metadata and kind ("class", "namespace", "function" or "block") of a block's header"""
+    header = _ANNOTATION.sub(' ', _HEADER_NOISE.sub(' ', _COMMENT.sub(' ', header)))
+    paren = header.find('(')
+    match = _CLASS_HEADER.search(header)
+    if match and (paren < 0 or match.start() < paren):
+        keyword, name = match.group(1), match.group(2)
+        if keyword in ('namespace', 'module'):
+            return dict(enclosing), 'namespace'
+        return {'class_name': name}, 'class'
+    # An open parenthesis means the block is an argument, as in foo(() => {
+    in_call = header.count('(') > header.count(')')
+    for pattern in _FUNCTION_HEADERS[:2] if in_call else _FUNCTION_HEADERS:
+        for match in pattern.finditer(header):
+            if match.group(1) not in _NOT_NAMES:
+                return {**enclosing, 'function_name': match.group(1)}, 'function'
+    return dict(enclosing), 'block'
+
+
+class _BraceScanner:
+    """Bracket structure of a brace-language file"""
+
+    def __init__(self, content: str, regex_literals: bool):
+        self.content = content
+        self.lines = content.split('\n')
+        self.line_starts = [0]
+        for line in self.lines[:-1]:
+            self.line_starts.append(self.line_starts[-1] + len(line) + 1)
+        self.regex_literals = regex_literals
+        # Lines on which a new statement starts regardless of terminators:
+        # declarations in JavaScript without semicolons, and around C preprocessor lines
+        self.boundaries: List[int] = []
+        if regex_literals:
+            self.comment_prefixes = ('@', '//', '/*', '*')
+            self.boundaries = [
+                line_num for line_num, line in enumerate(self.lines, 1) if _JS_STATEMENT_START.match(line)
+            ]
+        else:
+            self.comment_prefixes = ('@', '[', '//', '/*', '*')
+            for line_num, line in enumerate(self.lines, 1):
+                if _PREPROCESSOR.match(line):
+                    self.boundaries.extend((line_num, line_num + 1))
+            self.boundaries = sorted(set(self.boundaries))
+        # (character, offset) of every bracket, `;` and `,` outside comments and literals
+        self.events: List[Tuple[str, int]] = []
+        # Index of the matching closer for each opener event
+        self.match: Dict[int, int] = {}
+        self._scan()
+
+    def _scan(self) -> None:
+        content = self.content
+        events = self.events
+        stack: List[int] = []
+        pos = 0
+        while True:
+            token = _BRACE_TOKENS.search(content, pos)
+            if token is None:
+                break
+            pos = token.end()
+            text = token.group()
+            if len(text) != 1 or text in '"\'`':
+                # A comment or literal; a lone quote is an unterminated string
+                continue
+            if text == '/':
+                if self.regex_literals and self._regex_allowed(token.start()):
+                    literal = _REGEX_LITERAL.match(content, token.start())
+                    if literal:
+                        pos = literal.end()
+                continue
+            index = len(events)
+            events.append((text, token.start()))
+            if text in _OPENERS:
+                stack.append(index)
+            elif text in _CLOSERS:
+                # Unbalanced closers (macros, broken code) close what they can
+                for depth in range(len(stack) - 1, -1, -1):
+                    if events[stack[depth]][0] == _CLOSERS[text]:
+                        self.match[stack[depth]] = index
+                        del stack[depth:]
+                        break
+
+    def _regex_allowed(self, pos: int) -> bool:
+        previous = pos - 1
+        while previous >= 0 and self.content[previous] in ' \t\r':
+            previous -= 1
+        if previous < 0 or self.content[previous] in _REGEX_PRECEDERS:
+            return True
+        word = re.search(r'(\w+)$', self.content[max(previous - 10, 0):previous + 1])
+        return bool(word) and word.group(1) in ('return', 'typeof', 'case', 'in', 'of', 'yield')
+
+    def line_of(self, pos: int) -> int:
+        return bisect.bisect_right(self.line_starts, pos)
+
+    def units(self, lo: int, hi: int, start_pos: int, enclosing: Dict[str, Any]) -> List[CodeUnit]:
+        """Block statements among events lo..hi-1, which begin after start_pos"""
+        units = []
+        for start_line, end_line, block, header_end in self._statements(lo, hi, start_pos):
+            if block is None:
+                continue
+            header = self.content[self.line_starts[start_line - 1]:header_end]
+            metadata, kind = _header_metadata(header, enclosing)
+            members = None
+            close = self.match.get(block)
+            if kind in ('class', 'namespace', 'block') and close is not None:
+                inner = metadata if kind == 'class' else enclosing
+                members = (
+                    lambda block=block, close=close, inner=inner:
+                    self.units(block + 1, close, self.events[block][1] + 1, inner)
+                )
+            units.append(CodeUnit(start_line, end_line, metadata, kind, members))
+        return units
+
+    def _statements(self, lo: int, hi: int, start_pos: int) -> List[List[Any]]:
+        """[start_line, end_line, body "{" event, header end offset] per statement
+
+        A statement ends at `;` or `,` on its own level, at a `}` closing a
+        block opened on that level, or before a boundary line. One that
+        starts on the line where the previous one ended is merged into it,
+        as chunks hold whole lines. The body is the statement's first block
+        on its own level, else its first block at all (foo(() => {...})).
+        """
+        statements: List[List[Any]] = []
+        events = self.events
+        boundaries = self.boundaries
+        depth = 0
+        # The statement's body "{" and where its header ends; top: opened on this level
+        block = header_end = None
+        top = False
+        last_line = self.line_of(start_pos)
+        k = lo
+        while k < hi:
+            char, pos = events[k]
+            line = self.line_of(pos)
+            if depth == 0 and boundaries:
+                i = bisect.bisect_right(boundaries, last_line)
+                if i < len(boundaries) and boundaries[i] <= line:
+                    j = bisect.bisect_right(boundaries, line) - 1
+                    # The declaration on the boundary line starts with the comments above it
+                    floor = self.line_of(start_pos)
+                    close_line = _leading_comments(self.lines, boundaries[i], floor, self.comment_prefixes)
+                    self._close_statement(
+                        statements, start_pos, self.line_starts[close_line - 1], block, header_end, trailing=True
+                    )
+                    block = header_end = None
+                    top = False
+                    next_line = _leading_comments(self.lines, boundaries[j], floor, self.comment_prefixes)
+                    start_pos = self.line_starts[max(next_line, close_line) - 1]
+            last_line = line
+
+            end = False
+            if char in _OPENERS:
+                if char == '{' and block is None:
+                    block, header_end = k, pos
+                if depth == 0 and char == '{' and self.match.get(k, hi) < hi:
+                    if not top:
+                        block, header_end, top = k, pos, True
+                    # Jump over the block; nothing inside decides where this statement ends
+                    k = self.match[k]
+                    pos = events[k][1]
+                    last_line = self.line_of(pos)
+                    end = True
+                else:
+                    depth += 1
+            elif char in _CLOSERS:
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                end = True
+            if end:
+                self._close_statement(statements, start_pos, pos, block, header_end)
+                start_pos = pos + 1
+                block = header_end = None
+                top = False
+            k += 1
+        # Trailing code without a terminator
+        end_pos = events[hi][1] if hi < len(events) else len(self.content)
+        self._close_statement(statements, start_pos, end_pos, block, header_end, trailing=True)
+        return statements
+
+    def _close_statement(
+        self,
+        statements: List[List[Any]],
+        start_pos: int,
+        end_pos: int,
+        block: Optional[int],
+        header_end: Optional[int],
+        trailing: bool = False
+    ) -> None:
+        """Record the statement in start_pos..end_pos (exclusive if trailing)"""
+        limit = end_pos if trailing else end_pos + 1
+        first = _NON_SPACE.search(self.content, start_pos, limit)
+        # A comment after the previous statement, on its line, stays with it
+        while (
+            first is not None and statements
+            and self.line_of(first.start()) <= statements[-1][1]
+            and self.content.startswith(('//', '/*'), first.start())
+        ):
+            comment = _COMMENT.match(self.content, first.start())
+            first = _NON_SPACE.search(self.content, comment.end(), limit)
+        if first is None:
+            return
+        start_line = self.line_of(first.start())
+        end_line = self.line_of(end_pos - 1 if trailing else end_pos)
+        if trailing:
+            # Up to the last line with code, not the container's closing line
+            while end_line > start_line and not self.lines[end_line - 1].strip():
+                end_line -= 1
+        if statements and start_line <= statements[-1][1]:
+            previous = statements[-1]
+            previous[1] = max(previous[1], end_line)
+            if previous[2] is None:
+                previous[2], previous[3] = block, header_end
+            return
+        statements.append([start_line, end_line, block, header_end])
+
+
+def brace_units(content: str, regex_literals: bool = False) -> List[CodeUnit]:
+    """Top-level blocks (functions, classes, namespaces, ...) of a brace-language file
+
+    regex_literals enables JavaScript's /regex/ literals, in which brackets
+    are skipped like in strings.
+    """
+    scanner = _BraceScanner(content, regex_literals)
+    return scanner.units(0, len(scanner.events), 0, {})
@@ -1,26 +1,86 @@
 """Context Manager for optimizing prompts"""
 
 import logging
+from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
-import tiktoken
+
+from .tokenization import DEFAULT_PROMPT_MODEL, count_prompt_tokens, prompt_encoding
 
 logger = logging.getLogger(__name__)
 
+# Map file extension to language identifier for syntax highlighting
+_LANGUAGES = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.ts': 'typescript',
+    '.jsx': 'jsx',
+    '.tsx': 'tsx',
+    '.java': 'java',
+    '.cs': 'csharp',
+    '.cpp': 'cpp',
+    '.c': 'c',
+    '.h': 'cpp',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.swift': 'swift',
+    '.kt': 'kotlin',
+    '.vue': 'vue',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'scss',
+    '.json': 'json',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.md': 'markdown',
+}
+
+
+def format_chunk(document: str, metadata: Dict[str, Any]) -> str:
+    """A chunk as it appears in the prompt: header with its location, then the code"""
+    file_path = metadata.get('file_path', 'unknown')
+    chunk_header = f"\n## File: {file_path}\n"
+    
+    if metadata.get('function_name'):
+        chunk_header += f"Function: {metadata['function_name']}\n"
+    if metadata.get('class_name'):
+        chunk_header += f"Class: {metadata['class_name']}\n"
+    if metadata.get('start_line'):
+        chunk_header += f"Lines: {metadata['start_line']}-{metadata.get('end_line', '?')}\n"
+    
+    language = _LANGUAGES.get(str(metadata.get('file_extension', '')).lower(), '')
+    chunk_header += f"```{language}\n"
+    chunk_footer = "\n```\n"
+    return chunk_header + document + chunk_footer
+
+
+def chunk_token_counts(documents: List[str], metadatas: List[Dict[str, Any]]) -> List[int]:
+    """Prompt tokens of each formatted chunk; stored in chunk metadata at index time"""
+    return count_prompt_tokens([format_chunk(doc, metadata) for doc, metadata in zip(documents, metadatas)])
+
+
+@dataclass
+class BuiltContext:
+    """A rendered prompt together with what went into it"""
+    prompt: str
+    included_chunks: int
+    token_count: int
+
 
 class ContextManager:
     """Manages context optimization and token counting"""
     
-    def __init__(self, max_tokens: int = 4000, model: str = "gpt-4"):
+    def __init__(self, max_tokens: int = 4000, model: str = DEFAULT_PROMPT_MODEL):
         self.max_tokens = max_tokens
         self.model = model
         
-        # Initialize tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(model)
-        except KeyError:
-            # Fallback to cl100k_base for unknown models
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
-            logger.warning(f"Model {model} not found, using cl100k_base encoding")
+        # One encoding per process, shared by every project
+        self.tokenizer = prompt_encoding(model)
+        # Counts stored at index time are only valid for the encoding they were made with
+        self.use_stored_counts = self.tokenizer is prompt_encoding()
+        # The fixed part of the prompt preamble, around the query
+        self._preamble_tokens = self.count_tokens("# Relevant Code Context\nQuery: \n\n")
     
     def count_tokens(self, text: str) -> int:
         """Count tokens in text"""
@@ -38,6 +98,15 @@ class ContextManager:
         metadatas: List[Dict[str, Any]]
     ) -> str:
         """Build optimized context that fits within token limit"""
+        return self.build_context(query, documents, metadatas).prompt
+    
+    def build_context(
+        self,
+        query: str,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> BuiltContext:
+        """Build optimized context and report chunk and token counts for it"""
         
         # Reserve tokens for query and formatting
         query_tokens = self.count_tokens(query)
@@ -49,85 +118,70 @@ class ContextManager:
         context_parts.append("# Relevant Code Context\n")
         context_parts.append(f"Query: {query}\n\n")
         
-        used_tokens = self.count_tokens("".join(context_parts))
+        used_tokens = query_tokens + self._preamble_tokens
+        token_counts = self.chunk_token_counts(documents, metadatas)
         
         # Add documents in order of relevance
         included_files = set()
+        included_chunks = 0
         
-        for doc, metadata in zip(documents, metadatas):
-            # Create formatted chunk
+        for doc, metadata, chunk_tokens in zip(documents, metadatas, token_counts):
             file_path = metadata.get('file_path', 'unknown')
-            chunk_type = metadata.get('chunk_type', 'code')
-            
-            # Build chunk header
-            chunk_header = f"\n## File: {file_path}\n"
-            
-            if metadata.get('function_name'):
-                chunk_header += f"Function: {metadata['function_name']}\n"
-            if metadata.get('class_name'):
-                chunk_header += f"Class: {metadata['class_name']}\n"
-            if metadata.get('start_line'):
-                chunk_header += f"Lines: {metadata['start_line']}-{metadata.get('end_line', '?')}\n"
-            
-            chunk_header += f"```{self._get_language_from_extension(metadata.get('file_extension', ''))}\n"
-            chunk_footer = "\n```\n"
-            
-            # Assemble full chunk
-            full_chunk = chunk_header + doc + chunk_footer
-            chunk_tokens = self.count_tokens(full_chunk)
+            full_chunk = format_chunk(doc, metadata)
             
             # Check if we have room
             if used_tokens + chunk_tokens > available_tokens:
-                logger.info(f"Token limit reached. Included {len(context_parts) - 2} chunks")
+                logger.info(f"Token limit reached. Included {included_chunks} chunks")
                 break
             
             context_parts.append(full_chunk)
             included_files.add(file_path)
+            included_chunks += 1
             used_tokens += chunk_tokens
         
         # Add summary footer
-        context_parts.append(f"\n---\n")
-        context_parts.append(f"Included {len(included_files)} files with {len(context_parts) - 3} code chunks.\n")
-        context_parts.append(f"Total tokens: ~{used_tokens}\n")
+        footer = (
+            f"\n---\n"
+            f"Included {len(included_files)} files with {included_chunks} code chunks.\n"
+            f"Total tokens: ~{used_tokens}\n"
+        )
+        context_parts.append(footer)
+        # Only the footer is new text, so the prompt is never tokenized twice
+        token_count = used_tokens + self.count_tokens(footer)
         
         optimized_context = "".join(context_parts)
         
         logger.info(
             f"Built context: {len(included_files)} files, "
-            f"{len(context_parts) - 3} chunks, ~{used_tokens} tokens"
+            f"{included_chunks} chunks, ~{token_count} tokens"
         )
         
-        return optimized_context
+        return BuiltContext(
+            prompt=optimized_context,
+            included_chunks=included_chunks,
+            token_count=token_count
+        )
+    
+    def chunk_token_counts(self, documents: List[str], metadatas: List[Dict[str, Any]]) -> List[int]:
+        """Token count of each formatted chunk, from its metadata where the index stored one
+        
+        Chunks indexed before counts were stored are counted here, in one batch.
+        """
+        counts: List[Optional[int]] = [
+            metadata.get('token_count') if self.use_stored_counts else None for metadata in metadatas
+        ]
+        missing = [i for i, count in enumerate(counts) if not isinstance(count, int)]
+        if missing:
+            computed = count_prompt_tokens(
+                [format_chunk(documents[i], metadatas[i]) for i in missing], self.model
+            )
+            for i, count in zip(missing, computed):
+                counts[i] = count
+        return counts
     
     def _get_language_from_extension(self, ext: str) -> str:
         """Map file extension to language identifier for syntax highlighting"""
-        ext_map = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'jsx',
-            '.tsx': 'tsx',
-            '.java': 'java',
-            '.cs': 'csharp',
-            '.cpp': 'cpp',
-            '.c': 'c',
-            '.h': 'cpp',
-            '.go': 'go',
-            '.rs': 'rust',
-            '.rb': 'ruby',
-            '.php': 'php',
-            '.swift': 'swift',
-            '.kt': 'kotlin',
-            '.vue': 'vue',
-            '.html': 'html',
-            '.css': 'css',
-            '.scss': 'scss',
-            '.json': 'json',
-            '.yaml': 'yaml',
-            '.yml': 'yaml',
-            '.md': 'markdown',
-        }
-        return ext_map.get(ext.lower(), '')
+        return _LANGUAGES.get(ext.lower(), '')
     
     def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
         """Truncate text to fit within token limit"""
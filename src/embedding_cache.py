@@ -0,0 +1,251 @@
+"""Persistent, content-addressed embedding cache"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of host parameters per statement
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """Stable key for a chunk's text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case so trivially different queries share an embedding"""
+    return " ".join(query.split()).lower()
+
+
+class EmbeddingCache:
+    """SQLite-backed cache of embeddings keyed by (model name, chunk-text hash)
+
+    Identical chunks are embedded once per model, no matter how often a file is
+    reindexed or in how many checkouts it appears. The cache is capped by size
+    and evicts the least recently used vectors first.
+    """
+
+    def __init__(self, db_path: str, max_size_mb: int = 1024):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+
+        self._total_bytes, self._entries = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+        ).fetchone()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        logger.info(
+            f"Embedding cache opened: {self.db_path} "
+            f"({self._entries} vectors, {self._total_bytes / (1024 * 1024):.1f} MB)"
+        )
+
+    def get_many(self, model: str, hashes: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for text hashes; missing entries come back as None"""
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        now = time.time_ns()
+
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                part = unique[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                # Refresh recency so hot vectors survive eviction
+                keys = list(found)
+                for start in range(0, len(keys), _SQL_BATCH):
+                    part = keys[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(part))
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? "
+                        f"WHERE model = ? AND text_hash IN ({placeholders})",
+                        [now, model, *part]
+                    )
+
+            results = [found.get(key) for key in hashes]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, hashes: List[str], vectors: np.ndarray) -> None:
+        """Store vectors and evict old entries if the cache grew past its cap"""
+        if not hashes:
+            return
+        now = time.time_ns()
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in zip(hashes, vectors)
+        ]
+
+        with self._lock:
+            # Applied to the counters only once the rows are committed
+            added_bytes = added_entries = 0
+            self._conn.execute("BEGIN")
+            try:
+                for model_name, key, blob, used in rows:
+                    previous = self._conn.execute(
+                        "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?",
+                        (model_name, key)
+                    ).fetchone()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) "
+                        "VALUES (?, ?, ?, ?)",
+                        (model_name, key, blob, used)
+                    )
+                    if previous:
+                        added_bytes -= previous[0]
+                    else:
+                        added_entries += 1
+                    added_bytes += len(blob)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._total_bytes += added_bytes
+            self._entries += added_entries
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used vectors until the cache is at 90% of its cap"""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target and self._entries > 0:
+            rows = self._conn.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT ?",
+                (_SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for rowid, size in rows:
+                victims.append(rowid)
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            placeholders = ",".join("?" * len(victims))
+            self._conn.execute(f"DELETE FROM embeddings WHERE rowid IN ({placeholders})", victims)
+            self._entries -= len(victims)
+            self.evictions += len(victims)
+        logger.debug(f"Embedding cache evicted down to {self._total_bytes / (1024 * 1024):.1f} MB")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "path": str(self.db_path),
+                "entries": self._entries,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """In-memory LRU of query embeddings keyed by (model name, normalized query)
+
+    Independent of the rendered-prompt cache, so the same question asked of
+    another project with the same model, or with a different result size,
+    skips the model call.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, model: str, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for normalized queries; missing entries come back as None"""
+        results = []
+        with self._lock:
+            for query in queries:
+                vector = self._entries.get((model, query))
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end((model, query))
+                    self.hits += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, model: str, queries: List[str], vectors: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for query, vector in zip(queries, vectors):
+                self._entries[(model, query)] = np.asarray(vector, dtype=np.float32)
+                self._entries.move_to_end((model, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "models": len({model for model, _ in self._entries}),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every VectorStore in the process
+query_embedding_cache = QueryEmbeddingCache()
@@ -0,0 +1,290 @@
+"""Embedding model backends: PyTorch via sentence-transformers, or ONNX Runtime"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from .tokenization import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# torch: sentence-transformers as before
+# onnx: the same network exported to ONNX, fp32
+# onnx_int8: the ONNX export with dynamically quantized int8 weights
+ENCODER_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+DEFAULT_ONNX_DIR = "/app/data/onnx_models"
+
+
+class Encoder:
+    """Turns texts into sentence embeddings
+
+    Every backend returns the same shape of float32 vectors, so a
+    VectorStore can use any of them.
+    """
+
+    backend = ""
+    tokenizer = None
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._token_counter: Optional[TokenCounter] = None
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        raise NotImplementedError
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        raise NotImplementedError
+
+    def get_max_seq_length(self) -> Optional[int]:
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Estimated size of the loaded weights"""
+        return 0
+
+    def token_counter(self) -> Optional[TokenCounter]:
+        """Counts tokens like this model's tokenizer; None if it has none"""
+        if self._token_counter is None and self.tokenizer is not None:
+            self._token_counter = TokenCounter(self.tokenizer)
+        return self._token_counter
+
+
+class SentenceTransformerEncoder(Encoder):
+    """fp32 PyTorch inference through sentence-transformers"""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        # Imported here: sentence_transformers pulls in torch, which takes
+        # seconds and is not needed until the first model loads
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.model.get_sentence_embedding_dimension()
+
+    def get_max_seq_length(self) -> Optional[int]:
+        return self.model.get_max_seq_length()
+
+    @property
+    def tokenizer(self):
+        return getattr(self.model, "tokenizer", None)
+
+    def memory_bytes(self) -> int:
+        try:
+            params = sum(p.numel() * p.element_size() for p in self.model.parameters())
+            buffers = sum(b.numel() * b.element_size() for b in self.model.buffers())
+            return params + buffers
+        except Exception as e:
+            logger.debug(f"Could not estimate model memory: {e}")
+            return 0
+
+
+class OnnxEncoder(Encoder):
+    """ONNX Runtime inference on CPU, optionally with int8 weights
+
+    The transformer is exported from sentence-transformers once and cached
+    under onnx_dir together with its tokenizer and pooling settings; later
+    loads need neither torch nor sentence-transformers. Pooling and
+    normalization are done in NumPy the way the model's own modules do them.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = True, onnx_dir: str = DEFAULT_ONNX_DIR):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.backend = "onnx_int8" if quantize else "onnx"
+        model_dir = Path(onnx_dir) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        if not (model_dir / "encoder.json").exists():
+            export_onnx_model(model_name, model_dir)
+        model_path = model_dir / "model.onnx"
+        if quantize:
+            model_path = model_dir / "model_int8.onnx"
+            if not model_path.exists():
+                quantize_onnx_model(model_dir / "model.onnx", model_path)
+
+        with open(model_dir / "encoder.json", "r") as f:
+            self.config = json.load(f)
+        self.max_seq_length = self.config["max_seq_length"]
+        self.pooling = self.config["pooling"]
+        self.normalize = self.config["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._memory_bytes = sum(
+            path.stat().st_size for path in _weight_files(model_dir)
+            if path.name.startswith("model_int8") == quantize
+        )
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.config["dimension"]), dtype=np.float32)
+
+        # Longest first, like sentence-transformers, so batches pad little
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        output = np.empty((len(texts), self.config["dimension"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            output[batch] = self._pool(hidden, attention_mask)
+
+        if self.normalize:
+            norms = np.linalg.norm(output, axis=1, keepdims=True)
+            output /= np.maximum(norms, 1e-12)
+        return output
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[:, :, None].astype(hidden.dtype)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.config["dimension"]
+
+    def get_max_seq_length(self) -> Optional[int]:
+        return self.max_seq_length
+
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+
+def export_onnx_model(model_name: str, model_dir: Path, opset: int = 14) -> None:
+    """Export a sentence-transformers model's transformer to ONNX
+
+    Writes model.onnx, tokenizer.json and encoder.json (pooling mode,
+    normalization, sequence length); encoder.json is written last and marks
+    a complete export.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    logger.info(f"Exporting {model_name} to ONNX in {model_dir}")
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    pooling = next((m for m in model if isinstance(m, Pooling)), None)
+    if pooling is None or pooling.pooling_mode_mean_tokens:
+        pooling_mode = "mean"
+    elif pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling.pooling_mode_max_tokens:
+        pooling_mode = "max"
+    else:
+        raise ValueError(f"Unsupported pooling for ONNX export of {model_name}")
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    tmp_dir = model_dir.with_name(model_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    sample = transformer.tokenizer(["def export(): pass"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer.auto_model.eval()),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(tmp_dir / "model.onnx"),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(str(tmp_dir))
+    with open(tmp_dir / "encoder.json", "w") as f:
+        json.dump({
+            "model": model_name,
+            "max_seq_length": model.get_max_seq_length(),
+            "dimension": model.get_sentence_embedding_dimension(),
+            "pooling": pooling_mode,
+            "normalize": any(isinstance(m, Normalize) for m in model),
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+        }, f, indent=2)
+
+    shutil.rmtree(model_dir, ignore_errors=True)
+    os.replace(tmp_dir, model_dir)
+    logger.info(f"Exported {model_name} to ONNX")
+
+
+def _weight_files(model_dir: Path) -> List[Path]:
+    """The ONNX graphs and external weight files in an export directory"""
+    return [
+        path for path in model_dir.iterdir()
+        if path.is_file() and path.suffix not in (".json", ".txt", ".model")
+    ]
+
+
+def quantize_onnx_model(source: Path, target: Path) -> None:
+    """Write a copy of an ONNX model with dynamically quantized int8 weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Quantizing {source} to int8")
+    tmp_target = target.with_name(target.stem + ".tmp.onnx")
+    # Models over the 2 GB protobuf limit (e.g. multilingual-e5-large) keep
+    # their weights in external data files
+    external_data = sum(
+        path.stat().st_size for path in _weight_files(source.parent)
+        if not path.name.startswith("model_int8")
+    ) > 2 * 1024 ** 3
+    quantize_dynamic(
+        str(source),
+        str(tmp_target),
+        weight_type=QuantType.QInt8,
+        use_external_data_format=external_data
+    )
+    os.replace(tmp_target, target)
+
+
+def create_encoder(model_name: str, backend: str = "torch", onnx_dir: str = DEFAULT_ONNX_DIR) -> Encoder:
+    """Load a model with the requested backend
+
+    Falls back to the PyTorch backend when onnxruntime is not installed.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if backend != "torch":
+        try:
+            return OnnxEncoder(model_name, quantize=backend == "onnx_int8", onnx_dir=onnx_dir)
+        except ImportError as e:
+            logger.warning(f"ONNX backend unavailable ({e}), using PyTorch for {model_name}")
+    return SentenceTransformerEncoder(model_name)
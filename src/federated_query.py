@@ -0,0 +1,118 @@
+"""Concurrent search across several indexed projects"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .context_manager import ContextManager
+from .rag_system import LocalRAGSystem, QueryResult
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_distance(distance: float, mode: str) -> float:
+    """Map a distance onto [0, 1] so hits from different projects can be ranked together
+
+    Cosine distances span [0, 2]; lexical pseudo-distances and exact symbol
+    hits already lie in [0, 1].
+    """
+    if mode in ("vector", "hybrid"):
+        return min(max(distance / 2.0, 0.0), 1.0)
+    return min(max(distance, 0.0), 1.0)
+
+
+async def federated_query(
+    rag_systems: Dict[str, LocalRAGSystem],
+    query: str,
+    max_results: int,
+    batcher,
+    context_manager: ContextManager,
+    retrieval_mode: Optional[str] = None
+) -> Tuple[QueryResult, List[Dict[str, Any]]]:
+    """Search every given project concurrently and build one prompt from the best hits
+
+    Each project contributes up to max_results candidates; a heap over the
+    normalized distances picks the overall top max_results. Returns the
+    merged result and a per-project breakdown with latency and hit counts.
+    """
+    async def search_project(project_path: str, rag_system: LocalRAGSystem):
+        start = time.perf_counter()
+        try:
+            search_results, mode = await rag_system.asearch(
+                query, max_results, batcher, retrieval_mode
+            )
+            error = None
+        except Exception as e:
+            logger.error(f"Federated search failed for {project_path}: {e}", exc_info=True)
+            search_results, mode, error = {}, retrieval_mode or rag_system.retrieval_mode, str(e)
+        return project_path, search_results, mode, time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        search_project(project_path, rag_system)
+        for project_path, rag_system in rag_systems.items()
+    ))
+    search_seconds = time.perf_counter() - start
+
+    candidates = []
+    breakdown = []
+    for project_path, search_results, mode, seconds, error in outcomes:
+        project_name = rag_systems[project_path].project_root.name
+        documents = (search_results.get("documents") or [[]])[0]
+        metadatas = (search_results.get("metadatas") or [[]])[0]
+        distances = (search_results.get("distances") or [[]])[0]
+        for rank, (document, metadata, distance) in enumerate(zip(documents, metadatas, distances)):
+            # Relative paths are ambiguous across projects
+            metadata = {
+                **(metadata or {}),
+                "project": project_path,
+                "file_path": f"{project_name}/{(metadata or {}).get('file_path', '')}",
+            }
+            # The stored count is for the header without the project prefix; recounted when the context is built
+            metadata.pop("token_count", None)
+            # rank breaks ties so equal distances keep each project's own order
+            candidates.append((normalize_distance(distance, mode), rank, document, metadata))
+        entry = {
+            "project_path": project_path,
+            "retrieval_mode": mode,
+            "hits": len(documents),
+            "latency_ms": round(seconds * 1000.0, 2),
+        }
+        if error:
+            entry["error"] = error
+        breakdown.append(entry)
+
+    best = heapq.nsmallest(max_results, candidates, key=lambda item: (item[0], item[1]))
+    for entry in breakdown:
+        entry["selected"] = sum(1 for _, _, _, metadata in best if metadata["project"] == entry["project_path"])
+
+    if not best:
+        prompt = f"Query: {query}\n\nNo relevant code context found."
+        result = QueryResult(
+            query=query,
+            prompt=prompt,
+            token_count=context_manager.count_tokens(prompt),
+            retrieval_mode="federated"
+        )
+    else:
+        documents = [document for _, _, document, _ in best]
+        metadatas = [metadata for _, _, _, metadata in best]
+        context = await batcher.run(context_manager.build_context, query, documents, metadatas)
+        result = QueryResult(
+            query=query,
+            prompt=context.prompt,
+            chunks=documents,
+            distances=[distance for distance, _, _, _ in best],
+            metadatas=metadatas,
+            context_chunks=context.included_chunks,
+            token_count=context.token_count,
+            retrieval_mode="federated"
+        )
+
+    logger.info(
+        f"Federated query over {len(rag_systems)} projects: {len(best)} chunks "
+        f"in {search_seconds * 1000.0:.1f}ms"
+    )
+    return result, breakdown
@@ -0,0 +1,60 @@
+"""Single-pass source file discovery"""
+
+import logging
+import os
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXTENSIONS = [
+    ".py", ".js", ".ts", ".jsx", ".tsx",
+    ".java", ".cs", ".cpp", ".h", ".go", ".rs",
+    ".vue", ".rb", ".php", ".swift", ".kt"
+]
+
+# Directories that never contain project sources worth indexing
+DEFAULT_SKIP_DIRS = frozenset({
+    "node_modules", ".git", "__pycache__", "venv", "env", ".venv",
+    "dist", "build", ".next", "target", "bin", "obj", ".vs", ".idea"
+})
+
+
+def iter_source_files(
+    root: str,
+    extensions: Iterable[str],
+    skip_dirs: Optional[Iterable[str]] = None,
+    errors: Optional[List[str]] = None
+) -> Iterator[os.DirEntry]:
+    """Walk root once and lazily yield files whose extension is in extensions
+
+    Ignored directories are pruned before descending, so their contents are
+    never listed. Directory symlinks are not followed to avoid cycles.
+    Yields os.DirEntry objects; their stat() result is cached by the OS walk.
+    Directories that cannot be listed are skipped and appended to errors, so
+    callers can tell a complete walk from one with missing subtrees.
+    """
+    wanted = frozenset(extensions)
+    skip = DEFAULT_SKIP_DIRS if skip_dirs is None else frozenset(skip_dirs)
+    stack = [root]
+
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in skip:
+                                subdirs.append(entry.path)
+                        elif os.path.splitext(entry.name)[1] in wanted and entry.is_file():
+                            yield entry
+                    except OSError as e:
+                        logger.debug(f"Skipping unreadable entry {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Cannot list directory {directory}: {e}")
+            if errors is not None:
+                errors.append(directory)
+            continue
+        # Reverse so directories are visited in listing order
+        stack.extend(reversed(subdirs))
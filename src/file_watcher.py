@@ -1,16 +1,80 @@
 """File Watcher for automatic project reindexing"""
 
 import logging
+import os
+import re
 import time
 import platform
+import threading
+from collections import deque
 from pathlib import Path
-from typing import Optional, Set, Dict
+from typing import Optional, Set, Dict, Tuple
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
 logger = logging.getLogger(__name__)
 
+# Filesystems whose changes are made outside this kernel, so inotify never
+# reports them (WSL drives, Docker Desktop host mounts, network shares)
+POLLING_FILESYSTEMS = {
+    "9p", "drvfs", "cifs", "smb3", "smbfs", "nfs", "nfs4", "vboxsf",
+    "grpcfuse", "fuse.grpcfuse", "fakeowner", "fuse.sshfs", "prl_fs", "vmhgfs"
+}
+
+
+def get_mount_fs_type(path: str) -> Optional[str]:
+    """Filesystem type of the mount that contains path (Linux only)"""
+    try:
+        real_path = os.path.realpath(path)
+        best_mount, best_type = "", None
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Spaces in mount points are escaped as \040
+                mount_point = fields[1].replace("\\040", " ")
+                inside = (
+                    real_path == mount_point
+                    or real_path.startswith(mount_point.rstrip("/") + "/")
+                )
+                if inside and len(mount_point) >= len(best_mount):
+                    best_mount, best_type = mount_point, fields[2]
+        return best_type
+    except OSError:
+        return None
+
+
+def select_watcher_backend(path: str, preference: str = "auto") -> Tuple[str, str]:
+    """Decide between native events and polling for a project path
+    
+    Returns (backend, reason) where backend is "native" or "polling".
+    """
+    if preference in ("native", "polling"):
+        return preference, "configured"
+    
+    if platform.system() != "Linux":
+        return "native", f"{platform.system()} has native change notifications"
+    
+    if re.match(r"^/mnt/[a-zA-Z](/|$)", path):
+        return "polling", "Windows drive mounted into WSL"
+    
+    fs_type = get_mount_fs_type(path)
+    if fs_type in POLLING_FILESYSTEMS:
+        return "polling", f"{fs_type} mount does not deliver inotify events"
+    return "native", f"{fs_type or 'local'} filesystem supports inotify"
+
+
+def _thread_cpu_seconds(thread: threading.Thread) -> Optional[float]:
+    """CPU time consumed by a thread, where the platform can tell"""
+    if thread.ident is None or not hasattr(time, "pthread_getcpuclockid"):
+        return None
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (OSError, ProcessLookupError):
+        return None
+
 
 class ProjectFileWatcher(FileSystemEventHandler):
     """Watches project directories for file changes and triggers reindexing"""
@@ -37,12 +101,46 @@ class ProjectFileWatcher(FileSystemEventHandler):
             '.cpp', '.h', '.go', '.rs', '.vue', '.php', '.rb'
         }
         
-        # Debouncing: track pending changes
-        self.pending_changes: Dict[str, float] = {}
-        self.last_reindex_time = 0
+        # Debouncing: path -> (time of last event, "changed" or "deleted")
+        self.pending_changes: Dict[str, Tuple[float, str]] = {}
+        # Guards pending_changes; the worker sleeps on it until an event or deadline
+        self._pending_lock = threading.Condition()
+        self._stopping = False
+        self._reindex_in_flight = False
+        self._worker: Optional[threading.Thread] = None
+        
+        # Seconds from saving a file until its new chunks are searchable
+        self.latencies: deque = deque(maxlen=500)
+        self.reindexed_files = 0
+        self.removed_files = 0
+        self.events = 0
+        self.coalesced_events = 0
+        self.events_during_reindex = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.wakeups = 0
         
         logger.info(f"File watcher initialized with extensions: {self.file_extensions}")
     
+    def start(self, name: str = "watcher"):
+        """Start the worker thread that reindexes debounced changes"""
+        if self._worker is not None:
+            return
+        self._stopping = False
+        self._worker = threading.Thread(
+            target=self._run_worker, name=f"rag-watch-{name}", daemon=True
+        )
+        self._worker.start()
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker; a reindex that is already running is allowed to finish"""
+        with self._pending_lock:
+            self._stopping = True
+            self._pending_lock.notify()
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)
+            self._worker = None
+    
     def _should_process_file(self, file_path: str) -> bool:
         """Check if file should be processed based on extension"""
         path = Path(file_path)
@@ -71,7 +169,7 @@ class ProjectFileWatcher(FileSystemEventHandler):
             return
         
         # Add to pending changes with current timestamp
-        self.pending_changes[event.src_path] = time.time()
+        self._queue_change(event.src_path, "changed")
         logger.info(f"🔔 File modified detected: {event.src_path}")
     
     def on_created(self, event: FileSystemEvent):
@@ -82,7 +180,7 @@ class ProjectFileWatcher(FileSystemEventHandler):
         if not self._should_process_file(event.src_path):
             return
         
-        self.pending_changes[event.src_path] = time.time()
+        self._queue_change(event.src_path, "changed")
         logger.info(f"🔔 File created detected: {event.src_path}")
     
     def on_deleted(self, event: FileSystemEvent):
@@ -93,50 +191,163 @@ class ProjectFileWatcher(FileSystemEventHandler):
         if not self._should_process_file(event.src_path):
             return
         
-        # Remove from vector store
+        # Removed from the vector store once the debounce period passes, so an
+        # editor's delete-and-recreate save collapses into a single change
+        self._queue_change(event.src_path, "deleted")
         logger.info(f"File deleted: {event.src_path}")
-        try:
-            # TODO: Implement vector store deletion by file path
-            pass
-        except Exception as e:
-            logger.error(f"Error removing deleted file from index: {e}")
     
-    def process_pending_changes(self):
-        """Process pending file changes after debounce period"""
-        current_time = time.time()
-        files_to_reindex = []
+    def on_moved(self, event: FileSystemEvent):
+        """Handle renames as a deletion of the source and a change of the destination"""
+        if event.is_directory:
+            return
         
-        # Find files that have passed the debounce period
-        for file_path, change_time in list(self.pending_changes.items()):
+        if self._should_process_file(event.src_path):
+            self._queue_change(event.src_path, "deleted")
+        if self._should_process_file(event.dest_path):
+            self._queue_change(event.dest_path, "changed")
+        logger.info(f"File moved: {event.src_path} -> {event.dest_path}")
+    
+    def _queue_change(self, file_path: str, kind: str):
+        """Remember the latest event for a path; later events supersede earlier ones"""
+        with self._pending_lock:
+            was_idle = not self.pending_changes
+            if file_path in self.pending_changes:
+                self.coalesced_events += 1
+            if self._reindex_in_flight:
+                # Picked up by the next batch once the running reindex finishes
+                self.events_during_reindex += 1
+            self.pending_changes[file_path] = (time.time(), kind)
+            self.events += 1
+            # Deadlines only move later, so the worker needs waking only when
+            # it was idle; otherwise it already sleeps until an earlier deadline
+            if was_idle:
+                self._pending_lock.notify()
+    
+    def _take_due_changes(self, current_time: float):
+        """Pop every change whose debounce period has passed (caller holds the lock)"""
+        changed = []
+        deleted = []
+        for file_path, (change_time, kind) in list(self.pending_changes.items()):
             if current_time - change_time >= self.debounce_seconds:
-                files_to_reindex.append(file_path)
+                (deleted if kind == "deleted" else changed).append((file_path, change_time))
                 del self.pending_changes[file_path]
+        return changed, deleted
+    
+    def _next_deadline(self) -> Optional[float]:
+        """Time at which the oldest pending change becomes due (caller holds the lock)"""
+        if not self.pending_changes:
+            return None
+        return min(change_time for change_time, _ in self.pending_changes.values()) + self.debounce_seconds
+    
+    def _run_worker(self):
+        """Sleep until a debounce deadline passes, then reindex everything that is due
         
-        if not files_to_reindex:
-            return
-        
-        # Avoid reindexing too frequently
-        if current_time - self.last_reindex_time < self.debounce_seconds:
+        Only one batch runs at a time. Events arriving while a reindex is in
+        flight accumulate in pending_changes and are merged into the next batch.
+        """
+        while True:
+            with self._pending_lock:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.time()
+                    deadline = self._next_deadline()
+                    if deadline is not None and deadline <= now:
+                        changed, deleted = self._take_due_changes(now)
+                        self._reindex_in_flight = True
+                        break
+                    self._pending_lock.wait(None if deadline is None else deadline - now)
+                    self.wakeups += 1
+            
+            try:
+                self._apply_changes(changed, deleted)
+            finally:
+                with self._pending_lock:
+                    self._reindex_in_flight = False
+    
+    def process_pending_changes(self):
+        """Synchronously process changes whose debounce period has passed"""
+        with self._pending_lock:
+            changed, deleted = self._take_due_changes(time.time())
+        self._apply_changes(changed, deleted)
+    
+    def _apply_changes(self, changed, deleted):
+        """Remove deleted files and reindex changed ones in a single batch"""
+        if not changed and not deleted:
             return
         
-        # Reindex changed files
-        logger.info(f"Reindexing {len(files_to_reindex)} changed file(s)")
+        logger.info(f"Reindexing {len(changed)} changed and removing {len(deleted)} deleted file(s)")
         try:
-            # For now, trigger a full reindex (can be optimized later)
-            self.rag_system.index_project(force_reindex=False)
-            self.last_reindex_time = current_time
+            if deleted:
+                self.rag_system.remove_files([path for path, _ in deleted])
+                self.removed_files += len(deleted)
+            if changed:
+                self.rag_system.reindex_files([path for path, _ in changed])
+                self.reindexed_files += len(changed)
+            self.batches += 1
+            self._record_latencies(changed + deleted)
             logger.info("Reindexing complete")
         except Exception as e:
+            self.failed_batches += 1
             logger.error(f"Error during reindexing: {e}", exc_info=True)
+    
+    def _record_latencies(self, items):
+        """Measure save-to-searchable time, using the file's mtime as the save time"""
+        done = time.time()
+        for file_path, event_time in items:
+            try:
+                saved_at = min(os.stat(file_path).st_mtime, event_time)
+            except OSError:
+                saved_at = event_time
+            self.latencies.append(max(done - saved_at, 0.0))
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Save-to-searchable latency and reindex counters"""
+        latencies = sorted(self.latencies)
+        
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)], 3)
+        
+        with self._pending_lock:
+            pending = len(self.pending_changes)
+            in_flight = self._reindex_in_flight
+        return {
+            "pending_changes": pending,
+            "reindex_in_flight": in_flight,
+            "events": self.events,
+            "coalesced_events": self.coalesced_events,
+            "events_during_reindex": self.events_during_reindex,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "worker_wakeups": self.wakeups,
+            "reindexed_files": self.reindexed_files,
+            "removed_files": self.removed_files,
+            "latency_samples": len(latencies),
+            "save_to_searchable_p50_seconds": percentile(0.5),
+            "save_to_searchable_p95_seconds": percentile(0.95),
+            "save_to_searchable_max_seconds": round(latencies[-1], 3) if latencies else 0.0,
+        }
 
 
 class FileWatcherManager:
     """Manages file watchers for multiple projects"""
     
-    def __init__(self):
+    def __init__(self, backend: str = "auto", poll_interval: float = 1.0):
+        """
+        Args:
+            backend: "auto" picks inotify or polling per project, "native" or
+                "polling" force one for every project
+            poll_interval: Seconds between directory scans of polling observers
+        """
+        self.backend = backend
+        self.poll_interval = poll_interval
         self.observers: Dict[str, Observer] = {}
         self.watchers: Dict[str, ProjectFileWatcher] = {}
-        logger.info("File watcher manager initialized")
+        # project_path -> backend, reason and start time
+        self.backends: Dict[str, dict] = {}
+        logger.info(f"File watcher manager initialized (backend: {backend})")
     
     def start_watching(
         self,
@@ -158,17 +369,36 @@ class FileWatcherManager:
             file_extensions=file_extensions
         )
         
-        # Use PollingObserver for Docker/Windows compatibility
-        # Regular Observer doesn't receive file system events through Docker volumes on Windows
-        logger.info("Using PollingObserver for Docker/Windows compatibility")
-        observer = PollingObserver(timeout=1.0)  # Check every 1 second
-        observer.schedule(watcher, project_path, recursive=True)
-        observer.start()
+        backend, reason = select_watcher_backend(project_path, self.backend)
+        observer = None
+        if backend == "native":
+            try:
+                observer = Observer()
+                observer.schedule(watcher, project_path, recursive=True)
+                observer.start()
+            except OSError as e:
+                # e.g. the inotify watch limit is exhausted on a huge tree
+                logger.warning(f"Native watcher failed for {project_path}: {e}. Falling back to polling")
+                backend, reason = "polling", f"native watcher failed: {e}"
+                observer = None
+        
+        if observer is None:
+            # Regular Observer doesn't receive file system events through Docker volumes on Windows
+            observer = PollingObserver(timeout=self.poll_interval)
+            observer.schedule(watcher, project_path, recursive=True)
+            observer.start()
         
+        watcher.start(Path(project_path).name)
         self.watchers[project_path] = watcher
         self.observers[project_path] = observer
+        self.backends[project_path] = {
+            "backend": backend,
+            "observer": type(observer).__name__,
+            "reason": reason,
+            "started_at": time.time(),
+        }
         
-        logger.info(f"Started watching: {project_path}")
+        logger.info(f"Started watching: {project_path} ({backend}: {reason})")
         return observer
     
     def stop_watching(self, project_path: str):
@@ -177,9 +407,11 @@ class FileWatcherManager:
             observer = self.observers[project_path]
             observer.stop()
             observer.join(timeout=5)
+            self.watchers[project_path].stop()
             
             del self.observers[project_path]
             del self.watchers[project_path]
+            self.backends.pop(project_path, None)
             
             logger.info(f"Stopped watching: {project_path}")
     
@@ -189,11 +421,40 @@ class FileWatcherManager:
             self.stop_watching(project_path)
         logger.info("All watchers stopped")
     
-    def process_all_pending_changes(self):
-        """Process pending changes for all watchers"""
-        for watcher in self.watchers.values():
-            watcher.process_pending_changes()
-    
     def get_watched_projects(self) -> list:
         """Get list of currently watched projects"""
         return list(self.observers.keys())
+    
+    def get_stats(self) -> Dict[str, dict]:
+        """Per-project watcher statistics, including backend and its CPU cost"""
+        stats = {}
+        for path, watcher in list(self.watchers.items()):
+            backend = dict(self.backends.get(path, {}))
+            observer = self.observers.get(path)
+            cpu_seconds = self._observer_cpu_seconds(observer) if observer else None
+            started_at = backend.pop("started_at", None)
+            if cpu_seconds is not None and started_at:
+                elapsed = max(time.time() - started_at, 1e-6)
+                backend["cpu_seconds"] = round(cpu_seconds, 3)
+                backend["cpu_percent"] = round(100.0 * cpu_seconds / elapsed, 2)
+            stats[path] = {**backend, **watcher.get_stats()}
+        return stats
+    
+    @staticmethod
+    def _observer_cpu_seconds(observer) -> Optional[float]:
+        """CPU time of an observer's dispatch thread and all of its emitter threads"""
+        threads = [observer]
+        for emitter in list(getattr(observer, "emitters", [])):
+            threads.append(emitter)
+            # The inotify emitter reads events on a helper thread of its own
+            helper = getattr(emitter, "_inotify", None)
+            if isinstance(helper, threading.Thread):
+                threads.append(helper)
+        
+        total = 0.0
+        for thread in threads:
+            seconds = _thread_cpu_seconds(thread)
+            if seconds is None:
+                return None
+            total += seconds
+        return total
@@ -0,0 +1,535 @@
+"""Staged, parallel indexing pipeline
+
+Indexing runs as four stages connected by bounded queues:
+
+    discovery -> read + hash + parse (process pool) -> embedding -> upsert
+
+Discovery and dispatch happen on the calling thread, parsing is spread over
+worker processes, and dedicated threads turn the global chunk stream into
+large embedding batches and bulk upserts. A file is only recorded as indexed
+once all of its chunks have been written.
+
+Unchanged files are recognized from a single stat() against the recorded
+size, mtime and inode; only files whose stat differs are read, and they are
+read exactly once for both hashing and parsing.
+
+Chunks are identified by a hash of their content. A changed file is diffed
+against the chunk keys recorded for it: only new chunks are embedded,
+surviving chunks just get their position metadata refreshed, and chunks
+that vanished are deleted.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .code_parser import CodeParser
+from .utils import chunk_content_key, make_chunk_id, read_file_hashed
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a queue's stream
+_DONE = object()
+
+
+@dataclass
+class IndexingConfig:
+    """Tuning knobs for the indexing pipeline"""
+    # Parser processes; 0 parses on the dispatching thread, None uses cores - 1
+    workers: Optional[int] = None
+    embed_batch_size: int = 256
+    upsert_batch_size: int = 1024
+    # Bound for in-flight parse tasks and for each inter-stage queue
+    queue_size: int = 64
+
+    def resolved_workers(self) -> int:
+        if self.workers is not None:
+            return max(self.workers, 0)
+        return max((os.cpu_count() or 2) - 1, 1)
+
+
+@dataclass
+class FileTask:
+    """Work item for the parse stage"""
+    path: str
+    rel_path: str
+    extension: str
+    # What the last run recorded for this file (hash and stat fields)
+    known: Optional[Dict[str, Any]] = None
+    force: bool = False
+    size: int = -1
+    mtime_ns: int = -1
+    inode: int = -1
+
+    @classmethod
+    def from_stat(cls, path: str, rel_path: str, extension: str, stat: os.stat_result, **kwargs) -> "FileTask":
+        return cls(
+            path=path, rel_path=rel_path, extension=extension,
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino,
+            **kwargs
+        )
+
+    def stat_record(self) -> Dict[str, int]:
+        return {"size": self.size, "mtime_ns": self.mtime_ns, "inode": self.inode}
+
+    def stat_unchanged(self) -> bool:
+        """True when the recorded stat matches, so the file needs no reading"""
+        if self.force or not self.known or self.size < 0:
+            return False
+        return (
+            self.known.get("size") == self.size
+            and self.known.get("mtime_ns") == self.mtime_ns
+            and self.known.get("inode") == self.inode
+        )
+
+
+@dataclass
+class ParsedFile:
+    """Result of reading, hashing and parsing a single file"""
+    path: str
+    record: Dict[str, Any] = field(default_factory=dict)
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    unchanged: bool = False
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class StageStats:
+    """Work done by one pipeline stage"""
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+        }
+
+
+# Parser instance of a worker process, created by _init_worker
+_worker_parser: Optional[CodeParser] = None
+
+
+def _init_worker(parser: CodeParser) -> None:
+    global _worker_parser
+    # Parallelism comes from the worker processes; a tokenizer thread pool
+    # in each of them would only oversubscribe the cores
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _worker_parser = parser
+
+
+def process_file(task: FileTask, parser: Optional[CodeParser] = None) -> ParsedFile:
+    """Read, hash and parse one file; runs inside a worker process"""
+    parser = parser or _worker_parser
+    start = time.perf_counter()
+    result = ParsedFile(path=task.path, record=task.stat_record())
+
+    try:
+        # One read serves both the content hash and the parser
+        raw, file_hash = read_file_hashed(task.path)
+        result.record["hash"] = file_hash
+
+        if not task.force and task.known and task.known.get("hash") == file_hash:
+            # Touched but not modified; only the stat fields need refreshing
+            result.unchanged = True
+        else:
+            content = raw.decode('utf-8', errors='ignore')
+            chunks = parser.parse_file(content, task.extension)
+            occurrences: Dict[str, int] = {}
+            for i, chunk in enumerate(chunks):
+                base_key = chunk_content_key(chunk['content'])
+                occurrence = occurrences.get(base_key, 0)
+                occurrences[base_key] = occurrence + 1
+                chunk['chunk_key'] = chunk_content_key(chunk['content'], occurrence)
+                chunk['file_path'] = task.rel_path
+                chunk['full_path'] = task.path
+                chunk['chunk_index'] = i
+                chunk['file_extension'] = task.extension
+            result.chunks = chunks
+    except Exception as e:
+        result.error = str(e)
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+class IndexingPipeline:
+    """Runs one indexing pass over a stream of files"""
+
+    def __init__(
+        self,
+        vector_store,
+        code_parser: CodeParser,
+        config: Optional[IndexingConfig] = None
+    ):
+        self.vector_store = vector_store
+        self.code_parser = code_parser
+        self.config = config or IndexingConfig()
+
+        self.stats = {
+            name: StageStats(name)
+            for name in ("discovery", "parse", "embed", "upsert")
+        }
+        self._stats_lock = threading.Lock()
+
+        # file path -> [chunks not yet written, file record, total chunks]
+        self._pending_files: Dict[str, list] = {}
+        self._failed_files: set = set()
+        self._pending_lock = threading.Lock()
+        self._on_file_recorded: Optional[Callable[[str, Dict[str, Any]], None]] = None
+
+        self.indexed_files = 0
+        self.unchanged_files = 0
+        self.stat_skipped_files = 0
+        self.failed_files = 0
+        self.total_chunks = 0
+        self.embedded_chunks = 0
+        self.reused_chunks = 0
+        self.deleted_chunks = 0
+
+    def run(
+        self,
+        tasks: Iterable[FileTask],
+        on_file_recorded: Callable[[str, Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """Index all tasks
+
+        on_file_recorded(path, record) fires with the hash/stat fields to store
+        for every file that was written or found unchanged after hashing.
+        """
+        self._on_file_recorded = on_file_recorded
+        queue_size = max(self.config.queue_size, 1)
+        chunk_queue: queue.Queue = queue.Queue(maxsize=queue_size * 16)
+        upsert_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        wall_start = time.perf_counter()
+        embedder = threading.Thread(
+            target=self._embed_stage, args=(chunk_queue, upsert_queue),
+            name="index-embed", daemon=True
+        )
+        writer = threading.Thread(
+            target=self._upsert_stage, args=(upsert_queue,),
+            name="index-upsert", daemon=True
+        )
+        embedder.start()
+        writer.start()
+
+        try:
+            self._dispatch(tasks, chunk_queue)
+        finally:
+            chunk_queue.put(_DONE)
+            embedder.join()
+            writer.join()
+
+        wall_seconds = time.perf_counter() - wall_start
+        report = {
+            "indexed_files": self.indexed_files,
+            "unchanged_files": self.unchanged_files,
+            "stat_skipped_files": self.stat_skipped_files,
+            "failed_files": self.failed_files,
+            "total_chunks": self.total_chunks,
+            "embedded_chunks": self.embedded_chunks,
+            "reused_chunks": self.reused_chunks,
+            "deleted_chunks": self.deleted_chunks,
+            "wall_seconds": round(wall_seconds, 3),
+            "stages": {
+                name: stage.to_dict(wall_seconds) for name, stage in self.stats.items()
+            },
+        }
+        logger.info(
+            "Pipeline throughput (items/s): "
+            + ", ".join(
+                f"{name}={data['items_per_second']}" for name, data in report["stages"].items()
+            )
+        )
+        return report
+
+    def _dispatch(self, tasks: Iterable[FileTask], chunk_queue: queue.Queue) -> None:
+        """Discovery and parse stages: feed the process pool, forward chunks downstream"""
+        workers = self.config.resolved_workers()
+        max_in_flight = max(self.config.queue_size, workers)
+        executor = None
+        if workers > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn avoids forking a process that already runs model threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.code_parser,)
+            )
+
+        in_flight: Dict[Future, FileTask] = {}
+        discovered = 0
+        try:
+            iterator = iter(tasks)
+            while True:
+                started = time.perf_counter()
+                task = next(iterator, None)
+                self._add_stats("discovery", 0, time.perf_counter() - started)
+                if task is None:
+                    break
+                discovered += 1
+                self._add_stats("discovery", 1, 0.0)
+
+                if task.stat_unchanged():
+                    self.unchanged_files += 1
+                    self.stat_skipped_files += 1
+                    continue
+
+                if executor is None:
+                    self._handle_parsed(task, process_file(task, self.code_parser), chunk_queue)
+                    continue
+
+                in_flight[executor.submit(process_file, task)] = task
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._handle_future(in_flight.pop(future), future, chunk_queue)
+
+                if discovered % 500 == 0:
+                    logger.info(f"Discovered {discovered} files, {self.indexed_files} indexed so far...")
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._handle_future(in_flight.pop(future), future, chunk_queue)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _handle_future(self, task: FileTask, future: Future, chunk_queue: queue.Queue) -> None:
+        try:
+            parsed = future.result()
+        except Exception as e:
+            logger.error(f"Parse worker failed for {task.path}: {e}")
+            self._count_failure()
+            return
+        self._handle_parsed(task, parsed, chunk_queue)
+
+    def _handle_parsed(self, task: FileTask, parsed: ParsedFile, chunk_queue: queue.Queue) -> None:
+        """Route a parsed file: skip, record directly, or queue its new chunks"""
+        self._add_stats("parse", 1, parsed.seconds)
+
+        if parsed.error:
+            logger.error(f"Error indexing {parsed.path}: {parsed.error}")
+            self._count_failure()
+            return
+        if parsed.unchanged:
+            logger.debug(f"Skipping unchanged file: {parsed.path}")
+            self.unchanged_files += 1
+            self._on_file_recorded(parsed.path, parsed.record)
+            return
+        try:
+            new_chunks = self._diff_chunks(task, parsed)
+        except Exception as e:
+            logger.error(f"Error updating chunks of {parsed.path}: {e}")
+            self._count_failure()
+            return
+
+        parsed.record["chunk_keys"] = [chunk['chunk_key'] for chunk in parsed.chunks]
+        if not new_chunks:
+            self._record_file(parsed.path, parsed.record, len(parsed.chunks))
+            return
+
+        with self._pending_lock:
+            self._pending_files[parsed.path] = [
+                len(new_chunks), parsed.record, len(parsed.chunks)
+            ]
+        for chunk in new_chunks:
+            # Blocks when the embedder falls behind, which throttles parsing
+            chunk_queue.put(chunk)
+
+    def _diff_chunks(self, task: FileTask, parsed: ParsedFile) -> List[Dict[str, Any]]:
+        """Compare with the chunks stored for this file; return the ones to embed"""
+        known_keys = (task.known or {}).get("chunk_keys")
+        if known_keys is not None and task.force:
+            # Forced reindex rewrites every chunk but still drops vanished ones
+            current = {chunk['chunk_key'] for chunk in parsed.chunks}
+            vanished = [
+                make_chunk_id(task.rel_path, key) for key in set(known_keys) - current
+            ]
+            if vanished:
+                self.vector_store.delete_ids(vanished)
+            known_keys = None
+        elif known_keys is None and task.known:
+            # Indexed before chunks had stable IDs; drop the positional ones
+            self.vector_store.delete_by_file(task.rel_path)
+
+        if known_keys is None:
+            with self._stats_lock:
+                self.embedded_chunks += len(parsed.chunks)
+            return parsed.chunks
+
+        old_keys = set(known_keys)
+        new_keys = {chunk['chunk_key'] for chunk in parsed.chunks}
+        new_chunks = [chunk for chunk in parsed.chunks if chunk['chunk_key'] not in old_keys]
+        kept_chunks = [chunk for chunk in parsed.chunks if chunk['chunk_key'] in old_keys]
+        vanished = [
+            make_chunk_id(task.rel_path, key) for key in old_keys - new_keys
+        ]
+
+        if vanished:
+            self.vector_store.delete_ids(vanished)
+        if kept_chunks:
+            # Same text, possibly at new lines; refresh metadata without re-embedding
+            ids, _, metadatas = self.vector_store.prepare_documents(kept_chunks)
+            self.vector_store.update_metadatas(ids, metadatas)
+
+        with self._stats_lock:
+            self.embedded_chunks += len(new_chunks)
+            self.reused_chunks += len(kept_chunks)
+            self.deleted_chunks += len(vanished)
+        return new_chunks
+
+    def _embed_stage(self, chunk_queue: queue.Queue, upsert_queue: queue.Queue) -> None:
+        """Collect chunks from all files into large embedding batches"""
+        batch: List[Dict[str, Any]] = []
+        try:
+            while True:
+                item = chunk_queue.get()
+                if item is _DONE:
+                    break
+                batch.append(item)
+                if len(batch) >= self.config.embed_batch_size:
+                    self._embed_batch(batch, upsert_queue)
+                    batch = []
+            if batch:
+                self._embed_batch(batch, upsert_queue)
+        except Exception as e:
+            logger.error(f"Embedding stage failed: {e}", exc_info=True)
+            self._fail_chunks(batch)
+            # Keep taking chunks, or the parse stage blocks on the full queue forever
+            while True:
+                item = chunk_queue.get()
+                if item is _DONE:
+                    break
+                self._fail_chunks([item])
+        finally:
+            upsert_queue.put(_DONE)
+
+    def _embed_batch(self, chunks: List[Dict[str, Any]], upsert_queue: queue.Queue) -> None:
+        started = time.perf_counter()
+        try:
+            ids, texts, metadatas = self.vector_store.prepare_documents(chunks)
+            embeddings = self.vector_store.embed_texts(
+                texts, batch_size=min(len(texts), 64)
+            )
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(chunks)} chunks: {e}", exc_info=True)
+            self._fail_chunks(chunks)
+            return
+        self._add_stats("embed", len(chunks), time.perf_counter() - started)
+        upsert_queue.put((chunks, ids, embeddings, texts, metadatas))
+
+    def _upsert_stage(self, upsert_queue: queue.Queue) -> None:
+        """Write embedded chunks to the vector store in bulk"""
+        pending: List[tuple] = []
+        pending_count = 0
+        try:
+            while True:
+                item = upsert_queue.get()
+                if item is _DONE:
+                    break
+                pending.append(item)
+                pending_count += len(item[1])
+                if pending_count >= self.config.upsert_batch_size:
+                    self._write(pending)
+                    pending, pending_count = [], 0
+            if pending:
+                self._write(pending)
+        except Exception as e:
+            logger.error(f"Upsert stage failed: {e}", exc_info=True)
+            self._fail_chunks([chunk for batch in pending for chunk in batch[0]])
+            # Keep taking batches, or the embedding stage blocks on the full queue forever
+            while True:
+                item = upsert_queue.get()
+                if item is _DONE:
+                    break
+                self._fail_chunks(item[0])
+
+    def _write(self, batches: List[tuple]) -> None:
+        """Upsert batches; on any error their files are retried on the next run"""
+        try:
+            self._upsert(batches)
+        except Exception as e:
+            logger.error(f"Error writing {len(batches)} embedded batches: {e}", exc_info=True)
+            self._fail_chunks([chunk for batch in batches for chunk in batch[0]])
+
+    def _upsert(self, batches: List[tuple]) -> None:
+        chunks = [chunk for batch in batches for chunk in batch[0]]
+        ids = [i for batch in batches for i in batch[1]]
+        embeddings = np.concatenate([batch[2] for batch in batches])
+        texts = [t for batch in batches for t in batch[3]]
+        metadatas = [m for batch in batches for m in batch[4]]
+
+        started = time.perf_counter()
+        try:
+            self.vector_store.upsert_embeddings(ids, embeddings, texts, metadatas)
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(ids)} chunks: {e}")
+            self._fail_chunks(chunks)
+            return
+        self._add_stats("upsert", len(ids), time.perf_counter() - started)
+
+        written: Dict[str, int] = {}
+        for chunk in chunks:
+            written[chunk['full_path']] = written.get(chunk['full_path'], 0) + 1
+
+        completed = []
+        with self._pending_lock:
+            for path, count in written.items():
+                entry = self._pending_files.get(path)
+                if entry is None:
+                    continue
+                entry[0] -= count
+                if entry[0] <= 0:
+                    del self._pending_files[path]
+                    if path not in self._failed_files:
+                        completed.append((path, entry[1], entry[2]))
+
+        for path, record, chunk_count in completed:
+            try:
+                self._record_file(path, record, chunk_count)
+            except Exception as e:
+                logger.error(f"Error recording indexed file {path}: {e}", exc_info=True)
+                self._fail_files([path])
+
+    def _fail_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        """Make sure files with lost chunks are retried on the next run"""
+        self._fail_files(chunk['full_path'] for chunk in chunks)
+
+    def _fail_files(self, paths: Iterable[str]) -> None:
+        with self._pending_lock:
+            for path in paths:
+                if path not in self._failed_files:
+                    self._failed_files.add(path)
+                    self._count_failure()
+
+    def _count_failure(self) -> None:
+        with self._stats_lock:
+            self.failed_files += 1
+
+    def _record_file(self, path: str, record: Dict[str, Any], chunk_count: int) -> None:
+        self._on_file_recorded(path, {**record, "chunks": chunk_count})
+        with self._stats_lock:
+            self.indexed_files += 1
+            self.total_chunks += chunk_count
+            indexed = self.indexed_files
+        if indexed % 100 == 0:
+            logger.info(f"Indexed {indexed} files...")
+
+    def _add_stats(self, stage: str, items: int, seconds: float) -> None:
+        with self._stats_lock:
+            self.stats[stage].items += items
+            self.stats[stage].busy_seconds += seconds
@@ -0,0 +1,238 @@
+"""Compact BM25 inverted index over code tokens"""
+
+import gzip
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+# Boundaries inside identifiers: fooBar, HTTPServer, utf8Decode
+_CAMEL_PARTS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Reciprocal rank fusion constant from the original RRF paper
+RRF_K = 60
+
+
+def tokenize_code(text: str) -> List[str]:
+    """Split text into lowercase code tokens
+
+    Every identifier is kept whole and also split into its snake_case and
+    camelCase parts, so "_save_metadata" matches "save metadata" and
+    "getUserName" matches "user name".
+    """
+    tokens = []
+    for identifier in _IDENTIFIER.findall(text):
+        whole = identifier.strip("_").lower()
+        if len(whole) < 2:
+            continue
+        tokens.append(whole)
+        parts = [
+            part.lower()
+            for piece in identifier.split("_") if piece
+            for part in _CAMEL_PARTS.findall(piece)
+        ]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) > 1)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists; an id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """BM25 index of chunk ids, maintained alongside the vector collection
+
+    Documents are numbered internally and postings map each term to
+    {doc number: term frequency}. Removal uses the per-document term list,
+    so updating a chunk never scans the whole index.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._doc_numbers: Dict[str, int] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_terms: List[Optional[Tuple[str, ...]]] = []
+        self._doc_lengths: List[int] = []
+        self._free: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # file path -> chunk ids, for removals by file
+        self._file_docs: Dict[str, set] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    @staticmethod
+    def _file_of(doc_id: str) -> str:
+        # Chunk ids are "<file path>#<content key>", or "<file path>_<chunk index>"
+        # in collections indexed before content keys
+        if "#" in doc_id:
+            return doc_id.rsplit("#", 1)[0]
+        path, sep, index = doc_id.rpartition("_")
+        return path if sep and index.isdigit() else doc_id
+
+    def doc_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._doc_numbers)
+
+    def add_many(self, doc_ids: Iterable[str], texts: Iterable[str]) -> None:
+        """Index chunks, replacing any previous text stored under the same id"""
+        tokenized = [(doc_id, Counter(tokenize_code(text))) for doc_id, text in zip(doc_ids, texts)]
+        with self._lock:
+            for doc_id, counts in tokenized:
+                self._remove(doc_id)
+                number = self._free.pop() if self._free else len(self._doc_ids)
+                if number == len(self._doc_ids):
+                    self._doc_ids.append(None)
+                    self._doc_terms.append(None)
+                    self._doc_lengths.append(0)
+                length = sum(counts.values())
+                self._doc_ids[number] = doc_id
+                self._doc_terms[number] = tuple(counts)
+                self._doc_lengths[number] = length
+                self._doc_numbers[doc_id] = number
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[number] = tf
+                self._file_docs.setdefault(self._file_of(doc_id), set()).add(doc_id)
+            self._dirty = True
+
+    def remove_many(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            self._dirty = True
+
+    def remove_file(self, file_path: str) -> None:
+        """Drop every chunk of a file"""
+        with self._lock:
+            for doc_id in list(self._file_docs.get(file_path, ())):
+                self._remove(doc_id)
+            self._dirty = True
+
+    def _remove(self, doc_id: str) -> None:
+        number = self._doc_numbers.pop(doc_id, None)
+        if number is None:
+            return
+        for term in self._doc_terms[number]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(number, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths[number]
+        self._doc_ids[number] = None
+        self._doc_terms[number] = None
+        self._doc_lengths[number] = 0
+        self._free.append(number)
+        file_docs = self._file_docs.get(self._file_of(doc_id))
+        if file_docs is not None:
+            file_docs.discard(doc_id)
+            if not file_docs:
+                del self._file_docs[self._file_of(doc_id)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Top chunk ids for a query by BM25 score"""
+        terms = set(tokenize_code(query))
+        with self._lock:
+            doc_count = len(self._doc_numbers)
+            if not terms or not doc_count:
+                return []
+            avg_length = self._total_length / doc_count or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+                for number, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._doc_lengths[number] / avg_length)
+                    scores[number] = scores.get(number, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+            best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(self._doc_ids[number], score) for number, score in best]
+
+    def save(self) -> None:
+        """Persist the index if it changed since the last save"""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            docs = {
+                doc_id: {term: self._postings[term][number] for term in self._doc_terms[number]}
+                for doc_id, number in self._doc_numbers.items()
+            }
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+                json.dump({"version": 1, "docs": docs}, f, separators=(",", ":"))
+            tmp_path.replace(self.path)
+        except Exception as e:
+            logger.error(f"Error saving lexical index: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def load(self) -> bool:
+        """Load a persisted index; returns False if there is none"""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable lexical index {self.path}: {e}")
+            return False
+
+        with self._lock:
+            self._reset()
+            for doc_id, counts in data.get("docs", {}).items():
+                number = len(self._doc_ids)
+                length = sum(counts.values())
+                self._doc_ids.append(doc_id)
+                self._doc_terms.append(tuple(counts))
+                self._doc_lengths.append(length)
+                self._doc_numbers[doc_id] = number
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[number] = tf
+                self._file_docs.setdefault(self._file_of(doc_id), set()).add(doc_id)
+            self._dirty = False
+        logger.info(f"Loaded lexical index: {len(self)} chunks, {len(self._postings)} terms")
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks": len(self._doc_numbers),
+                "terms": len(self._postings),
+                "postings": sum(len(postings) for postings in self._postings.values()),
+            }
@@ -1,23 +1,39 @@
 import os
 import sys
 import json
+import asyncio
 import threading
 import time
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Literal
 import logging
 from contextlib import asynccontextmanager
 
+# Imported first: starts the startup clock
+from .startup import startup
+
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 import uvicorn
 
 from .rag_system import LocalRAGSystem
+from .indexing_pipeline import IndexingConfig
+from .model_registry import model_registry
+from .query_batcher import QueryBatcher
+from .embedding_cache import EmbeddingCache, query_embedding_cache
+from .cache_manager import CacheManager
+from .context_manager import ContextManager
+from .federated_query import federated_query
+from .project_registry import ProjectRegistry
 from .utils import convert_windows_path_to_wsl, validate_project_path
 from .file_watcher import FileWatcherManager
-from .file_watcher import FileWatcherManager
+
+# chromadb, sentence_transformers (torch) and tiktoken are imported on first
+# use or by the background warm-up, never here
+_imports_seconds = time.perf_counter() - startup.started
 
 # Configuration
 class Settings(BaseSettings):
@@ -25,10 +41,36 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     max_context_tokens: int = 4000
     embedding_model: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    embedding_backend: Literal["torch", "onnx", "onnx_int8"] = "torch"
+    onnx_model_dir: Optional[str] = None  # defaults to onnx_models next to vector_db_path
     vector_db_path: str = "/app/data/chroma_db"
     redis_url: Optional[str] = None
     file_watcher_enabled: bool = True
     file_watcher_debounce_seconds: float = 2.0
+    file_watcher_backend: str = "auto"  # auto, native or polling
+    file_watcher_poll_interval: float = 1.0
+    query_executor_workers: int = 4
+    query_batch_window_ms: float = 5.0
+    query_batch_max_size: int = 16
+    index_workers: Optional[int] = None
+    index_embed_batch_size: int = 256
+    index_upsert_batch_size: int = 1024
+    index_queue_size: int = 64
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: Optional[str] = None  # defaults to <vector_db_path>/embedding_cache.sqlite
+    embedding_cache_max_mb: int = 1024
+    query_cache_l1_max_entries: int = 1000
+    query_cache_l1_max_mb: float = 64.0
+    query_cache_l1_ttl_seconds: float = 300.0
+    query_embedding_cache_size: int = 2048
+    retrieval_mode: Literal["vector", "hybrid", "lexical"] = "hybrid"
+    vector_index_backend: Literal["chroma", "mmap"] = "chroma"
+    vector_index_hnsw: bool = False  # mmap only; needs hnswlib
+    vector_index_quantization: Literal["none", "int8", "binary"] = "none"  # mmap only
+    symbol_fast_path: bool = True
+    max_loaded_projects: int = 0  # 0 = no limit
+    max_loaded_projects_memory_mb: float = 0.0  # 0 = no limit
+    warm_up_on_startup: bool = True
     
     class Config:
         env_file = ".env"
@@ -46,6 +88,7 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+startup.record("imports", _imports_seconds)
 
 
 # Embedding model management
@@ -56,18 +99,181 @@ AVAILABLE_MODELS = [
     "intfloat/multilingual-e5-large"
 ]
 
-# Multi-project support: Dictionary of project_path -> RAGSystem
-rag_systems: Dict[str, LocalRAGSystem] = {}
 project_models: Dict[str, str] = {}  # project_path -> embedding_model
+# project_path -> file extensions of projects indexed with the watcher on;
+# their watcher is stopped when the project is unloaded and restarted on load
+watched_projects: Dict[str, Optional[List[str]]] = {}
 current_project: Optional[str] = None
+# Renders federated prompts; created on first use
+federated_context_manager: Optional[ContextManager] = None
 
-file_watcher_manager = FileWatcherManager()
-watcher_thread_stop = threading.Event()
-watcher_thread: Optional[threading.Thread] = None
+file_watcher_manager = FileWatcherManager(
+    backend=settings.file_watcher_backend,
+    poll_interval=settings.file_watcher_poll_interval
+)
+
+# Embeddings of chunk texts, shared by all projects and kept across restarts
+embedding_cache: Optional[EmbeddingCache] = None
+if settings.embedding_cache_enabled:
+    try:
+        embedding_cache = EmbeddingCache(
+            db_path=settings.embedding_cache_path or str(Path(settings.vector_db_path) / "embedding_cache.sqlite"),
+            max_size_mb=settings.embedding_cache_max_mb
+        )
+    except Exception as e:
+        logger.warning(f"Embedding cache unavailable: {e}. Every chunk will be embedded.")
+
+# Query results: in-process L1 shared by all projects, Redis as optional L2
+query_cache = CacheManager(
+    redis_url=settings.redis_url,
+    l1_max_entries=settings.query_cache_l1_max_entries,
+    l1_max_size_mb=settings.query_cache_l1_max_mb,
+    l1_ttl_seconds=settings.query_cache_l1_ttl_seconds
+)
+
+# ONNX exports of the embedding models are made once and kept with the index data
+model_registry.onnx_dir = settings.onnx_model_dir or str(Path(settings.vector_db_path).parent / "onnx_models")
+
+# Query embeddings, shared by projects using the same model
+query_embedding_cache.max_entries = settings.query_embedding_cache_size
+
+# Blocking query work runs here, never on the event loop
+query_batcher = QueryBatcher(
+    max_workers=settings.query_executor_workers,
+    batch_window_ms=settings.query_batch_window_ms,
+    max_batch_size=settings.query_batch_max_size
+)
+
+def create_rag_system(project_root: str, embedding_model: str) -> LocalRAGSystem:
+    """Build a RAG system for a project using the server settings"""
+    return LocalRAGSystem(
+        project_root=project_root,
+        vector_db_path=settings.vector_db_path,
+        embedding_model=embedding_model,
+        redis_url=settings.redis_url,
+        max_context_tokens=settings.max_context_tokens,
+        indexing_config=IndexingConfig(
+            workers=settings.index_workers,
+            embed_batch_size=settings.index_embed_batch_size,
+            upsert_batch_size=settings.index_upsert_batch_size,
+            queue_size=settings.index_queue_size
+        ),
+        embedding_cache=embedding_cache,
+        cache_manager=query_cache,
+        retrieval_mode=settings.retrieval_mode,
+        symbol_fast_path=settings.symbol_fast_path,
+        embedding_backend=settings.embedding_backend,
+        index_backend=settings.vector_index_backend,
+        hnsw=settings.vector_index_hnsw,
+        quantization=settings.vector_index_quantization
+    )
+
+def start_project_watcher(project_path: str, rag_system: LocalRAGSystem, file_extensions: Optional[List[str]]):
+    file_watcher_manager.start_watching(
+        project_path=project_path,
+        rag_system=rag_system,
+        debounce_seconds=settings.file_watcher_debounce_seconds,
+        file_extensions=set(file_extensions) if file_extensions else None
+    )
+
+def on_project_loaded(project_path: str, rag_system: LocalRAGSystem):
+    """Resume watching a project that was unloaded while idle"""
+    if project_path not in watched_projects:
+        return
+    file_extensions = watched_projects[project_path]
+    start_project_watcher(project_path, rag_system, file_extensions)
+    # Pick up edits made while nobody was watching; unchanged files cost one stat()
+    threading.Thread(
+        target=rag_system.index_project,
+        kwargs={"file_extensions": file_extensions},
+        name=f"rag-catchup-{Path(project_path).name}",
+        daemon=True
+    ).start()
+
+def on_project_evicted(project_path: str, rag_system: LocalRAGSystem):
+    file_watcher_manager.stop_watching(project_path)
+
+# Multi-project support: project_path -> RAG system, built on first use
+rag_systems = ProjectRegistry(
+    factory=create_rag_system,
+    max_loaded=settings.max_loaded_projects,
+    max_memory_mb=settings.max_loaded_projects_memory_mb,
+    on_load=on_project_loaded,
+    on_evict=on_project_evicted
+)
+
+@asynccontextmanager
+async def leased_rag_systems(project_paths: List[str], enforce_limits: bool = True):
+    """Load projects off the event loop and keep them loaded until the block ends
+
+    Leased systems are never unloaded under a request that still uses them.
+    With enforce_limits=False loading the targets unloads no other project;
+    the limits apply again once the block ends.
+    """
+    async def acquire(path: str) -> LocalRAGSystem:
+        if rag_systems.is_loaded(path):
+            return rag_systems.acquire(path, enforce_limits=enforce_limits)
+        return await query_batcher.run(rag_systems.acquire, path, enforce_limits)
+
+    systems = await asyncio.gather(*(acquire(path) for path in project_paths), return_exceptions=True)
+    acquired = [system for system in systems if not isinstance(system, BaseException)]
+    try:
+        for system in systems:
+            if isinstance(system, BaseException):
+                raise system
+        yield dict(zip(project_paths, systems))
+    finally:
+        if acquired:
+            # May unload projects over the limits, which saves their indexes
+            await query_batcher.run(rag_systems.release, *acquired)
+
+@asynccontextmanager
+async def leased_rag_system(project_path: str):
+    """One project's RAG system, kept loaded until the block ends"""
+    async with leased_rag_systems([project_path]) as systems:
+        yield systems[project_path]
+
+# Default model acquired by the warm-up and held until shutdown, so it stays
+# loaded even while no project uses it
+warm_model_name: Optional[str] = None
+
+def warm_up():
+    """Import the heavy libraries, load the default model and run one encode
+
+    Runs in a background thread so the server answers /health/live at once;
+    /health/ready reports ready when this finishes.
+    """
+    global warm_model_name
+    try:
+        with startup.phase("import_chromadb"):
+            import chromadb  # noqa: F401
+        if settings.embedding_backend == "torch":
+            # The ONNX backends need neither torch nor sentence-transformers
+            with startup.phase("import_sentence_transformers"):
+                import sentence_transformers  # noqa: F401
+        with startup.phase("load_tokenizer"):
+            ContextManager(max_tokens=settings.max_context_tokens)
+        with startup.phase("load_embedding_model"):
+            model = model_registry.acquire(settings.embedding_model, settings.embedding_backend)
+            warm_model_name = settings.embedding_model
+        with startup.phase("warm_up_encode"):
+            model.encode(["def warm_up(): pass"], show_progress_bar=False)
+    except Exception as e:
+        startup.mark_failed(str(e))
+        return
+
+    if current_project is not None:
+        try:
+            with startup.phase("load_current_project"):
+                rag_systems.get(current_project)
+        except Exception as e:
+            # Still ready: the project is retried on its first query
+            logger.warning(f"Could not preload project {current_project}: {e}")
+    startup.mark_ready()
 
 def load_existing_projects():
-    """Load previously indexed projects on startup"""
-    global rag_systems, current_project
+    """Register previously indexed projects on startup; they are loaded on first use"""
+    global current_project
     
     logger.info("Loading existing indexed projects...")
     chroma_db_path = Path(settings.vector_db_path)
@@ -92,58 +298,47 @@ def load_existing_projects():
                 if not project_path.exists():
                     logger.warning(f"Project path no longer exists: {project_root}")
                     continue
-                logger.info(f"Loading project: {project_root}")
-                rag_system = LocalRAGSystem(
-                    project_root=project_root,
-                    vector_db_path=settings.vector_db_path,
-                    embedding_model=embedding_model,
-                    redis_url=settings.redis_url,
-                    max_context_tokens=settings.max_context_tokens
+                indexed_files = len(metadata.get("indexed_files", {}))
+                rag_systems.register(
+                    project_root,
+                    embedding_model,
+                    indexed_files=indexed_files,
+                    total_chunks=metadata.get("total_chunks", 0)
                 )
-                rag_systems[project_root] = rag_system
                 project_models[project_root] = embedding_model
                 if current_project is None:
                     current_project = project_root
-                logger.info(f"✅ Loaded project: {project_root} ({len(rag_system._indexed_files)} files, model: {embedding_model})")
+                logger.info(f"✅ Registered project: {project_root} ({indexed_files} files, model: {embedding_model})")
         except Exception as e:
             logger.error(f"Error loading project from {metadata_file}: {e}", exc_info=True)
     
     if rag_systems:
-        logger.info(f"Successfully loaded {len(rag_systems)} projects")
+        logger.info(f"Successfully registered {len(rag_systems)} projects")
     else:
         logger.info("No projects were loaded")
 
-def file_watcher_background_task():
-    """Background task to process pending file changes"""
-    logger.info("File watcher background task started")
-    while not watcher_thread_stop.is_set():
-        try:
-            file_watcher_manager.process_all_pending_changes()
-        except Exception as e:
-            logger.error(f"Error in file watcher background task: {e}", exc_info=True)
-        time.sleep(1)  # Check every second
-    logger.info("File watcher background task stopped")
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global watcher_thread
     logger.info("🚀 Starting RAG Server...")
     
-    # Load existing indexed projects
-    load_existing_projects()
+    # Load existing indexed projects; each watched project runs its own change worker
+    with startup.phase("register_projects"):
+        load_existing_projects()
     
-    # Start file watcher background task
-    watcher_thread = threading.Thread(target=file_watcher_background_task, daemon=True)
-    watcher_thread.start()
-    logger.info("File watcher background task thread started")
+    if settings.warm_up_on_startup:
+        threading.Thread(target=warm_up, name="rag-warm-up", daemon=True).start()
+    else:
+        startup.mark_ready()
     
     yield
     
     logger.info("Shutting down RAG Server...")
-    watcher_thread_stop.set()
-    if watcher_thread:
-        watcher_thread.join(timeout=5)
     file_watcher_manager.stop_all()
+    if warm_model_name is not None:
+        model_registry.release(warm_model_name, settings.embedding_backend)
+    query_batcher.shutdown()
+    if embedding_cache is not None:
+        embedding_cache.close()
 
 app = FastAPI(
     title="Local RAG Server for GitHub Copilot",
@@ -173,6 +368,17 @@ class QueryRequest(BaseModel):
     max_results: int = Field(default=5, ge=1, le=20)
     include_metadata: bool = Field(default=True)
     project_path: Optional[str] = Field(default=None, description="Specific project to query (optional, uses current if not specified)")
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = Field(
+        default=None,
+        description="vector, hybrid (vector + BM25) or lexical (BM25 only, no model call); defaults to RETRIEVAL_MODE"
+    )
+
+class FederatedQueryRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    max_results: int = Field(default=5, ge=1, le=20)
+    include_metadata: bool = Field(default=True)
+    project_paths: Optional[List[str]] = Field(default=None, description="Projects to search (Windows or WSL paths); all indexed projects if omitted")
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = Field(default=None)
 
 class SwitchRequest(BaseModel):
     project_path: str = Field(..., description="Project path to switch to (Windows or WSL)")
@@ -190,14 +396,33 @@ async def health_check():
         "status": "healthy",
         "version": "2.0.0",
         "indexed_projects": len(rag_systems),
+        "loaded_projects": rag_systems.get_stats()["loaded"],
         "current_project": current_project,
         "projects": list(rag_systems.keys()),
-        "vector_db_status": "healthy" if Path(settings.vector_db_path).exists() else "not_initialized"
+        "vector_db_status": "healthy" if Path(settings.vector_db_path).exists() else "not_initialized",
+        "query_batching": query_batcher.get_stats(),
+        "startup": startup.get_stats()
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """503 until the warm-up has loaded the default model, with the startup breakdown"""
+    stats = startup.get_stats()
+    if not stats["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "failed" if stats["error"] else "starting", "startup": stats}
+        )
+    return {"status": "ready", "startup": stats}
+
 @app.post("/index")
 async def index_project(request: IndexRequest, background_tasks: BackgroundTasks):
-    global rag_systems, current_project
+    global current_project
     
     try:
         wsl_path = convert_windows_path_to_wsl(request.project_path)
@@ -207,25 +432,20 @@ async def index_project(request: IndexRequest, background_tasks: BackgroundTasks
         # Determine embedding model
         embedding_model = request.model or project_models.get(wsl_path) or settings.embedding_model
         # Create or update RAG system for this project
-        rag_system = LocalRAGSystem(
-            project_root=wsl_path,
-            vector_db_path=settings.vector_db_path,
-            embedding_model=embedding_model,
-            redis_url=settings.redis_url
-        )
-        rag_systems[wsl_path] = rag_system
+        rag_system = await query_batcher.run(create_rag_system, wsl_path, embedding_model)
+        # Release the previous instance only after the new one holds the model,
+        # so re-indexing with the same model never unloads and reloads it
+        previous = rag_systems.put(wsl_path, rag_system)
+        if previous is not None:
+            rag_systems.retire(previous)
         project_models[wsl_path] = embedding_model
         current_project = wsl_path  # Set as current project
         # Start file watcher if enabled
         logger.info(f"File watcher enabled: {settings.file_watcher_enabled}")
         if settings.file_watcher_enabled:
             logger.info(f"Starting file watcher for: {wsl_path}")
-            file_watcher_manager.start_watching(
-                project_path=wsl_path,
-                rag_system=rag_system,
-                debounce_seconds=settings.file_watcher_debounce_seconds,
-                file_extensions=set(request.file_extensions) if request.file_extensions else None
-            )
+            watched_projects[wsl_path] = request.file_extensions
+            start_project_watcher(wsl_path, rag_system, request.file_extensions)
             logger.info(f"File watcher started for: {wsl_path}")
         background_tasks.add_task(
             rag_system.index_project,
@@ -238,7 +458,8 @@ async def index_project(request: IndexRequest, background_tasks: BackgroundTasks
             "project_path": wsl_path,
             "file_extensions": request.file_extensions,
             "embedding_model": embedding_model,
-            "total_projects": len(rag_systems)
+            "total_projects": len(rag_systems),
+            "model_registry": model_registry.get_stats()
         }
     except Exception as e:
         logger.error(f"Indexing error: {str(e)}", exc_info=True)
@@ -246,7 +467,7 @@ async def index_project(request: IndexRequest, background_tasks: BackgroundTasks
 
 @app.post("/query", response_model=QueryResponse)
 async def query_with_context(request: QueryRequest):
-    global rag_systems, current_project
+    global current_project
     
     if not rag_systems:
         raise HTTPException(status_code=400, detail="No project indexed. Use POST /index first")
@@ -268,40 +489,100 @@ async def query_with_context(request: QueryRequest):
             current_project = list(rag_systems.keys())[0]
         target_project = current_project
     
-    rag_system = rag_systems[target_project]
-    
     try:
-        logger.info(f"Processing query for project '{target_project}': {request.query[:100]}...")
-        
-        optimized_prompt = rag_system.query(
-            query=request.query,
-            max_results=request.max_results
-        )
+        async with leased_rag_system(target_project) as rag_system:
+            logger.info(f"Processing query for project '{target_project}': {request.query[:100]}...")
+            
+            result = await rag_system.aquery(
+                query=request.query,
+                max_results=request.max_results,
+                batcher=query_batcher,
+                retrieval_mode=request.retrieval_mode
+            )
+            
+            metadata = None
+            if request.include_metadata:
+                metadata = {
+                    "project_root": str(rag_system.project_root),
+                    "queried_project": target_project,
+                    "indexed_files": rag_system.get_indexed_file_count(),
+                    "total_chunks": rag_system.get_total_chunk_count(),
+                    "embedding_model": rag_system.embedding_model,
+                    "available_projects": list(rag_systems.keys()),
+                    "retrieved_chunks": len(result.chunks),
+                    "distances": result.distances,
+                    "retrieval_mode": result.retrieval_mode,
+                    "cached": result.cached
+                }
+            
+            return QueryResponse(
+                optimized_prompt=result.prompt,
+                context_chunks=result.context_chunks,
+                token_count=result.token_count,
+                metadata=metadata
+            )
         
-        search_results = rag_system.vector_store.search_similar(request.query, request.max_results)
-        context_chunks = len(search_results.get("documents", [[]])[0]) if search_results.get("documents") else 0
-        token_count = rag_system.context_manager.count_tokens(optimized_prompt)
+    except Exception as e:
+        logger.error(f"Query error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
+@app.post("/query/federated", response_model=QueryResponse)
+async def federated_query_with_context(request: FederatedQueryRequest):
+    """Search several projects concurrently and build one prompt under the shared token budget"""
+    global federated_context_manager
+    
+    if not rag_systems:
+        raise HTTPException(status_code=400, detail="No project indexed. Use POST /index first")
+    
+    if request.project_paths:
+        targets = {}
+        for project_path in request.project_paths:
+            wsl_path = convert_windows_path_to_wsl(project_path)
+            if wsl_path not in rag_systems:
+                raise HTTPException(status_code=404, detail=f"Project not indexed: {wsl_path}")
+            targets[wsl_path] = None
+    else:
+        targets = dict.fromkeys(rag_systems.keys())
+    if federated_context_manager is None:
+        federated_context_manager = ContextManager(max_tokens=settings.max_context_tokens)
+    
+    try:
+        logger.info(f"Processing federated query over {len(targets)} projects: {request.query[:100]}...")
+        start = time.perf_counter()
+        # Every target stays loaded for the whole query, even past the project limits
+        async with leased_rag_systems(list(targets), enforce_limits=False) as systems:
+            result, breakdown = await federated_query(
+                systems,
+                query=request.query,
+                max_results=request.max_results,
+                batcher=query_batcher,
+                context_manager=federated_context_manager,
+                retrieval_mode=request.retrieval_mode
+            )
         
         metadata = None
         if request.include_metadata:
             metadata = {
-                "project_root": str(rag_system.project_root),
-                "queried_project": target_project,
-                "indexed_files": rag_system.get_indexed_file_count(),
-                "total_chunks": rag_system.get_total_chunk_count(),
-                "embedding_model": settings.embedding_model,
-                "available_projects": list(rag_systems.keys())
+                "queried_projects": list(targets.keys()),
+                "retrieved_chunks": len(result.chunks),
+                "distances": result.distances,
+                "sources": [
+                    {"project": m.get("project"), "file_path": m.get("file_path")}
+                    for m in result.metadatas
+                ],
+                "projects": breakdown,
+                "total_latency_ms": round((time.perf_counter() - start) * 1000.0, 2)
             }
         
         return QueryResponse(
-            optimized_prompt=optimized_prompt,
-            context_chunks=context_chunks,
-            token_count=token_count,
+            optimized_prompt=result.prompt,
+            context_chunks=result.context_chunks,
+            token_count=result.token_count,
             metadata=metadata
         )
         
     except Exception as e:
-        logger.error(f"Query error: {str(e)}", exc_info=True)
+        logger.error(f"Federated query error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 @app.get("/models")
@@ -309,44 +590,65 @@ async def get_models():
     """List available embedding models"""
     return AVAILABLE_MODELS
 
-@app.get("/projects/model")
-async def get_project_model(project_path: str):
-    """Get embedding model for a project (query param)"""
-    wsl_path = convert_windows_path_to_wsl(project_path)
-    model = project_models.get(wsl_path) or settings.embedding_model
-    return {"project_path": wsl_path, "embedding_model": model}
+@app.get("/cache/stats")
+async def get_query_cache_stats():
+    """Size and hit/miss/eviction counters of the query result and query embedding caches"""
+    stats = await query_batcher.run(query_cache.get_stats)
+    stats["query_embeddings"] = query_embedding_cache.get_stats()
+    return stats
 
-@app.post("/projects/model/change")
-async def change_project_model(project_path: str, body: Dict):
-    """Change embedding model for a project (query param)"""
-    wsl_path = convert_windows_path_to_wsl(project_path)
+@app.get("/cache/embeddings")
+async def get_embedding_cache_stats():
+    """Hit/miss/eviction counters and size of the persistent embedding cache"""
+    if embedding_cache is None:
+        return {"enabled": False}
+    return embedding_cache.get_stats()
+
+@app.get("/models/loaded")
+async def get_loaded_models():
+    """Show shared embedding models in memory and the memory saved by sharing"""
+    return model_registry.get_stats()
+
+def apply_model_change(wsl_path: str, body: Dict) -> Dict:
+    """Switch a project to another embedding model, optionally rebuilding its RAG system"""
     model = body.get("model")
     auto_reindex = body.get("auto_reindex", False)
     if model not in AVAILABLE_MODELS:
         raise HTTPException(status_code=400, detail=f"Model not available: {model}")
     # Remove old index (delete vector store, clear cache)
     if wsl_path in rag_systems:
-        rag_systems[wsl_path].clear_cache()
-        del rag_systems[wsl_path]
+        old_system = rag_systems.pop(wsl_path)
+        if old_system is not None:
+            old_system.clear_cache()
+            rag_systems.retire(old_system)
     project_models[wsl_path] = model
     # Optionally start reindex
     reindex_started = False
     if auto_reindex:
-        rag_system = LocalRAGSystem(
-            project_root=wsl_path,
-            vector_db_path=settings.vector_db_path,
-            embedding_model=model,
-            redis_url=settings.redis_url
-        )
+        rag_system = create_rag_system(wsl_path, model)
         rag_systems[wsl_path] = rag_system
         reindex_started = True
     return {
         "status": "ok",
         "project_path": wsl_path,
         "embedding_model": model,
-        "reindex_started": reindex_started
+        "reindex_started": reindex_started,
+        "model_registry": model_registry.get_stats()
     }
 
+@app.get("/projects/model")
+async def get_project_model(project_path: str):
+    """Get embedding model for a project (query param)"""
+    wsl_path = convert_windows_path_to_wsl(project_path)
+    model = project_models.get(wsl_path) or settings.embedding_model
+    return {"project_path": wsl_path, "embedding_model": model}
+
+@app.post("/projects/model/change")
+async def change_project_model(project_path: str, body: Dict):
+    """Change embedding model for a project (query param)"""
+    wsl_path = convert_windows_path_to_wsl(project_path)
+    return apply_model_change(wsl_path, body)
+
 # Keep path param versions for backwards compatibility
 @app.get("/projects/{project_path}/model")
 async def get_project_model_path(project_path: str):
@@ -357,37 +659,11 @@ async def get_project_model_path(project_path: str):
 @app.post("/projects/{project_path}/model")
 async def set_project_model_path(project_path: str, body: Dict):
     wsl_path = convert_windows_path_to_wsl(project_path)
-    model = body.get("model")
-    auto_reindex = body.get("auto_reindex", False)
-    if model not in AVAILABLE_MODELS:
-        raise HTTPException(status_code=400, detail=f"Model not available: {model}")
-    # Remove old index (delete vector store, clear cache)
-    if wsl_path in rag_systems:
-        rag_systems[wsl_path].clear_cache()
-        del rag_systems[wsl_path]
-    project_models[wsl_path] = model
-    # Optionally start reindex
-    reindex_started = False
-    if auto_reindex:
-        rag_system = LocalRAGSystem(
-            project_root=wsl_path,
-            vector_db_path=settings.vector_db_path,
-            embedding_model=model,
-            redis_url=settings.redis_url
-        )
-        rag_systems[wsl_path] = rag_system
-        reindex_started = True
-    return {
-        "status": "ok",
-        "project_path": wsl_path,
-        "embedding_model": model,
-        "reindex_started": reindex_started
-    }
+    return apply_model_change(wsl_path, body)
 
 @app.get("/stats")
 async def get_statistics(project_path: Optional[str] = None):
     """Get statistics for a specific project or current project"""
-    global rag_systems, current_project
     
     if not rag_systems:
         raise HTTPException(status_code=400, detail="No project indexed")
@@ -401,43 +677,82 @@ async def get_statistics(project_path: Optional[str] = None):
     else:
         target_project = current_project or list(rag_systems.keys())[0]
     
-    rag_system = rag_systems[target_project]
     model = project_models.get(target_project) or settings.embedding_model
-    return {
-        "project_root": str(rag_system.project_root),
-        "indexed_files": rag_system.get_indexed_file_count(),
-        "total_chunks": rag_system.get_total_chunk_count(),
-        "vector_db_size": rag_system.get_vector_db_size(),
-        "embedding_model": model,
-        "is_current": target_project == current_project,
-        "all_projects": list(rag_systems.keys())
-    }
+    async with leased_rag_system(target_project) as rag_system:
+        return {
+            "project_root": str(rag_system.project_root),
+            "indexed_files": rag_system.get_indexed_file_count(),
+            "total_chunks": rag_system.get_total_chunk_count(),
+            "vector_db_size": rag_system.get_vector_db_size(),
+            "embedding_model": model,
+            "last_index": rag_system.last_index_report,
+            "index_generation": rag_system.index_generation,
+            "vector_index": rag_system.vector_store.index.get_stats(),
+            "lexical_index": rag_system.vector_store.lexical_index.get_stats(),
+            "symbols": rag_system.vector_store.symbol_index.get_stats(),
+            "is_current": target_project == current_project,
+            "all_projects": list(rag_systems.keys())
+        }
+
+@app.get("/symbols")
+async def find_symbols(
+    name: str,
+    mode: Literal["exact", "prefix", "fuzzy"] = "prefix",
+    limit: int = 20,
+    project_path: Optional[str] = None
+):
+    """Find where classes and functions are defined, without touching the embedding model"""
+    if not rag_systems:
+        raise HTTPException(status_code=400, detail="No project indexed")
+    
+    target_project = convert_windows_path_to_wsl(project_path) if project_path else (
+        current_project or list(rag_systems.keys())[0]
+    )
+    if target_project not in rag_systems:
+        raise HTTPException(status_code=404, detail=f"Project not found: {target_project}")
+    
+    async with leased_rag_system(target_project) as rag_system:
+        symbols = rag_system.find_symbols(name, mode, max(1, min(limit, 200)))
+    return {"project_path": target_project, "name": name, "mode": mode, "symbols": symbols}
+
+@app.post("/projects/gc")
+async def collect_project_garbage(project_path: str):
+    """Remove chunks of a project that no indexed file claims anymore"""
+    wsl_path = convert_windows_path_to_wsl(project_path)
+    if wsl_path not in rag_systems:
+        raise HTTPException(status_code=404, detail=f"Project not found: {wsl_path}")
+    async with leased_rag_system(wsl_path) as rag_system:
+        result = await query_batcher.run(rag_system.collect_garbage)
+    return {"project_path": wsl_path, **result}
+
+@app.get("/watchers")
+async def get_watcher_stats():
+    """Per-project file watcher statistics, including save-to-searchable latency"""
+    return file_watcher_manager.get_stats()
 
 @app.get("/projects")
 async def list_projects():
-    """List all indexed projects"""
-    global rag_systems, current_project
-    
+    """List all indexed projects and whether each is loaded"""
     projects = []
-    for path, rag_sys in rag_systems.items():
+    for project in rag_systems.describe():
         projects.append({
-            "path": path,
-            "name": Path(path).name,
-            "indexed_files": rag_sys.get_indexed_file_count(),
-            "total_chunks": rag_sys.get_total_chunk_count(),
-            "is_current": path == current_project
+            "path": project["path"],
+            "name": Path(project["path"]).name,
+            **{key: value for key, value in project.items() if key != "path"},
+            "is_current": project["path"] == current_project
         })
     
     return {
         "total_projects": len(projects),
         "current_project": current_project,
+        "registry": rag_systems.get_stats(),
         "projects": projects
     }
 
 @app.post("/switch")
 async def switch_project(request: SwitchRequest):
     """Switch the current/active project"""
-    global rag_systems, current_project
+    global current_project
     
     wsl_path = convert_windows_path_to_wsl(request.project_path)
     
@@ -458,7 +773,7 @@ async def switch_project(request: SwitchRequest):
 @app.delete("/clear")
 async def clear_index(project_path: Optional[str] = None):
     """Clear a specific project or all projects"""
-    global rag_systems, current_project
+    global current_project
     
     if not rag_systems:
         return {"status": "no_index", "message": "No index to clear"}
@@ -467,9 +782,12 @@ async def clear_index(project_path: Optional[str] = None):
         # Clear specific project
         wsl_path = convert_windows_path_to_wsl(project_path)
         if wsl_path in rag_systems:
-            rag_systems[wsl_path].clear_cache()
-            del rag_systems[wsl_path]
             file_watcher_manager.stop_watching(wsl_path)
+            watched_projects.pop(wsl_path, None)
+            rag_system = rag_systems.pop(wsl_path)
+            if rag_system is not None:
+                rag_system.clear_cache()
+                rag_systems.retire(rag_system)
             if current_project == wsl_path:
                 current_project = list(rag_systems.keys())[0] if rag_systems else None
             return {"status": "cleared", "message": f"Project cleared: {wsl_path}"}
@@ -477,10 +795,11 @@ async def clear_index(project_path: Optional[str] = None):
             raise HTTPException(status_code=404, detail=f"Project not found: {wsl_path}")
     else:
         # Clear all projects
-        for rag_sys in rag_systems.values():
-            rag_sys.clear_cache()
-        rag_systems.clear()
         file_watcher_manager.stop_all()
+        watched_projects.clear()
+        for rag_sys in rag_systems.clear():
+            rag_sys.clear_cache()
+            rag_systems.retire(rag_sys)
         current_project = None
         return {"status": "cleared", "message": "All projects cleared"}
 
@@ -0,0 +1,120 @@
+"""Process-wide registry of shared embedding models"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+from .encoders import DEFAULT_ONNX_DIR, create_encoder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ModelEntry:
+    """A loaded model together with its bookkeeping"""
+    model: Any
+    ref_count: int = 0
+    memory_bytes: int = 0
+    load_seconds: float = 0.0
+
+
+class EmbeddingModelRegistry:
+    """Reference-counted cache of embedding models keyed by model name and backend
+
+    Every VectorStore acquires its encoder here instead of loading its own
+    model, so projects using the same model and backend share one copy of
+    the weights. A model is unloaded when its last user releases it.
+    """
+
+    def __init__(self, onnx_dir: str = DEFAULT_ONNX_DIR):
+        # Where ONNX exports are cached; set from the server settings
+        self.onnx_dir = onnx_dir
+        self._entries: Dict[Tuple[str, str], _ModelEntry] = {}
+        self._lock = threading.Lock()
+        # One lock per model so two different models can load in parallel
+        # while concurrent requests for the same model wait for a single load
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def acquire(self, model_name: str, backend: str = "torch"):
+        """Return the shared encoder, loading it on first use"""
+        key = (model_name, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.ref_count += 1
+                logger.debug(f"Reusing embedding model {model_name} [{backend}] (refs: {entry.ref_count})")
+                return entry.model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.ref_count += 1
+                    return entry.model
+
+            logger.info(f"Loading embedding model: {model_name} [{backend}]")
+            start = time.perf_counter()
+            model = create_encoder(model_name, backend, onnx_dir=self.onnx_dir)
+            entry = _ModelEntry(
+                model=model,
+                memory_bytes=model.memory_bytes(),
+                load_seconds=time.perf_counter() - start
+            )
+            logger.info(
+                f"Loaded embedding model {model_name} [{model.backend}] in {entry.load_seconds:.2f}s "
+                f"(~{entry.memory_bytes / (1024 * 1024):.1f} MB)"
+            )
+
+            with self._lock:
+                entry.ref_count = 1
+                self._entries[key] = entry
+            return model
+
+    def release(self, model_name: str, backend: str = "torch") -> None:
+        """Drop one reference and unload the model when it is no longer used"""
+        key = (model_name, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                logger.warning(f"Release of unknown embedding model: {model_name} [{backend}]")
+                return
+            entry.ref_count -= 1
+            if entry.ref_count > 0:
+                logger.debug(f"Released embedding model {model_name} [{backend}] (refs: {entry.ref_count})")
+                return
+            del self._entries[key]
+            self._load_locks.pop(key, None)
+        logger.info(f"Unloaded embedding model: {model_name} [{backend}]")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Report loaded models, their users and the memory saved by sharing"""
+        with self._lock:
+            models = [
+                {
+                    "model": name,
+                    "backend": entry.model.backend,
+                    "ref_count": entry.ref_count,
+                    "memory_mb": round(entry.memory_bytes / (1024 * 1024), 2),
+                    "load_seconds": round(entry.load_seconds, 2),
+                }
+                for (name, _), entry in self._entries.items()
+            ]
+            loaded_bytes = sum(e.memory_bytes for e in self._entries.values())
+            # Without sharing every reference would hold its own copy
+            saved_bytes = sum(
+                e.memory_bytes * (e.ref_count - 1) for e in self._entries.values()
+            )
+
+        return {
+            "loaded_models": len(models),
+            "memory_mb": round(loaded_bytes / (1024 * 1024), 2),
+            "saved_memory_mb": round(saved_bytes / (1024 * 1024), 2),
+            "models": models,
+        }
+
+
+# Shared by every VectorStore in the process
+model_registry = EmbeddingModelRegistry()
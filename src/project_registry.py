@@ -0,0 +1,323 @@
+"""Lazily loaded RAG systems with LRU eviction of idle projects"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ProjectEntry:
+    """A known project and, while it is loaded, its RAG system"""
+    embedding_model: str
+    indexed_files: int = 0
+    total_chunks: int = 0
+    system: Any = None
+    last_used: float = 0.0
+    load_seconds: float = 0.0
+
+
+class ProjectRegistry:
+    """Registry of indexed projects whose RAG systems are built on first use
+
+    Projects are registered from their metadata alone. The first lookup
+    creates the RAG system through factory; afterwards the least recently
+    used idle projects are unloaded whenever more than max_loaded projects
+    are loaded or their estimated memory exceeds max_memory_mb (0 disables
+    a limit). Projects that are being indexed or are leased by a request
+    (acquire()/lease()) are never unloaded, and a system that is evicted,
+    replaced or removed while leased is closed only when its last lease ends.
+
+    Membership, len() and iteration cover every registered project, loaded
+    or not; only get() and [] load.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, str], Any],
+        max_loaded: int = 0,
+        max_memory_mb: float = 0.0,
+        on_load: Optional[Callable[[str, Any], None]] = None,
+        on_evict: Optional[Callable[[str, Any], None]] = None
+    ):
+        self.factory = factory
+        self.max_loaded = max_loaded
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.on_load = on_load
+        self.on_evict = on_evict
+        self._entries: Dict[str, _ProjectEntry] = {}
+        self._lock = threading.RLock()
+        # One lock per project so a slow load does not block other projects
+        self._load_locks: Dict[str, threading.Lock] = {}
+        # id(system) -> number of requests holding it
+        self._leases: Dict[int, int] = {}
+        # id(system) -> system to close once its last lease ends
+        self._retired: Dict[int, Any] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(
+        self,
+        project_root: str,
+        embedding_model: str,
+        indexed_files: int = 0,
+        total_chunks: int = 0
+    ) -> None:
+        """Make a project known without loading it"""
+        with self._lock:
+            entry = self._entries.get(project_root)
+            if entry is None:
+                self._entries[project_root] = _ProjectEntry(
+                    embedding_model=embedding_model,
+                    indexed_files=indexed_files,
+                    total_chunks=total_chunks
+                )
+            else:
+                entry.embedding_model = embedding_model
+
+    def __contains__(self, project_root: object) -> bool:
+        return project_root in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def keys(self) -> List[str]:
+        return list(self._entries)
+
+    def is_loaded(self, project_root: str) -> bool:
+        entry = self._entries.get(project_root)
+        return entry is not None and entry.system is not None
+
+    def get_loaded(self, project_root: str):
+        """The RAG system if it is loaded, without loading it"""
+        entry = self._entries.get(project_root)
+        return entry.system if entry is not None else None
+
+    def loaded_items(self) -> List[Tuple[str, Any]]:
+        with self._lock:
+            return [(path, entry.system) for path, entry in self._entries.items() if entry.system is not None]
+
+    def __getitem__(self, project_root: str):
+        return self.get(project_root)
+
+    def get(self, project_root: str):
+        """Return the project's RAG system, loading it on first use"""
+        return self._get(project_root, lease=False, enforce_limits=True)
+
+    def acquire(self, project_root: str, enforce_limits: bool = True):
+        """Like get(), but the system stays loaded until release()
+
+        With enforce_limits=False loading it does not unload other projects;
+        the limits are enforced again when the lease is released. Requests
+        that load several projects at once use this, so that loading one
+        target never unloads another.
+        """
+        return self._get(project_root, lease=True, enforce_limits=enforce_limits)
+
+    def release(self, *systems) -> None:
+        """End leases taken by acquire(), then enforce the limits once"""
+        retired = []
+        with self._lock:
+            for system in systems:
+                key = id(system)
+                count = self._leases.get(key, 0) - 1
+                if count > 0:
+                    self._leases[key] = count
+                    continue
+                self._leases.pop(key, None)
+                if key in self._retired:
+                    retired.append(self._retired.pop(key))
+        for system in retired:
+            system.close()
+        self._enforce_limits()
+
+    @contextmanager
+    def lease(self, project_root: str, enforce_limits: bool = True):
+        """acquire() and release() around a block"""
+        system = self.acquire(project_root, enforce_limits=enforce_limits)
+        try:
+            yield system
+        finally:
+            self.release(system)
+
+    def retire(self, system) -> None:
+        """Close a system that left the registry, or once its last lease ends"""
+        with self._lock:
+            if self._leases.get(id(system)):
+                self._retired[id(system)] = system
+                return
+        system.close()
+
+    def _lease(self, system) -> None:
+        self._leases[id(system)] = self._leases.get(id(system), 0) + 1
+
+    def _get(self, project_root: str, lease: bool, enforce_limits: bool):
+        with self._lock:
+            entry = self._entries.get(project_root)
+            if entry is None:
+                raise KeyError(project_root)
+            if entry.system is not None:
+                entry.last_used = time.monotonic()
+                if lease:
+                    self._lease(entry.system)
+                return entry.system
+            load_lock = self._load_locks.setdefault(project_root, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(project_root)
+                if entry is None:
+                    raise KeyError(project_root)
+                if entry.system is not None:
+                    entry.last_used = time.monotonic()
+                    if lease:
+                        self._lease(entry.system)
+                    return entry.system
+                embedding_model = entry.embedding_model
+
+            logger.info(f"Loading project: {project_root} (model: {embedding_model})")
+            start = time.perf_counter()
+            system = self.factory(project_root, embedding_model)
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                entry = self._entries.get(project_root)
+                if entry is None:
+                    # Removed while loading
+                    system.close()
+                    raise KeyError(project_root)
+                entry.system = system
+                entry.last_used = time.monotonic()
+                entry.load_seconds = load_seconds
+                self.loads += 1
+                if lease:
+                    self._lease(system)
+            logger.info(f"Loaded project {project_root} in {load_seconds:.2f}s")
+
+        if self.on_load is not None:
+            self.on_load(project_root, system)
+        if enforce_limits:
+            self._enforce_limits(keep=project_root)
+        return system
+
+    def __setitem__(self, project_root: str, system) -> None:
+        self.put(project_root, system)
+
+    def put(self, project_root: str, system) -> Optional[Any]:
+        """Register a freshly created RAG system; returns the one it replaces, if any
+
+        The caller closes the returned system through retire().
+        """
+        with self._lock:
+            entry = self._entries.get(project_root)
+            previous = entry.system if entry is not None else None
+            self._entries[project_root] = _ProjectEntry(
+                embedding_model=system.embedding_model,
+                system=system,
+                last_used=time.monotonic()
+            )
+        self._enforce_limits(keep=project_root)
+        return previous
+
+    def pop(self, project_root: str, default=None):
+        """Forget a project; returns its RAG system if it was loaded, to retire()"""
+        with self._lock:
+            entry = self._entries.pop(project_root, None)
+            self._load_locks.pop(project_root, None)
+        if entry is None:
+            return default
+        return entry.system
+
+    def clear(self) -> List[Any]:
+        """Forget every project; returns the RAG systems that were loaded, to retire()"""
+        with self._lock:
+            systems = [entry.system for entry in self._entries.values() if entry.system is not None]
+            self._entries.clear()
+            self._load_locks.clear()
+        return systems
+
+    def evict(self, project_root: str) -> bool:
+        """Unload a project but keep it registered"""
+        with self._lock:
+            entry = self._entries.get(project_root)
+            if entry is None or entry.system is None:
+                return False
+            system = entry.system
+            entry.system = None
+            entry.indexed_files = system.get_indexed_file_count()
+            entry.total_chunks = system.get_total_chunk_count()
+            self.evictions += 1
+
+        if self.on_evict is not None:
+            self.on_evict(project_root, system)
+        self.retire(system)
+        logger.info(f"Unloaded idle project: {project_root}")
+        return True
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        """Unload least recently used idle projects until both limits hold"""
+        if not self.max_loaded and not self.max_memory_bytes:
+            return
+        while True:
+            with self._lock:
+                loaded = [
+                    (entry.last_used, path, entry.system)
+                    for path, entry in self._entries.items()
+                    if entry.system is not None
+                ]
+                over_count = self.max_loaded and len(loaded) > self.max_loaded
+                over_memory = self.max_memory_bytes and sum(
+                    system.estimate_memory_bytes() for _, _, system in loaded
+                ) > self.max_memory_bytes
+                if not over_count and not over_memory:
+                    return
+                victims = [
+                    path for _, path, system in sorted(loaded, key=lambda item: item[0])
+                    if path != keep and not self._leases.get(id(system)) and not system.is_busy()
+                ]
+            if not victims:
+                logger.warning("Project limits exceeded but every other loaded project is busy or in use")
+                return
+            self.evict(victims[0])
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Per-project state for listings"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._entries.items())
+        projects = []
+        for path, entry in items:
+            system = entry.system
+            info = {
+                "path": path,
+                "embedding_model": entry.embedding_model,
+                "loaded": system is not None,
+                "indexed_files": system.get_indexed_file_count() if system else entry.indexed_files,
+                "total_chunks": system.get_total_chunk_count() if system else entry.total_chunks,
+            }
+            if system is not None:
+                info["idle_seconds"] = round(now - entry.last_used, 1)
+                info["load_seconds"] = round(entry.load_seconds, 2)
+                info["memory_mb"] = round(system.estimate_memory_bytes() / (1024 * 1024), 2)
+            projects.append(info)
+        return projects
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = [entry.system for entry in self._entries.values() if entry.system is not None]
+        return {
+            "registered": len(self._entries),
+            "loaded": len(loaded),
+            "max_loaded": self.max_loaded,
+            "memory_mb": round(sum(s.estimate_memory_bytes() for s in loaded) / (1024 * 1024), 2),
+            "max_memory_mb": round(self.max_memory_bytes / (1024 * 1024), 2),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
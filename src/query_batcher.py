@@ -0,0 +1,146 @@
+"""Non-blocking query execution with dynamic micro-batching"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingBatch:
+    """Queries waiting to be searched against the same vector store"""
+    vector_store: Any
+    items: List[Tuple[str, int, asyncio.Future]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class QueryBatcher:
+    """Runs blocking query work on a bounded executor and merges concurrent searches
+
+    Searches against the same vector store that arrive within the batch window
+    are combined into one encode call and one multi-embedding collection query.
+    A batch is flushed early once it reaches max_batch_size.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        batch_window_ms: float = 5.0,
+        max_batch_size: int = 16
+    ):
+        self.batch_window = max(batch_window_ms, 0.0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="rag-query"
+        )
+        # Keyed by id() of the vector store; only touched from the event loop
+        self._pending: Dict[int, _PendingBatch] = {}
+        # Strong references so running batch tasks are not garbage collected
+        self._tasks: set = set()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._unique_queries = 0
+        self._largest_batch = 0
+
+        logger.info(
+            f"Query batcher initialized (workers: {max_workers}, "
+            f"window: {batch_window_ms}ms, max batch: {self.max_batch_size})"
+        )
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking callable on the bounded query executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def search(self, vector_store, query: str, n_results: int) -> Dict[str, Any]:
+        """Search the vector store, sharing the model call with concurrent requests"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = id(vector_store)
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch(vector_store=vector_store)
+            self._pending[key] = batch
+            batch.timer = loop.call_later(self.batch_window, self._flush, key)
+        batch.items.append((query, n_results, future))
+
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: int) -> None:
+        """Hand a pending batch over to the executor"""
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._execute(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, batch: _PendingBatch) -> None:
+        """Search all queries of a batch at once and resolve their futures"""
+        items = batch.items
+        # Clients often repeat the same query; encode each distinct one once
+        unique_queries = list(dict.fromkeys(query for query, _, _ in items))
+        n_results = max(n for _, n, _ in items)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._queries += len(items)
+            self._unique_queries += len(unique_queries)
+            self._largest_batch = max(self._largest_batch, len(items))
+
+        try:
+            results = await self.run(
+                batch.vector_store.search_similar_batch, unique_queries, n_results
+            )
+        except Exception as e:
+            logger.error(f"Batched search failed: {e}", exc_info=True)
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_query = dict(zip(unique_queries, results))
+        for query, n, future in items:
+            if not future.done():
+                future.set_result(self._truncate(by_query[query], n))
+
+        if len(items) > 1:
+            logger.debug(f"Served {len(items)} queries with one batched search")
+
+    @staticmethod
+    def _truncate(result: Dict[str, Any], n_results: int) -> Dict[str, Any]:
+        """Cut a result down to what the individual request asked for"""
+        return {key: [values[0][:n_results]] for key, values in result.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batching statistics since startup"""
+        with self._stats_lock:
+            return {
+                "batch_window_ms": self.batch_window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "batches": self._batches,
+                "queries": self._queries,
+                "unique_queries": self._unique_queries,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": round(self._queries / self._batches, 2) if self._batches else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the executor without waiting for in-flight queries"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
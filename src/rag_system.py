@@ -4,18 +4,53 @@
 
 import os
 import logging
+import dataclasses
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 import hashlib
 import json
+import threading
 
 from .vector_store import VectorStore
 from .context_manager import ContextManager
 from .code_parser import CodeParser
 from .cache_manager import CacheManager
+from .embedding_cache import EmbeddingCache
+from .indexing_pipeline import FileTask, IndexingConfig, IndexingPipeline
+from .file_discovery import DEFAULT_EXTENSIONS, iter_source_files
+from .symbol_index import SymbolDefinition, parse_symbol_query
+from .utils import make_chunk_id
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
+
+@dataclass
+class QueryResult:
+    """Everything a single retrieval produced, computed once per query"""
+    query: str
+    prompt: str
+    chunks: List[str] = field(default_factory=list)
+    distances: List[float] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    context_chunks: int = 0
+    token_count: int = 0
+    retrieval_mode: str = ""
+    cached: bool = False
+    
+    def to_json(self) -> str:
+        """Serialize for the query cache"""
+        data = asdict(self)
+        data.pop("cached")
+        return json.dumps(data)
+    
+    @classmethod
+    def from_json(cls, payload: str) -> "QueryResult":
+        """Restore a cached result"""
+        return cls(**json.loads(payload), cached=True)
+
 
 class LocalRAGSystem:
     """Main RAG system orchestrator"""
@@ -26,12 +61,27 @@ class LocalRAGSystem:
         vector_db_path: str = "/app/data/chroma_db",
     embedding_model: str = "paraphrase-multilingual-MiniLM-L12-v2",
         redis_url: Optional[str] = None,
-        max_context_tokens: int = 4000
+        max_context_tokens: int = 4000,
+        indexing_config: Optional[IndexingConfig] = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        cache_manager: Optional[CacheManager] = None,
+        retrieval_mode: str = "hybrid",
+        symbol_fast_path: bool = True,
+        embedding_backend: str = "torch",
+        index_backend: str = "chroma",
+        hnsw: bool = False,
+        quantization: str = "none"
     ):
         self.project_root = Path(project_root)
         self.vector_db_path = Path(vector_db_path)
         self.embedding_model = embedding_model
         self.max_context_tokens = max_context_tokens
+        self.indexing_config = indexing_config or IndexingConfig()
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+        self.retrieval_mode = retrieval_mode
+        self.symbol_fast_path = symbol_fast_path
+        self.last_index_report: Optional[Dict[str, Any]] = None
         
         # Generate project-specific collection name
         project_name = self.project_root.name
@@ -42,24 +92,49 @@ class LocalRAGSystem:
         self.vector_store = VectorStore(
             db_path=str(self.vector_db_path),
             embedding_model=embedding_model,
-            collection_name=collection_name
+            collection_name=collection_name,
+            embedding_cache=embedding_cache,
+            embedding_backend=embedding_backend,
+            index_backend=index_backend,
+            hnsw=hnsw,
+            quantization=quantization
         )
         
         self.context_manager = ContextManager(
             max_tokens=max_context_tokens
         )
         
-        self.code_parser = CodeParser()
+        # Chunks sized in tokens of the embedding model, so none gets truncated
+        self.code_parser = CodeParser.for_encoder(self.vector_store.embedding_model)
         
-        self.cache_manager = CacheManager(redis_url=redis_url) if redis_url else None
+        # Shared across projects when given, so the L1 memory bound is process-wide
+        self.cache_manager = cache_manager or CacheManager(redis_url=redis_url)
         self._project_id = str(self.project_root)
         
         # Persistent metadata file path
         self._metadata_file = self.vector_db_path / f"metadata_{collection_name}.json"
         
+        # Guards _indexed_files between indexing, the watcher and metadata saves
+        self._metadata_lock = threading.RLock()
+        # Serializes full indexing, incremental reindexing and garbage collection
+        self._index_lock = threading.RLock()
+        
+        # Bumped whenever the index content changes; part of every query cache
+        # key, so stale cached prompts are never served and never need deleting
+        self._generation = 0
+        self._stored_index_backend = index_backend
+        
         # Load or initialize indexed files tracking
-        self._indexed_files = self._load_metadata()  # file_path: file_hash
+        self._indexed_files = self._load_metadata()  # file_path: {hash, size, mtime_ns, inode, chunks}
         self._total_chunks = 0
+        if self._indexed_files and self._stored_index_backend != index_backend:
+            # The file records describe chunks held by the other backend
+            logger.warning(
+                f"Project was indexed with the {self._stored_index_backend} vector index; "
+                f"the {index_backend} index stays empty until the project is reindexed"
+            )
+            self.vector_store.clear_all()
+            self._indexed_files = {}
         
         logger.info(f"RAG System initialized for project: {self.project_root}")
         if self._indexed_files:
@@ -72,122 +147,437 @@ class LocalRAGSystem:
     ) -> Dict[str, Any]:
         """Index all relevant files in the project"""
         if file_extensions is None:
-            file_extensions = [
-                ".py", ".js", ".ts", ".jsx", ".tsx", 
-                ".java", ".cs", ".cpp", ".h", ".go", ".rs",
-                ".vue", ".rb", ".php", ".swift", ".kt"
-            ]
+            file_extensions = DEFAULT_EXTENSIONS
         
         logger.info(f"Starting indexing with extensions: {file_extensions}")
         
-        files_to_index = []
-        for ext in file_extensions:
-            files_to_index.extend(self.project_root.rglob(f"*{ext}"))
+        with self._index_lock:
+            pipeline = IndexingPipeline(
+                vector_store=self.vector_store,
+                code_parser=self.code_parser,
+                config=self.indexing_config
+            )
+            discovered = set()
+            listing_errors = []
+            report = pipeline.run(
+                self._scan_tasks(file_extensions, force_reindex, discovered, listing_errors),
+                on_file_recorded=self._on_file_recorded
+            )
+            
+            # Files deleted while nobody was watching. A walk that could not list
+            # some directory proves nothing about the files below it.
+            if listing_errors:
+                logger.warning(
+                    f"Could not list {len(listing_errors)} directories; "
+                    f"not removing files missing from this scan"
+                )
+            else:
+                vanished = self._vanished_files(discovered, file_extensions)
+                if vanished:
+                    logger.info(f"Removing {len(vanished)} files that no longer exist")
+                    self.remove_files(vanished)
+            report["gc"] = self.collect_garbage()
+            
+            if report["indexed_files"] or report["deleted_chunks"]:
+                self._bump_generation()
+            self._total_chunks = self.vector_store.get_collection_count()
+            
+            # Save metadata after indexing
+            self._save_metadata()
+        
+        logger.info(
+            f"Indexing complete: {report['indexed_files']} files, "
+            f"{report['total_chunks']} chunks in {report['wall_seconds']}s "
+            f"({report['embedded_chunks']} embedded, {report['reused_chunks']} reused, "
+            f"{report['deleted_chunks']} deleted)"
+        )
         
-        # Filter out common directories to skip
-        skip_dirs = {
-            "node_modules", ".git", "__pycache__", "venv", "env",
-            "dist", "build", ".next", "target", "bin", "obj"
+        self.last_index_report = report
+        return {
+            "indexed_files": report["indexed_files"],
+            "total_chunks": report["total_chunks"],
+            "skipped_files": report["unchanged_files"] + report["failed_files"],
+            "pipeline": report
         }
+    
+    def reindex_files(self, file_paths: List[str]) -> Dict[str, Any]:
+        """Re-parse, re-embed and upsert only the given files
         
-        files_to_index = [
-            f for f in files_to_index 
-            if not any(skip in f.parts for skip in skip_dirs)
-        ]
+        Paths that no longer exist are removed from the index instead.
+        """
+        with self._index_lock:
+            tasks = []
+            removed = []
+            for file_path in dict.fromkeys(str(Path(p)) for p in file_paths):
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    removed.append(file_path)
+                    continue
+                except OSError as e:
+                    logger.warning(f"Cannot stat {file_path}: {e}")
+                    continue
+                tasks.append(FileTask.from_stat(
+                    path=file_path,
+                    rel_path=os.path.relpath(file_path, str(self.project_root)),
+                    extension=os.path.splitext(file_path)[1],
+                    stat=stat,
+                    known=self._indexed_files.get(file_path)
+                ))
+            
+            if removed:
+                self.remove_files(removed)
+            
+            report = {"indexed_files": 0, "total_chunks": 0, "removed_files": len(removed)}
+            if tasks:
+                # A handful of files is parsed faster in-process than by spawning workers
+                config = self.indexing_config
+                if len(tasks) < 50:
+                    config = dataclasses.replace(config, workers=0)
+                pipeline = IndexingPipeline(
+                    vector_store=self.vector_store,
+                    code_parser=self.code_parser,
+                    config=config
+                )
+                pipeline_report = pipeline.run(tasks, on_file_recorded=self._on_file_recorded)
+                report.update(
+                    indexed_files=pipeline_report["indexed_files"],
+                    total_chunks=pipeline_report["total_chunks"],
+                    embedded_chunks=pipeline_report["embedded_chunks"],
+                    deleted_chunks=pipeline_report["deleted_chunks"]
+                )
+                if report["indexed_files"] or report["deleted_chunks"]:
+                    self._bump_generation()
+                self._total_chunks = self.vector_store.get_collection_count()
+                self._save_metadata()
         
-        logger.info(f"Found {len(files_to_index)} files to process")
+        logger.info(
+            f"Incremental reindex: {report['indexed_files']} files, "
+            f"{report['total_chunks']} chunks, {len(removed)} removed"
+        )
+        return report
+    
+    def remove_files(self, file_paths: List[str]) -> int:
+        """Delete all chunks of the given files from the index"""
+        removed = 0
+        with self._index_lock:
+            for file_path in file_paths:
+                file_path = str(Path(file_path))
+                self.vector_store.delete_by_file(
+                    os.path.relpath(file_path, str(self.project_root))
+                )
+                with self._metadata_lock:
+                    if self._indexed_files.pop(file_path, None) is not None:
+                        removed += 1
+            
+            if removed:
+                self._bump_generation()
+                self._total_chunks = self.vector_store.get_collection_count()
+                self._save_metadata()
+        return removed
+    
+    def collect_garbage(self) -> Dict[str, int]:
+        """Delete chunks that no indexed file claims anymore
         
-        indexed_count = 0
-        chunk_count = 0
+        Catches chunks of files that left the index and leftovers of files that
+        were indexed before chunks had content-derived IDs.
+        """
+        with self._index_lock:
+            root = str(self.project_root)
+            with self._metadata_lock:
+                records = dict(self._indexed_files)
+            
+            expected_ids = set()
+            legacy_files = set()
+            for file_path, record in records.items():
+                rel_path = os.path.relpath(file_path, root)
+                chunk_keys = record.get("chunk_keys")
+                if chunk_keys is None:
+                    # No recorded identities; keep whatever belongs to the file
+                    legacy_files.add(rel_path)
+                else:
+                    expected_ids.update(make_chunk_id(rel_path, key) for key in chunk_keys)
+            
+            scanned = 0
+            orphans = []
+            live_ids = set()
+            for chunk_id, rel_path in self.vector_store.iter_chunk_files():
+                scanned += 1
+                if chunk_id not in expected_ids and rel_path not in legacy_files:
+                    orphans.append(chunk_id)
+                else:
+                    live_ids.add(chunk_id)
+            
+            for start in range(0, len(orphans), 5000):
+                self.vector_store.delete_ids(orphans[start:start + 5000])
+            # BM25 postings and symbols whose chunks left the vector index another way
+            stale = self.vector_store.prune_auxiliary(live_ids)
+            if stale:
+                logger.info(f"Garbage collection removed {stale} stale lexical/symbol entries")
+            if orphans or stale:
+                self._bump_generation()
+                self._total_chunks = self.vector_store.get_collection_count()
+                self._save_metadata()
         
-        for file_path in files_to_index:
+        if orphans:
+            logger.info(f"Garbage collection removed {len(orphans)} orphaned chunks")
+        return {"scanned_chunks": scanned, "deleted_chunks": len(orphans)}
+    
+    def _vanished_files(self, discovered: set, file_extensions: List[str]) -> List[str]:
+        """Indexed files of the scanned extensions that the scan missed and that are really gone"""
+        wanted = set(file_extensions)
+        with self._metadata_lock:
+            missing = [
+                path for path in self._indexed_files
+                if path not in discovered and os.path.splitext(path)[1] in wanted
+            ]
+        vanished = []
+        for path in missing:
             try:
-                # Check if file needs reindexing
-                file_hash = self._get_file_hash(file_path)
-                
-                if not force_reindex and str(file_path) in self._indexed_files:
-                    if self._indexed_files[str(file_path)] == file_hash:
-                        logger.debug(f"Skipping unchanged file: {file_path}")
-                        continue
-                
-                # Read and parse file
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                
-                # Parse code into chunks
-                chunks = self.code_parser.parse_file(content, file_path.suffix)
-                
-                # Add metadata to chunks
-                for i, chunk in enumerate(chunks):
-                    chunk['file_path'] = str(file_path.relative_to(self.project_root))
-                    chunk['full_path'] = str(file_path)
-                    chunk['chunk_index'] = i
-                    chunk['file_extension'] = file_path.suffix
-                
-                # Store in vector database
-                self.vector_store.add_documents(chunks)
-                
-                self._indexed_files[str(file_path)] = file_hash
-                indexed_count += 1
-                chunk_count += len(chunks)
-                
-                if indexed_count % 10 == 0:
-                    logger.info(f"Indexed {indexed_count}/{len(files_to_index)} files...")
-                
-            except Exception as e:
-                logger.error(f"Error indexing {file_path}: {str(e)}")
+                os.stat(path)
+            except FileNotFoundError:
+                vanished.append(path)
+            except OSError as e:
+                logger.warning(f"Cannot stat {path}: {e}")
+        return vanished
+    
+    def _scan_tasks(
+        self,
+        file_extensions: List[str],
+        force_reindex: bool,
+        discovered: set,
+        listing_errors: List[str]
+    ) -> Iterator[FileTask]:
+        """Discovery stage: one stat() per file, compared later against the metadata"""
+        root = str(self.project_root)
+        for entry in iter_source_files(root, file_extensions, errors=listing_errors):
+            discovered.add(entry.path)
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                logger.debug(f"File vanished during discovery: {entry.path} ({e})")
                 continue
+            yield FileTask.from_stat(
+                path=entry.path,
+                rel_path=os.path.relpath(entry.path, root),
+                extension=os.path.splitext(entry.name)[1],
+                stat=stat,
+                known=self._indexed_files.get(entry.path),
+                force=force_reindex
+            )
+    
+    def _bump_generation(self) -> None:
+        """Invalidate every cached query of this project in O(1)"""
+        with self._metadata_lock:
+            self._generation += 1
+        logger.debug(f"Index generation of {self._project_id} is now {self._generation}")
+    
+    @property
+    def index_generation(self) -> int:
+        """Counter of index changes, persisted with the metadata"""
+        return self._generation
+    
+    def _on_file_recorded(self, file_path: str, record: Dict[str, Any]) -> None:
+        """Store hash and stat fields for a file once its chunks are written"""
+        with self._metadata_lock:
+            self._indexed_files[file_path] = {**self._indexed_files.get(file_path, {}), **record}
+    
+    def query(
+        self,
+        query: str,
+        max_results: int = 5,
+        retrieval_mode: Optional[str] = None
+    ) -> QueryResult:
+        """Query the RAG system with one embedding and one vector search
         
-        self._total_chunks = chunk_count
+        retrieval_mode overrides the system default: "vector", "hybrid"
+        (vector and BM25 fused by reciprocal rank) or "lexical" (BM25 only,
+        no model call).
+        """
+        mode = self._resolve_mode(retrieval_mode)
+        # Results computed now are cached under the generation they were read from
+        cache_key = self._cache_key(query, max_results, self._generation, mode)
         
-        # Save metadata after indexing
-        self._save_metadata()
+        # Check cache first
+        cached_result = self._get_cached_result(cache_key)
+        if cached_result:
+            logger.info("Returning cached result")
+            return cached_result
         
-        logger.info(f"Indexing complete: {indexed_count} files, {chunk_count} chunks")
+        definitions = self._exact_definitions(query, max_results)
+        if definitions:
+            mode = "symbol"
+            search_results = self.vector_store.get_definitions(definitions)
+        elif mode == "lexical":
+            search_results = self.vector_store.search_lexical(query, max_results)
+        elif mode == "hybrid":
+            candidates = self.vector_store.search_similar(query, self._fusion_candidates(max_results))
+            search_results = self.vector_store.fuse_with_lexical(query, candidates, max_results)
+        else:
+            search_results = self.vector_store.search_similar(query, max_results)
         
-        return {
-            "indexed_files": indexed_count,
-            "total_chunks": chunk_count,
-            "skipped_files": len(files_to_index) - indexed_count
-        }
+        return self._finish_query(query, search_results, cache_key, mode)
     
-    def query(
+    async def aquery(
         self,
         query: str,
-        max_results: int = 5
-    ) -> str:
-        """Query the RAG system and return optimized context"""
+        max_results: int,
+        batcher,
+        retrieval_mode: Optional[str] = None
+    ) -> QueryResult:
+        """Async variant of query that keeps model and database work off the event loop
         
-        # Check cache first
-        if self.cache_manager:
-            cached_result = self.cache_manager.get(self._project_id, query)
-            if cached_result:
-                logger.info("Returning cached result")
-                return cached_result
+        The vector search goes through the QueryBatcher so concurrent queries
+        share one encode call and one collection query.
+        """
+        mode = self._resolve_mode(retrieval_mode)
+        cache_key = self._cache_key(query, max_results, self._generation, mode)
+        
+        # An L1 hit is answered on the event loop without an executor hop
+        cached_result = self._get_cached_result(cache_key, local_only=True)
+        if not cached_result and self.cache_manager.has_remote:
+            cached_result = await batcher.run(self._get_cached_result, cache_key, check_local=False)
+        if cached_result:
+            logger.info("Returning cached result")
+            return cached_result
         
-        # Search vector store
-        search_results = self.vector_store.search_similar(query, max_results)
+        search_results, mode = await self.asearch(query, max_results, batcher, mode)
         
-        if not search_results or not search_results.get("documents"):
+        return await batcher.run(self._finish_query, query, search_results, cache_key, mode)
+    
+    async def asearch(
+        self,
+        query: str,
+        max_results: int,
+        batcher,
+        retrieval_mode: Optional[str] = None
+    ):
+        """Retrieve raw search results without building a prompt or touching the cache
+        
+        Returns (search_results, mode) where mode is "symbol" when the exact
+        symbol path answered the query.
+        """
+        mode = self._resolve_mode(retrieval_mode)
+        
+        # Exact symbol lookups are in-memory and skip the model and ANN search
+        definitions = self._exact_definitions(query, max_results)
+        if definitions:
+            return await batcher.run(self.vector_store.get_definitions, definitions), "symbol"
+        if mode == "lexical":
+            return await batcher.run(self.vector_store.search_lexical, query, max_results), mode
+        if mode == "hybrid":
+            candidates = await batcher.search(
+                self.vector_store, query, self._fusion_candidates(max_results)
+            )
+            search_results = await batcher.run(
+                self.vector_store.fuse_with_lexical, query, candidates, max_results
+            )
+            return search_results, mode
+        return await batcher.search(self.vector_store, query, max_results), mode
+    
+    def _exact_definitions(self, query: str, max_results: int) -> List[SymbolDefinition]:
+        """Definitions of the symbol a bare-identifier query names, if any"""
+        if not self.symbol_fast_path:
+            return []
+        name = parse_symbol_query(query)
+        if name is None:
+            return []
+        return self.vector_store.symbol_index.lookup(name, "exact", max_results)
+    
+    def find_symbols(self, name: str, mode: str = "prefix", limit: int = 20) -> List[Dict[str, Any]]:
+        """Look up symbol definitions by exact name, prefix or fuzzy match"""
+        return [
+            definition.to_dict()
+            for definition in self.vector_store.symbol_index.lookup(name, mode, limit)
+        ]
+    
+    def _resolve_mode(self, retrieval_mode: Optional[str]) -> str:
+        mode = retrieval_mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        return mode
+    
+    @staticmethod
+    def _fusion_candidates(max_results: int) -> int:
+        """Vector candidates fetched for fusion; deeper lists let agreement surface"""
+        return min(max(max_results * 3, 20), 100)
+    
+    def _finish_query(
+        self,
+        query: str,
+        search_results: Dict[str, Any],
+        cache_key: str,
+        retrieval_mode: str
+    ) -> QueryResult:
+        """Build the result for fresh search results and cache it"""
+        result = self._build_result(query, search_results)
+        result.retrieval_mode = retrieval_mode
+        
+        # Cache the result
+        if result.chunks:
+            self.cache_manager.set(
+                self._project_id, cache_key, result.to_json(), ttl=3600  # 1 hour
+            )
+        
+        return result
+    
+    def _build_result(self, query: str, search_results: Dict[str, Any]) -> QueryResult:
+        """Turn raw vector search results into a QueryResult with a rendered prompt"""
+        documents = (search_results.get("documents") or [[]])[0]
+        
+        if not documents:
             logger.warning("No relevant context found")
-            return f"Query: {query}\n\nNo relevant code context found."
+            prompt = f"Query: {query}\n\nNo relevant code context found."
+            return QueryResult(
+                query=query,
+                prompt=prompt,
+                token_count=self.context_manager.count_tokens(prompt)
+            )
         
-        # Extract documents and metadata
-        documents = search_results["documents"][0]
-        metadatas = search_results.get("metadatas", [[]])[0]
+        # Extract metadata and distances
+        metadatas = (search_results.get("metadatas") or [[]])[0]
+        distances = (search_results.get("distances") or [[]])[0]
         
         # Build optimized context
-        optimized_prompt = self.context_manager.build_optimized_context(
+        context = self.context_manager.build_context(
             query=query,
             documents=documents,
             metadatas=metadatas
         )
         
-        # Cache the result
-        if self.cache_manager:
-            self.cache_manager.set(self._project_id, query, optimized_prompt, ttl=3600)  # 1 hour
-        
-        return optimized_prompt
+        return QueryResult(
+            query=query,
+            prompt=context.prompt,
+            chunks=list(documents),
+            distances=list(distances),
+            metadatas=list(metadatas),
+            context_chunks=context.included_chunks,
+            token_count=context.token_count
+        )
+    
+    def _get_cached_result(
+        self,
+        cache_key: str,
+        local_only: bool = False,
+        check_local: bool = True
+    ) -> Optional[QueryResult]:
+        """Return a cached QueryResult, ignoring entries in an older format"""
+        if local_only:
+            payload = self.cache_manager.get_local(self._project_id, cache_key)
+        else:
+            payload = self.cache_manager.get(self._project_id, cache_key, check_local=check_local)
+        if not payload:
+            return None
+        try:
+            return QueryResult.from_json(payload)
+        except (ValueError, TypeError):
+            logger.debug("Ignoring cache entry in legacy format")
+            return None
+    
+    @staticmethod
+    def _cache_key(query: str, max_results: int, generation: int, mode: str) -> str:
+        """Cache key for a query; the result size and retrieval mode change the prompt"""
+        return f"g{generation}:{mode}:{max_results}:{query}"
     
     def get_indexed_file_count(self) -> int:
         """Return number of indexed files"""
@@ -212,36 +602,51 @@ class LocalRAGSystem:
             logger.error(f"Error calculating DB size: {e}")
             return "Unknown"
     
+    def is_busy(self) -> bool:
+        """Whether indexing, reindexing or garbage collection is running"""
+        if not self._index_lock.acquire(blocking=False):
+            return True
+        self._index_lock.release()
+        return False
+    
+    def estimate_memory_bytes(self) -> int:
+        """Approximate memory held by this project, excluding the shared model"""
+        return self.vector_store.estimate_memory_bytes()
+    
+    def close(self):
+        """Release shared resources held by this project"""
+        self.vector_store.close()
+    
     def clear_cache(self):
-        """Clear cache for this project only"""
-        if self.cache_manager:
-            self.cache_manager.clear_all(self._project_id)
+        """Clear cache for this project only
+        
+        Bumping the generation orphans every Redis entry of the project, which
+        then expire on their own TTL; only the local L1 entries are dropped now.
+        """
+        self._bump_generation()
+        self._save_metadata()
+        self.cache_manager.clear_local(self._project_id)
         logger.info("Cache cleared for project: %s", self._project_id)
     
-    def _get_file_hash(self, file_path: Path) -> str:
-        """Calculate hash of file content"""
-        hasher = hashlib.md5()
-        try:
-            with open(file_path, 'rb') as f:
-                hasher.update(f.read())
-            return hasher.hexdigest()
-        except Exception as e:
-            logger.error(f"Error hashing file {file_path}: {e}")
-            return ""
-    
     def _save_metadata(self):
         """Save indexed files metadata to disk, including embedding model"""
         try:
+            with self._metadata_lock:
+                indexed_files = dict(self._indexed_files)
+                generation = self._generation
             metadata = {
-                "indexed_files": self._indexed_files,
+                "indexed_files": indexed_files,
                 "total_chunks": self._total_chunks,
                 "project_root": str(self.project_root),
-                "embedding_model": self.embedding_model
+                "embedding_model": self.embedding_model,
+                "vector_index": self.vector_store.index_backend,
+                "index_generation": generation
             }
             self._metadata_file.parent.mkdir(parents=True, exist_ok=True)
             with open(self._metadata_file, 'w') as f:
                 json.dump(metadata, f, indent=2)
-            logger.info(f"Saved metadata for {len(self._indexed_files)} files (model: {self.embedding_model})")
+            self.vector_store.save_indexes()
+            logger.info(f"Saved metadata for {len(indexed_files)} files (model: {self.embedding_model})")
         except Exception as e:
             logger.error(f"Error saving metadata: {e}")
     
@@ -252,7 +657,14 @@ class LocalRAGSystem:
                 with open(self._metadata_file, 'r') as f:
                     metadata = json.load(f)
                     self._total_chunks = metadata.get("total_chunks", 0)
-                    return metadata.get("indexed_files", {})
+                    self._generation = metadata.get("index_generation", 0)
+                    self._stored_index_backend = metadata.get("vector_index", "chroma")
+                    indexed_files = metadata.get("indexed_files", {})
+                    # Older metadata stored only an MD5 string per file
+                    return {
+                        path: record if isinstance(record, dict) else {"hash": record}
+                        for path, record in indexed_files.items()
+                    }
             return {}
         except Exception as e:
             logger.error(f"Error loading metadata: {e}")
@@ -0,0 +1,79 @@
+"""Startup phase timings and readiness state"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Records how long each startup phase took and whether the server is ready
+
+    The clock starts when this module is first imported, which main does
+    before any other application module, so the "imports" phase covers the
+    server's own import time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases: List[Tuple[str, float]] = []
+        self._current: Optional[str] = None
+        self._ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._phases.append((name, seconds))
+        logger.info(f"Startup phase {name}: {seconds * 1000.0:.0f}ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block as a named startup phase"""
+        with self._lock:
+            self._current = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._current = None
+            self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            self._ready_at = time.perf_counter()
+        logger.info(f"Server ready {self._ready_at - self.started:.2f}s after start")
+
+    def mark_failed(self, error: str) -> None:
+        with self._lock:
+            self.error = error
+        logger.error(f"Startup warm-up failed: {error}")
+
+    @property
+    def ready(self) -> bool:
+        return self._ready_at is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = [
+                {"name": name, "ms": round(seconds * 1000.0, 1)}
+                for name, seconds in self._phases
+            ]
+            return {
+                "ready": self._ready_at is not None,
+                "current_phase": self._current,
+                "seconds_since_start": round(time.perf_counter() - self.started, 2),
+                "time_to_ready_seconds": (
+                    round(self._ready_at - self.started, 2) if self._ready_at is not None else None
+                ),
+                "error": self.error,
+                "phases": phases,
+            }
+
+
+# Created on first import, i.e. as early in the process as main can manage
+startup = StartupTracker()
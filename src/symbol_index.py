@@ -0,0 +1,312 @@
+"""In-memory table of symbol definitions, kept in step with the vector collection"""
+
+import bisect
+import difflib
+import gzip
+import json
+import logging
+import re
+import threading
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A query consisting of nothing but an identifier, e.g. `_save_metadata`,
+# VectorStore.close() or def index_project
+_SYMBOL_QUERY = re.compile(
+    r"^(?:(?:def|class|function|func|fn)\s+)?`?([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)?)(?:\(\))?`?$"
+)
+
+# Definition lines across the supported languages; group 1 is the keyword, group 2 the name
+_DEFINITION = re.compile(
+    r"^(\s*)(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|internal\s+)?"
+    r"(?:abstract\s+|static\s+|sealed\s+|async\s+|pub\s+)*"
+    r"(def|class|function|interface|struct|enum|trait|func|fn)\s+([A-Za-z_][A-Za-z0-9_]*)"
+)
+_CLASS_KEYWORDS = {"class", "interface", "struct", "enum", "trait"}
+
+
+def parse_symbol_query(query: str) -> Optional[str]:
+    """Return the symbol name if the query is a bare identifier, else None"""
+    match = _SYMBOL_QUERY.match(query.strip())
+    return match.group(1) if match else None
+
+
+@dataclass(frozen=True)
+class SymbolDefinition:
+    """Where a class or function is defined"""
+    name: str
+    kind: str  # "class", "function" or "method"
+    file_path: str
+    line: int
+    end_line: int
+    chunk_id: str
+    class_name: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def extract_definitions(chunk_id: str, text: str, metadata: Dict[str, Any]) -> List[SymbolDefinition]:
+    """Find class and function definitions in a chunk
+
+    Definition lines are located in the text so every method of a class chunk
+    is found, with its own line number. Names the parser put into the
+    metadata but that have no matching line (e.g. `const handler = ...`) are
+    added at the chunk's first line.
+    """
+    file_path = str(metadata.get("file_path", ""))
+    start_line = int(metadata.get("start_line", 1))
+    end_line = int(metadata.get("end_line", start_line))
+    # A chunk that starts inside a class only knows the class from its metadata
+    enclosing = metadata.get("class_name") if metadata.get("class_name") != "Unknown" else None
+
+    definitions = []
+    class_stack: List[Tuple[int, str]] = []
+    for offset, line in enumerate(text.split("\n")):
+        match = _DEFINITION.match(line)
+        if not match:
+            continue
+        indent, keyword, name = len(match.group(1)), match.group(2), match.group(3)
+        while class_stack and class_stack[-1][0] >= indent:
+            class_stack.pop()
+        if keyword in _CLASS_KEYWORDS:
+            definitions.append(SymbolDefinition(
+                name, "class", file_path, start_line + offset, end_line, chunk_id
+            ))
+            class_stack.append((indent, name))
+            continue
+        owner = class_stack[-1][1] if class_stack else (enclosing if indent > 0 else None)
+        definitions.append(SymbolDefinition(
+            name, "method" if owner or indent > 0 else "function", file_path,
+            start_line + offset, end_line, chunk_id, class_name=owner
+        ))
+
+    found = {definition.name for definition in definitions}
+    function_name = metadata.get("function_name")
+    if function_name and function_name != "Unknown" and function_name not in found:
+        definitions.append(SymbolDefinition(
+            function_name, "method" if enclosing else "function", file_path,
+            start_line, end_line, chunk_id, class_name=enclosing
+        ))
+    elif not function_name and enclosing and enclosing not in found:
+        # Method chunks carry the name of their class too; it is not defined there
+        definitions.append(SymbolDefinition(enclosing, "class", file_path, start_line, end_line, chunk_id))
+    return definitions
+
+
+class SymbolIndex:
+    """Symbol name -> definitions
+
+    Names are matched case-insensitively. A sorted key list serves prefix
+    lookups by bisection; fuzzy lookups use difflib over the distinct names.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._reset()
+
+    def _reset(self) -> None:
+        # lowercase name -> {(chunk id, line) -> definition}
+        self._by_name: Dict[str, Dict[Tuple[str, int], SymbolDefinition]] = {}
+        self._sorted_names: List[str] = []
+        # chunk id -> (chunk start line, definitions)
+        self._by_chunk: Dict[str, Tuple[int, List[SymbolDefinition]]] = {}
+        self._file_chunks: Dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return sum(len(definitions) for _, definitions in self._by_chunk.values())
+
+    def update(
+        self,
+        chunk_ids: Iterable[str],
+        metadatas: Iterable[Dict[str, Any]],
+        texts: Optional[Iterable[str]] = None
+    ) -> None:
+        """Replace the definitions of the given chunks
+
+        Without texts only the position changes: known definitions are moved
+        by the shift of the chunk's start line.
+        """
+        chunk_ids = list(chunk_ids)
+        metadatas = list(metadatas)
+        texts = list(texts) if texts is not None else [None] * len(chunk_ids)
+        with self._lock:
+            for chunk_id, metadata, text in zip(chunk_ids, metadatas, texts):
+                metadata = metadata or {}
+                start_line = int(metadata.get("start_line", 1))
+                if text is not None:
+                    definitions = extract_definitions(chunk_id, text, metadata)
+                else:
+                    known = self._by_chunk.get(chunk_id)
+                    if known is None:
+                        continue
+                    shift = start_line - known[0]
+                    end_line = int(metadata.get("end_line", start_line))
+                    definitions = [
+                        replace(definition, line=definition.line + shift, end_line=end_line)
+                        for definition in known[1]
+                    ]
+                self._remove(chunk_id)
+                self._add(chunk_id, start_line, definitions)
+            self._dirty = True
+
+    def _add(self, chunk_id: str, start_line: int, definitions: List[SymbolDefinition]) -> None:
+        if not definitions:
+            return
+        self._by_chunk[chunk_id] = (start_line, definitions)
+        self._file_chunks.setdefault(definitions[0].file_path, set()).add(chunk_id)
+        for definition in definitions:
+            key = definition.name.lower()
+            entries = self._by_name.get(key)
+            if entries is None:
+                entries = self._by_name[key] = {}
+                bisect.insort(self._sorted_names, key)
+            entries[(chunk_id, definition.line)] = definition
+
+    def chunk_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._by_chunk)
+
+    def remove_many(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+            self._dirty = True
+
+    def remove_file(self, file_path: str) -> None:
+        with self._lock:
+            for chunk_id in list(self._file_chunks.get(file_path, ())):
+                self._remove(chunk_id)
+            self._dirty = True
+
+    def _remove(self, chunk_id: str) -> None:
+        known = self._by_chunk.pop(chunk_id, None)
+        if not known:
+            return
+        definitions = known[1]
+        for definition in definitions:
+            key = definition.name.lower()
+            entries = self._by_name.get(key)
+            if entries is None:
+                continue
+            entries.pop((chunk_id, definition.line), None)
+            if not entries:
+                del self._by_name[key]
+                index = bisect.bisect_left(self._sorted_names, key)
+                if index < len(self._sorted_names) and self._sorted_names[index] == key:
+                    del self._sorted_names[index]
+        chunks = self._file_chunks.get(definitions[0].file_path)
+        if chunks is not None:
+            chunks.discard(chunk_id)
+            if not chunks:
+                del self._file_chunks[definitions[0].file_path]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def lookup(self, name: str, mode: str = "exact", limit: int = 20) -> List[SymbolDefinition]:
+        """Find definitions by exact name, name prefix or fuzzy match
+
+        "Class.method" restricts an exact lookup to methods of that class.
+        Definitions repeated in overlapping chunks are reported once.
+        """
+        class_filter = None
+        if mode == "exact" and "." in name:
+            class_filter, name = name.rsplit(".", 1)
+            class_filter = class_filter.lower()
+        key = name.lower()
+
+        with self._lock:
+            if mode == "exact":
+                names = [key] if key in self._by_name else []
+            elif mode == "prefix":
+                start = bisect.bisect_left(self._sorted_names, key)
+                names = []
+                for candidate in self._sorted_names[start:]:
+                    if not candidate.startswith(key) or len(names) >= limit:
+                        break
+                    names.append(candidate)
+            elif mode == "fuzzy":
+                names = difflib.get_close_matches(key, self._sorted_names, n=limit, cutoff=0.6)
+            else:
+                raise ValueError(f"Unknown lookup mode: {mode}")
+
+            results = []
+            seen = set()
+            for candidate in names:
+                for definition in sorted(
+                    self._by_name[candidate].values(), key=lambda d: (d.file_path, d.line)
+                ):
+                    if class_filter and (definition.class_name or "").lower() != class_filter:
+                        continue
+                    location = (definition.name, definition.file_path, definition.line)
+                    if location in seen:
+                        continue
+                    seen.add(location)
+                    results.append(definition)
+                    if len(results) >= limit:
+                        return results
+            return results
+
+    def save(self) -> None:
+        """Persist the table if it changed since the last save"""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            chunks = {
+                chunk_id: [start_line, [
+                    [d.name, d.kind, d.file_path, d.line, d.end_line, d.class_name]
+                    for d in definitions
+                ]]
+                for chunk_id, (start_line, definitions) in self._by_chunk.items()
+            }
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+                json.dump({"version": 1, "chunks": chunks}, f, separators=(",", ":"))
+            tmp_path.replace(self.path)
+        except Exception as e:
+            logger.error(f"Error saving symbol index: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def load(self) -> bool:
+        """Load a persisted table; returns False if there is none"""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable symbol index {self.path}: {e}")
+            return False
+
+        with self._lock:
+            self._reset()
+            for chunk_id, (start_line, rows) in data.get("chunks", {}).items():
+                self._add(chunk_id, start_line, [
+                    SymbolDefinition(name, kind, file_path, line, end_line, chunk_id, class_name)
+                    for name, kind, file_path, line, end_line, class_name in rows
+                ])
+            self._dirty = False
+        logger.info(f"Loaded symbol index: {len(self._by_name)} names")
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "names": len(self._by_name),
+                "definitions": sum(len(entries) for entries in self._by_name.values()),
+                "files": len(self._file_chunks),
+            }
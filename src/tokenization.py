@@ -0,0 +1,81 @@
+"""Token counting with the embedding model's own tokenizer, and for prompts"""
+
+import logging
+import threading
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Model whose tiktoken encoding sizes prompts; chunk token counts stored in the index use it
+DEFAULT_PROMPT_MODEL = "gpt-4"
+
+_prompt_encodings: Dict[str, object] = {}
+_prompt_encodings_lock = threading.Lock()
+
+
+def prompt_encoding(model: str = DEFAULT_PROMPT_MODEL):
+    """The tiktoken encoding for a model, loaded once per process and shared"""
+    with _prompt_encodings_lock:
+        encoding = _prompt_encodings.get(model)
+        if encoding is None:
+            # Imported lazily to keep server startup fast
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                # Fallback to cl100k_base for unknown models
+                encoding = tiktoken.get_encoding("cl100k_base")
+                logger.warning(f"Model {model} not found, using cl100k_base encoding")
+            _prompt_encodings[model] = encoding
+        return encoding
+
+
+def count_prompt_tokens(texts: List[str], model: str = DEFAULT_PROMPT_MODEL) -> List[int]:
+    """Prompt token count of each text, encoded as one batch"""
+    if not texts:
+        return []
+    encoding = prompt_encoding(model)
+    try:
+        return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+    except Exception as e:
+        logger.error(f"Error counting tokens: {e}")
+        # Rough estimate: ~4 chars per token
+        return [len(text) // 4 for text in texts]
+
+
+class TokenCounter:
+    """Counts tokens the way an embedding model's tokenizer splits text
+
+    Wraps a `tokenizers.Tokenizer` (the ONNX backend, and the fast
+    tokenizers behind sentence-transformers) or any transformers tokenizer.
+    Picklable, so indexing worker processes get their own copy.
+    """
+
+    def __init__(self, tokenizer):
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        if backend is not None:
+            tokenizer = backend
+        self._fast = hasattr(tokenizer, "encode_batch")
+        if self._fast:
+            from tokenizers import Tokenizer
+            # A copy without the encoder's truncation and padding
+            tokenizer = Tokenizer.from_str(tokenizer.to_str())
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            special_tokens = len(tokenizer.encode("").ids)
+        else:
+            special_tokens = len(tokenizer([""])["input_ids"][0])
+        self.tokenizer = tokenizer
+        # Added to every sequence, e.g. [CLS] and [SEP]
+        self.special_tokens = special_tokens
+
+    def count_lines(self, lines: List[str]) -> List[int]:
+        """Token count of each line, without special tokens"""
+        if not lines:
+            return []
+        if self._fast:
+            return [len(e.ids) for e in self.tokenizer.encode_batch(lines, add_special_tokens=False)]
+        return [len(ids) for ids in self.tokenizer(lines, add_special_tokens=False)["input_ids"]]
+
+    def count(self, text: str) -> int:
+        return self.count_lines([text])[0]
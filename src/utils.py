@@ -1,11 +1,20 @@
 """Utility functions"""
 
 import re
+import hashlib
 from pathlib import Path
 import logging
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 logger = logging.getLogger(__name__)
 
+# Read size for streaming file hashes
+HASH_READ_SIZE = 1 << 20
+
 
 def convert_windows_path_to_wsl(windows_path: str) -> str:
     """
@@ -141,3 +150,38 @@ def sanitize_metadata(metadata: dict) -> dict:
             sanitized[key] = value
     
     return sanitized
+
+
+def new_content_hasher():
+    """Create a fast hasher for change detection (xxh3 if installed, else blake2b)"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def read_file_hashed(file_path: str) -> tuple:
+    """Read a file once, hashing it while streaming; returns (bytes, hexdigest)"""
+    hasher = new_content_hasher()
+    parts = []
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_READ_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            parts.append(block)
+    return b''.join(parts), hasher.hexdigest()
+
+
+def chunk_content_key(content: str, occurrence: int = 0) -> str:
+    """Stable identity of a chunk within its file, derived from its text
+    
+    occurrence tells apart identical chunks that appear more than once in a file.
+    """
+    key = hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+    return key if occurrence == 0 else f"{key}~{occurrence}"
+
+
+def make_chunk_id(file_path: str, chunk_key: str) -> str:
+    """Vector store ID of a chunk"""
+    return f"{file_path}#{chunk_key}"
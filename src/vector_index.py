@@ -0,0 +1,643 @@
+"""Vector index backends behind VectorStore: ChromaDB or an in-process memory-mapped matrix"""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_BACKENDS = ("chroma", "mmap")
+
+# Below this many chunks an exact matrix product beats walking an HNSW graph
+HNSW_MIN_ROWS = 20000
+
+# Candidate search over compact codes, then exact re-scoring with the float vectors
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# Candidates re-scored per requested result; binary codes rank more coarsely
+RESCORE_FACTORS = {"int8": 4, "binary": 20}
+MIN_RESCORE_CANDIDATES = 50
+
+_SQL_BATCH = 500
+# Rows decoded per step of a quantized scan; small enough for the float copy to stay in cache
+_SCAN_BLOCK = 512
+
+# Chroma's client setup is not thread-safe when projects load in parallel
+_chroma_client_lock = threading.Lock()
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = _as_matrix(vectors)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])][:k]
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization: vector ~= codes * scale"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed eight to a byte"""
+    return np.packbits(vectors > 0, axis=1)
+
+
+class ChromaIndex:
+    """A ChromaDB collection with cosine distance
+
+    The other backends copy the subset of the Collection API used by
+    VectorStore, so results keep Chroma's shape: one list per query.
+    """
+
+    def __init__(self, db_path: str, collection_name: str):
+        # Imported lazily to keep server startup fast
+        import chromadb
+        from chromadb.config import Settings
+
+        self.collection_name = collection_name
+        with _chroma_client_lock:
+            self.client = chromadb.PersistentClient(
+                path=db_path,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+            try:
+                self.collection = self.client.get_collection(name=collection_name)
+                logger.info(f"Loaded existing collection: {collection_name}")
+            except Exception:
+                self.collection = self.client.create_collection(
+                    name=collection_name,
+                    metadata={"hnsw:space": "cosine"}
+                )
+                logger.info(f"Created new collection: {collection_name}")
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.collection.upsert(
+            ids=ids,
+            embeddings=_as_matrix(embeddings).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.collection.query(
+            query_embeddings=_as_matrix(query_embeddings).tolist(),
+            n_results=n_results,
+            where=where
+        )
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        return self.collection.get(ids=ids, include=list(include), limit=limit, offset=offset)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        self.collection.delete(ids=ids, where=where)
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self) -> None:
+        """Drop every chunk"""
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self.client.create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def save(self) -> None:
+        """Chroma persists every write itself"""
+
+    def close(self) -> None:
+        pass
+
+    def estimate_memory_bytes(self, dimension: int) -> int:
+        # float32 vector plus HNSW links and id bookkeeping per chunk
+        return self.count() * (dimension * 4 + 256)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "chroma", "chunks": self.count()}
+
+
+class MmapIndex:
+    """Vectors in a memory-mapped float32 matrix, documents and metadata in SQLite
+
+    Every chunk owns one row of the matrix; rows of deleted chunks are reused.
+    Vectors are stored normalized, so a search is one matrix product and an
+    argpartition per query, with no serialization on the way. With hnsw=True
+    an hnswlib graph over the same rows answers unfiltered searches once the
+    index holds HNSW_MIN_ROWS chunks.
+
+    With quantization "int8" (1 byte per dimension plus a scale) or
+    "binary" (1 bit per dimension) exhaustive searches scan compact codes
+    instead, and only the best candidates are re-scored with their float
+    vectors, which are read from disk on demand. The codes are what stays
+    resident: 4x resp. 32x less than the float matrix.
+
+    Files in path: vectors.f32 (the matrix), chunks.sqlite (id -> row,
+    document, metadata), codes.i8 + scales.f32 or codes.bits (the
+    quantized codes, if enabled) and hnsw.bin (the graph, if enabled).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hnsw: bool = False,
+        hnsw_min_rows: int = HNSW_MIN_ROWS,
+        quantization: str = "none"
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.hnsw = hnsw
+        self.hnsw_min_rows = hnsw_min_rows
+        self.quantization = quantization
+        self._lock = threading.RLock()
+        self._vectors_path = self.path / "vectors.f32"
+        self._codes_path = self.path / ("codes.bits" if quantization == "binary" else "codes.i8")
+        self._scales_path = self.path / "scales.f32"
+        self._graph_path = self.path / "hnsw.bin"
+
+        self._conn = sqlite3.connect(
+            str(self.path / "chunks.sqlite"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                file_path TEXT,
+                document TEXT,
+                metadata TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file_path ON chunks(file_path)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._codes_dirty = False
+        self._load()
+
+        self._graph = None
+        self._graph_dirty = False
+        if hnsw and self.dimension:
+            self._open_graph()
+
+    def _info(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _load(self) -> None:
+        dimension = self._info("dimension")
+        self.dimension = int(dimension) if dimension else None
+        # Bumped by every vector write; tells whether a saved graph is current
+        self._version = int(self._info("version") or 0)
+        self._row_of: Dict[str, int] = dict(self._conn.execute("SELECT id, row FROM chunks"))
+        self._vectors = None
+        self._codes = None
+        self._scales = None
+        capacity = 0
+        if self.dimension and self._vectors_path.exists():
+            capacity = self._vectors_path.stat().st_size // (self.dimension * 4)
+            if capacity:
+                self._vectors = self._map(self._vectors_path, np.float32, self.dimension, capacity)
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._valid = np.zeros(capacity, dtype=bool)
+        for doc_id, row in self._row_of.items():
+            self._ids[row] = doc_id
+            self._valid[row] = True
+        # Rows in use lie below _next_row; _free holds the holes left by deletions
+        self._next_row = max(self._row_of.values(), default=-1) + 1
+        self._free = [row for row in range(self._next_row) if not self._valid[row]]
+        if capacity and self.quantization != "none":
+            self._open_codes(capacity)
+        if self._row_of:
+            logger.info(f"Loaded vector index {self.path.name}: {len(self._row_of)} chunks")
+
+    @staticmethod
+    def _map(path: Path, dtype, width: Optional[int], capacity: int) -> np.memmap:
+        """Map a row-per-chunk file, growing it to capacity rows if needed"""
+        shape = (capacity, width) if width else (capacity,)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not path.exists() or path.stat().st_size < size:
+            with open(path, "ab") as f:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _map_codes(self, capacity: int) -> None:
+        if self.quantization == "binary":
+            self._codes = self._map(self._codes_path, np.uint8, (self.dimension + 7) // 8, capacity)
+        else:
+            self._codes = self._map(self._codes_path, np.int8, self.dimension, capacity)
+            self._scales = self._map(self._scales_path, np.float32, None, capacity)
+
+    def _open_codes(self, capacity: int) -> None:
+        """Map the quantized codes, rebuilding them from the float vectors if stale"""
+        self._map_codes(capacity)
+        if self._info("codes") == self.quantization and self._info("codes_version") == str(self._version):
+            return
+        for start in range(0, self._next_row, 65536):
+            rows = np.arange(start, min(start + 65536, self._next_row))
+            self._write_codes(rows, np.asarray(self._vectors[rows]))
+        self._codes_dirty = True
+        if self._next_row:
+            logger.info(f"Built {self.quantization} codes for {self.path.name}: {self._next_row} rows")
+
+    def _write_codes(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self.quantization == "binary":
+            self._codes[rows] = quantize_binary(vectors)
+        elif self.quantization == "int8":
+            self._codes[rows], self._scales[rows] = quantize_int8(vectors)
+
+    def _open_graph(self) -> None:
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("hnswlib is not installed; the memory-mapped index searches exhaustively")
+            self.hnsw = False
+            return
+        graph = hnswlib.Index(space="ip", dim=self.dimension)
+        capacity = max(len(self._valid), 1)
+        if self._graph_path.exists() and self._info("graph_version") == str(self._version):
+            graph.load_index(str(self._graph_path), max_elements=capacity)
+            self._graph_dirty = False
+        else:
+            graph.init_index(max_elements=capacity, ef_construction=100, M=16)
+            rows = np.flatnonzero(self._valid)
+            for start in range(0, len(rows), 10000):
+                part = rows[start:start + 10000]
+                graph.add_items(np.asarray(self._vectors[part]), part)
+            self._graph_dirty = True
+            if len(rows):
+                logger.info(f"Built HNSW graph for {self.path.name}: {len(rows)} chunks")
+        self._graph = graph
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = len(self._valid)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, int(capacity * 1.5), 1024)
+        for matrix in (self._vectors, self._codes, self._scales):
+            if matrix is not None:
+                matrix.flush()
+        # Searches still holding the old maps keep reading them safely
+        self._vectors = self._map(self._vectors_path, np.float32, self.dimension, new_capacity)
+        if self._codes is not None:
+            self._map_codes(new_capacity)
+        elif self.quantization != "none":
+            self._open_codes(new_capacity)
+        self._valid = np.concatenate([self._valid, np.zeros(new_capacity - capacity, dtype=bool)])
+        self._ids.extend([None] * (new_capacity - capacity))
+        if self._graph is not None:
+            self._graph.resize_index(new_capacity)
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        vectors = _normalized(embeddings)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._set_info("dimension", self.dimension)
+                self._ensure_capacity(len(ids))
+                if self.hnsw:
+                    self._open_graph()
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}"
+                )
+
+            new_ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self._row_of]
+            self._ensure_capacity(self._next_row + max(len(new_ids) - len(self._free), 0))
+            for doc_id in new_ids:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    row = self._next_row
+                    self._next_row += 1
+                self._row_of[doc_id] = row
+                self._ids[row] = doc_id
+            rows = np.array([self._row_of[doc_id] for doc_id in ids], dtype=np.int64)
+
+            self._vectors[rows] = vectors
+            if self._codes is not None:
+                self._write_codes(rows, vectors)
+                self._codes_dirty = True
+            self._valid[rows] = True
+            self._version += 1
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, file_path, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (doc_id, int(row), (metadata or {}).get("file_path"), document, json.dumps(metadata or {}))
+                    for doc_id, row, document, metadata in zip(ids, rows, documents, metadatas)
+                ]
+            )
+            self._set_info("version", self._version)
+            self._conn.execute("COMMIT")
+
+            if self._graph is not None:
+                self._graph.add_items(vectors, rows)
+                self._graph_dirty = True
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        queries = _normalized(query_embeddings)
+        with self._lock:
+            count = len(self._row_of)
+            if count and where is None and self._graph is not None and count >= self.hnsw_min_rows:
+                k = min(n_results, count)
+                self._graph.set_ef(max(128, 4 * k))
+                labels, distances = self._graph.knn_query(queries, k=k)
+                hits = [
+                    [(self._ids[row], float(distance)) for row, distance in zip(row_labels, row_distances)]
+                    for row_labels, row_distances in zip(labels, distances)
+                ]
+                return self._results(hits)
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            mask = self._valid[:self._next_row].copy() if count else None
+            if mask is not None and where is not None:
+                mask &= self._where_mask(where)
+            ids = list(self._ids[:self._next_row])
+
+        if mask is None or not mask.any():
+            return self._results([[] for _ in range(len(queries))])
+
+        k = min(n_results, int(mask.sum()))
+        hits = []
+        if codes is None:
+            scores = np.asarray(vectors[:len(mask)]) @ queries.T
+            scores[~mask] = -np.inf
+            for column in scores.T:
+                top = _top(column, k)
+                hits.append([(ids[row], 1.0 - float(column[row])) for row in top])
+            return self._results(hits)
+
+        approximate = self._approximate_scores(codes, scales, queries, len(mask))
+        approximate[~mask] = -np.inf
+        candidates = min(int(mask.sum()), max(k * RESCORE_FACTORS[self.quantization], MIN_RESCORE_CANDIDATES))
+        for query, column in zip(queries, approximate.T):
+            # Ascending rows so the float vectors are read from disk in order
+            rows = np.sort(_top(column, candidates))
+            exact = np.asarray(vectors[rows]) @ query
+            top = _top(exact, k)
+            hits.append([(ids[rows[i]], 1.0 - float(exact[i])) for i in top])
+        return self._results(hits)
+
+    def _approximate_scores(self, codes, scales, queries: np.ndarray, rows: int) -> np.ndarray:
+        """Similarity estimates from the codes, one column per query; higher is closer"""
+        scores = np.empty((rows, len(queries)), dtype=np.float32)
+        decoded = np.empty((_SCAN_BLOCK, self.dimension), dtype=np.float32)
+        for start in range(0, rows, _SCAN_BLOCK):
+            end = min(start + _SCAN_BLOCK, rows)
+            block = decoded[:end - start]
+            if self.quantization == "int8":
+                block[...] = codes[start:end]
+                scores[start:end] = (block @ queries.T) * scales[start:end, None]
+            else:
+                # The float query against the +-1 code ranks much better than
+                # the Hamming distance between two sign codes
+                block[...] = np.unpackbits(codes[start:end], axis=1, count=self.dimension)
+                block *= 2.0
+                block -= 1.0
+                scores[start:end] = block @ queries.T
+        return scores
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        rows = [row for (row,) in self._conn.execute(
+            f"SELECT row FROM chunks WHERE {self._where_sql(where)}", self._where_params(where)
+        )]
+        mask = np.zeros(self._next_row, dtype=bool)
+        mask[[row for row in rows if row < self._next_row]] = True
+        return mask
+
+    @staticmethod
+    def _where_sql(where: Dict[str, Any]) -> str:
+        clauses = []
+        for key, value in where.items():
+            if isinstance(value, dict) or key.startswith("$"):
+                raise ValueError(f"Unsupported filter for the memory-mapped index: {where}")
+            clauses.append("file_path = ?" if key == "file_path" else "json_extract(metadata, ?) = ?")
+        return " AND ".join(clauses)
+
+    @staticmethod
+    def _where_params(where: Dict[str, Any]) -> List[Any]:
+        params = []
+        for key, value in where.items():
+            params.extend([value] if key == "file_path" else [f"$.{key}", value])
+        return params
+
+    def _results(self, hits: List[List[tuple]]) -> Dict[str, Any]:
+        """Chroma-shaped result from (id, distance) lists, one per query"""
+        chunks = self._fetch([doc_id for query_hits in hits for doc_id, _ in query_hits])
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_hits in hits:
+            # A chunk deleted since the search is simply dropped
+            query_hits = [(doc_id, distance) for doc_id, distance in query_hits if doc_id in chunks]
+            result["ids"].append([doc_id for doc_id, _ in query_hits])
+            result["documents"].append([chunks[doc_id][0] for doc_id, _ in query_hits])
+            result["metadatas"].append([chunks[doc_id][1] for doc_id, _ in query_hits])
+            result["distances"].append([distance for _, distance in query_hits])
+        return result
+
+    def _fetch(self, ids: List[str]) -> Dict[str, tuple]:
+        unique = list(dict.fromkeys(ids))
+        chunks = {}
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                part = unique[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(part))
+                for doc_id, document, metadata in self._conn.execute(
+                    f"SELECT id, document, metadata FROM chunks WHERE id IN ({placeholders})", part
+                ):
+                    chunks[doc_id] = (document, json.loads(metadata))
+        return chunks
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        if ids is not None:
+            chunks = self._fetch(ids)
+            found = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in chunks]
+        else:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, document, metadata FROM chunks ORDER BY rowid LIMIT ? OFFSET ?",
+                    (limit if limit is not None else -1, offset or 0)
+                ).fetchall()
+            chunks = {doc_id: (document, json.loads(metadata)) for doc_id, document, metadata in rows}
+            found = [doc_id for doc_id, _, _ in rows]
+        result: Dict[str, Any] = {"ids": found}
+        if "documents" in include:
+            result["documents"] = [chunks[doc_id][0] for doc_id in found]
+        if "metadatas" in include:
+            result["metadatas"] = [chunks[doc_id][1] for doc_id in found]
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            if where is not None:
+                matched = [doc_id for (doc_id,) in self._conn.execute(
+                    f"SELECT id FROM chunks WHERE {self._where_sql(where)}", self._where_params(where)
+                )]
+                if ids is not None:
+                    wanted = set(ids)
+                    matched = [doc_id for doc_id in matched if doc_id in wanted]
+                ids = matched
+            rows = []
+            for doc_id in ids or []:
+                row = self._row_of.pop(doc_id, None)
+                if row is None:
+                    continue
+                self._valid[row] = False
+                self._ids[row] = None
+                self._free.append(row)
+                rows.append(row)
+                if self._graph is not None:
+                    self._graph.mark_deleted(row)
+            if not rows:
+                return
+            self._version += 1
+            self._graph_dirty = self._graph is not None
+            self._codes_dirty = self._codes is not None
+            self._conn.execute("BEGIN")
+            for start in range(0, len(ids), _SQL_BATCH):
+                part = ids[start:start + _SQL_BATCH]
+                self._conn.execute(
+                    f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(part))})", part
+                )
+            self._set_info("version", self._version)
+            self._conn.execute("COMMIT")
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE chunks SET file_path = ?, metadata = ? WHERE id = ?",
+                [
+                    ((metadata or {}).get("file_path"), json.dumps(metadata or {}), doc_id)
+                    for doc_id, metadata in zip(ids, metadatas)
+                ]
+            )
+            self._conn.execute("COMMIT")
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def reset(self) -> None:
+        """Drop every chunk and the files holding them"""
+        with self._lock:
+            self._vectors = self._codes = self._scales = None
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM info")
+            for name in ("vectors.f32", "codes.i8", "scales.f32", "codes.bits", "hnsw.bin"):
+                (self.path / name).unlink(missing_ok=True)
+            self._load()
+            self._graph = None
+            self._graph_dirty = False
+
+    def save(self) -> None:
+        """Flush the matrices and write the graph if it changed"""
+        with self._lock:
+            for matrix in (self._vectors, self._codes, self._scales):
+                if matrix is not None:
+                    matrix.flush()
+            if self._codes_dirty:
+                self._set_info("codes", self.quantization)
+                self._set_info("codes_version", self._version)
+                self._codes_dirty = False
+            if self._graph is None or not self._graph_dirty:
+                return
+            try:
+                tmp_path = self._graph_path.with_suffix(".tmp")
+                self._graph.save_index(str(tmp_path))
+                tmp_path.replace(self._graph_path)
+                self._set_info("graph_version", self._version)
+                self._graph_dirty = False
+            except Exception as e:
+                logger.error(f"Error saving HNSW graph: {e}")
+
+    def close(self) -> None:
+        """Save, then release the connection, the mappings and the graph"""
+        self.save()
+        with self._lock:
+            self._conn.close()
+            self._vectors = self._codes = self._scales = None
+            self._graph = None
+
+    def estimate_memory_bytes(self, dimension: int) -> int:
+        rows = self._next_row
+        dimension = self.dimension or dimension
+        # Scanned pages (the codes if quantized, else the float matrix), the id
+        # table, and hnswlib's own copy of each vector plus links
+        if self.quantization == "binary":
+            memory = rows * ((dimension + 7) // 8)
+        elif self.quantization == "int8":
+            memory = rows * (dimension + 4)
+        else:
+            memory = rows * dimension * 4
+        memory += len(self._row_of) * 120
+        if self._graph is not None:
+            memory += rows * (dimension * 4 + 16 * 2 * 4 + 64)
+        return memory
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "mmap",
+            "chunks": len(self._row_of),
+            "rows": self._next_row,
+            "capacity": len(self._valid),
+            "hnsw": self._graph is not None,
+            "quantization": self.quantization,
+        }
+
+
+def create_vector_index(
+    backend: str,
+    db_path: str,
+    collection_name: str,
+    hnsw: bool = False,
+    quantization: str = "none"
+):
+    """Open the index holding a collection's vectors, documents and metadata"""
+    if backend == "chroma":
+        if quantization != "none":
+            logger.warning("Quantized vector storage needs the mmap index backend; ignored for Chroma")
+        return ChromaIndex(db_path, collection_name)
+    if backend == "mmap":
+        return MmapIndex(
+            str(Path(db_path) / "mmap" / collection_name), hnsw=hnsw, quantization=quantization
+        )
+    raise ValueError(f"Unknown vector index backend: {backend}")
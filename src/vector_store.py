@@ -1,50 +1,89 @@
-"""Vector Store using ChromaDB"""
+"""Vector Store over a ChromaDB or memory-mapped vector index"""
 
 import logging
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
+
+from .context_manager import chunk_token_counts
+from .model_registry import model_registry
+from .embedding_cache import EmbeddingCache, normalize_query, query_embedding_cache, text_hash
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .symbol_index import SymbolDefinition, SymbolIndex
+from .utils import chunk_content_key, make_chunk_id
+from .vector_index import create_vector_index
 
 logger = logging.getLogger(__name__)
 
 
 class VectorStore:
-    """Manages vector storage and retrieval using ChromaDB"""
+    """Manages vector storage and retrieval
+
+    Vectors, documents and metadata live in a vector index backend: a ChromaDB
+    collection, or a memory-mapped matrix searched in-process.
+    """
     
     def __init__(
         self,
         db_path: str = "/app/data/chroma_db",
         embedding_model: str = "paraphrase-multilingual-MiniLM-L12-v2",
-        collection_name: str = "code_chunks"
+        collection_name: str = "code_chunks",
+        embedding_cache: Optional[EmbeddingCache] = None,
+        embedding_backend: str = "torch",
+        index_backend: str = "chroma",
+        hnsw: bool = False,
+        quantization: str = "none"
     ):
         self.db_path = db_path
         self.embedding_model_name = embedding_model
+        self.embedding_backend = embedding_backend
         self.collection_name = collection_name
+        self.embedding_cache = embedding_cache
+        self.index_backend = index_backend
         
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=db_path,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
+        # Vectors, documents and metadata
+        self.index = create_vector_index(
+            index_backend, db_path, collection_name, hnsw=hnsw, quantization=quantization
         )
         
-        # Initialize embedding model
-        logger.info(f"Loading embedding model: {embedding_model}")
-        self.embedding_model = SentenceTransformer(embedding_model)
+        # Embedding model is shared with every other store using the same model and backend
+        self.embedding_model = model_registry.acquire(embedding_model, embedding_backend)
+        self._model_released = False
+        # int8 vectors differ slightly from fp32 ones, so they are cached apart
+        self._cache_model_key = (
+            f"{embedding_model}#int8" if self.embedding_model.backend == "onnx_int8" else embedding_model
+        )
         
-        # Get or create collection
-        try:
-            self.collection = self.client.get_collection(name=collection_name)
-            logger.info(f"Loaded existing collection: {collection_name}")
-        except Exception:
-            self.collection = self.client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
+        # BM25 index and symbol table over the same chunks, kept in step by every write below;
+        # each backend keeps its own so switching backends never mixes their chunk sets
+        aux_dir = Path(db_path) if index_backend == "chroma" else Path(db_path) / index_backend
+        self.lexical_index = LexicalIndex(aux_dir / f"lexical_{collection_name}.json.gz")
+        self.symbol_index = SymbolIndex(aux_dir / f"symbols_{collection_name}.json.gz")
+        missing = [
+            index for index in (self.lexical_index, self.symbol_index) if not index.load()
+        ]
+        if missing and self.get_collection_count() > 0:
+            self._rebuild_indexes(missing)
+    
+    def _rebuild_indexes(self, indexes: list, page_size: int = 5000) -> None:
+        """Build the lexical index and/or symbol table from chunks indexed before they existed"""
+        logger.info(f"Building {len(indexes)} auxiliary index(es) for {self.collection_name}")
+        offset = 0
+        while True:
+            page = self.index.get(
+                include=["documents", "metadatas"], limit=page_size, offset=offset
             )
-            logger.info(f"Created new collection: {collection_name}")
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            documents = page.get("documents") or []
+            if self.lexical_index in indexes:
+                self.lexical_index.add_many(ids, documents)
+            if self.symbol_index in indexes:
+                self.symbol_index.update(ids, page.get("metadatas") or [], documents)
+            offset += len(ids)
+        for index in indexes:
+            index.save()
     
     def add_documents(
         self,
@@ -54,20 +93,28 @@ class VectorStore:
         if not documents:
             return
         
-        # Prepare data for ChromaDB
+        ids, texts, metadatas = self.prepare_documents(documents)
+        embeddings = self.embed_texts(texts)
+        self.upsert_embeddings(ids, embeddings, texts, metadatas)
+    
+    def prepare_documents(
+        self,
+        documents: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """Turn parsed chunks into ids, texts and flat metadata for ChromaDB"""
         ids = []
         texts = []
         metadatas = []
         
         for doc in documents:
-            # Generate unique ID
-            doc_id = f"{doc.get('file_path', 'unknown')}_{doc.get('chunk_index', 0)}"
-            ids.append(doc_id)
-            
             # Extract text content
             text = doc.get('content', doc.get('code', ''))
             texts.append(text)
             
+            # Content-derived ID: survives edits elsewhere in the file
+            chunk_key = doc.get('chunk_key') or chunk_content_key(text)
+            ids.append(make_chunk_id(str(doc.get('file_path', 'unknown')), chunk_key))
+            
             # Prepare metadata (ChromaDB doesn't support nested dicts)
             metadata = {
                 'file_path': str(doc.get('file_path', '')),
@@ -87,19 +134,89 @@ class VectorStore:
             
             metadatas.append(metadata)
         
-        # Generate embeddings
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=False)
-        embeddings_list = embeddings.tolist()
+        # Prompt tokens of each chunk, counted once here so queries never re-tokenize it
+        for metadata, count in zip(metadatas, chunk_token_counts(texts, metadatas)):
+            metadata['token_count'] = count
+        
+        return ids, texts, metadatas
+    
+    def embed_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Generate embeddings for a batch of texts, reusing cached vectors"""
+        if self.embedding_cache is None or not texts:
+            return self._encode(texts, batch_size)
+        
+        hashes = [text_hash(text) for text in texts]
+        try:
+            vectors = self.embedding_cache.get_many(self._cache_model_key, hashes)
+        except Exception as e:
+            # The cache only saves model time; indexing goes on without it
+            logger.warning(f"Embedding cache read failed, encoding every text: {e}")
+            vectors = [None] * len(texts)
+        
+        # Only texts never embedded with this model cost model time
+        missing = {}
+        for key, text, vector in zip(hashes, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        
+        if missing:
+            new_vectors = self._encode(list(missing.values()), batch_size)
+            try:
+                self.embedding_cache.put_many(self._cache_model_key, list(missing), new_vectors)
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed; {len(missing)} vectors not cached: {e}")
+            by_hash = dict(zip(missing, new_vectors))
+            vectors = [by_hash[key] if vector is None else vector for key, vector in zip(hashes, vectors)]
+            logger.debug(f"Embedding cache: {len(texts) - len(missing)} reused, {len(missing)} encoded")
+        
+        return np.vstack(vectors).astype(np.float32, copy=False)
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed normalized queries, reusing vectors cached for this model"""
+        normalized = [normalize_query(query) for query in queries]
+        vectors = query_embedding_cache.get_many(self._cache_model_key, normalized)
+        
+        missing = list(dict.fromkeys(
+            query for query, vector in zip(normalized, vectors) if vector is None
+        ))
+        if missing:
+            new_vectors = self.embedding_model.encode(missing, show_progress_bar=False)
+            query_embedding_cache.put_many(self._cache_model_key, missing, new_vectors)
+            by_query = dict(zip(missing, new_vectors))
+            vectors = [by_query[query] if vector is None else vector for query, vector in zip(normalized, vectors)]
+        
+        return np.vstack(vectors).astype(np.float32, copy=False)
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Run the embedding model"""
+        return self.embedding_model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False
+        )
+    
+    def upsert_embeddings(
+        self,
+        ids: List[str],
+        embeddings,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Write precomputed embeddings to the collection"""
+        if not ids:
+            return
         
         # Add to collection (upsert to handle duplicates)
         try:
-            self.collection.upsert(
+            self.index.upsert(
                 ids=ids,
-                embeddings=embeddings_list,
+                embeddings=embeddings,
                 documents=texts,
                 metadatas=metadatas
             )
-            logger.debug(f"Added {len(documents)} documents to vector store")
+            self.lexical_index.add_many(ids, texts)
+            self.symbol_index.update(ids, metadatas, texts)
+            logger.debug(f"Added {len(ids)} documents to vector store")
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}")
             raise
@@ -111,43 +228,202 @@ class VectorStore:
         filter_metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Search for similar documents"""
+        return self.search_similar_batch([query], n_results, filter_metadata)[0]
+    
+    def search_similar_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for several queries with one encode call and one collection query"""
+        if not queries:
+            return []
+        
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query], show_progress_bar=False)
-            query_embedding_list = query_embedding.tolist()
+            # Generate query embeddings in a single batch
+            query_embeddings = self.embed_queries(queries)
             
             # Search in collection
-            results = self.collection.query(
-                query_embeddings=query_embedding_list,
+            results = self.index.query(
+                query_embeddings=query_embeddings,
                 n_results=n_results,
                 where=filter_metadata
             )
             
-            logger.debug(f"Found {len(results.get('documents', [[]])[0])} similar documents")
-            return results
+            # Split the batched response into one Chroma-shaped result per query
+            per_query = []
+            for i in range(len(queries)):
+                per_query.append({
+                    key: [results[key][i]]
+                    for key in ("ids", "documents", "metadatas", "distances")
+                    if results.get(key) is not None
+                })
+            
+            logger.debug(f"Searched {len(queries)} queries in one batch")
+            return per_query
             
         except Exception as e:
             logger.error(f"Error searching vector store: {e}")
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+            return [
+                {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+                for _ in queries
+            ]
+    
+    def search_lexical(self, query: str, n_results: int = 5) -> Dict[str, Any]:
+        """BM25 search over code tokens; never runs the embedding model
+        
+        Distances are 1 / (1 + score) so that, as for vector results,
+        smaller means more relevant.
+        """
+        hits = self.lexical_index.search(query, n_results)
+        chunks = self._get_chunks([doc_id for doc_id, _ in hits])
+        hits = [(doc_id, score) for doc_id, score in hits if doc_id in chunks]
+        return {
+            "ids": [[doc_id for doc_id, _ in hits]],
+            "documents": [[chunks[doc_id][0] for doc_id, _ in hits]],
+            "metadatas": [[chunks[doc_id][1] for doc_id, _ in hits]],
+            "distances": [[1.0 / (1.0 + score) for _, score in hits]],
+        }
+    
+    def fuse_with_lexical(
+        self,
+        query: str,
+        vector_result: Dict[str, Any],
+        n_results: int = 5
+    ) -> Dict[str, Any]:
+        """Merge vector results with BM25 results by reciprocal rank fusion
+        
+        vector_result should hold more candidates than n_results so that
+        chunks ranked moderately by both retrievers can surface.
+        """
+        vector_ids = (vector_result.get("ids") or [[]])[0]
+        candidates = max(len(vector_ids), n_results)
+        lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, candidates)]
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids])[:n_results]
+        
+        by_id = {
+            doc_id: (document, metadata, distance)
+            for doc_id, document, metadata, distance in zip(
+                vector_ids,
+                (vector_result.get("documents") or [[]])[0],
+                (vector_result.get("metadatas") or [[]])[0],
+                (vector_result.get("distances") or [[]])[0]
+            )
+        }
+        lexical_only = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if lexical_only:
+            # Found only by keywords: no vector distance, treated as orthogonal
+            for doc_id, (document, metadata) in self._get_chunks(lexical_only).items():
+                by_id[doc_id] = (document, metadata, 1.0)
+        
+        ids = [doc_id for doc_id, _ in fused if doc_id in by_id]
+        return {
+            "ids": [ids],
+            "documents": [[by_id[doc_id][0] for doc_id in ids]],
+            "metadatas": [[by_id[doc_id][1] for doc_id in ids]],
+            "distances": [[by_id[doc_id][2] for doc_id in ids]],
+        }
+    
+    def get_definitions(self, definitions: List[SymbolDefinition]) -> Dict[str, Any]:
+        """Chroma-shaped result holding the chunks that define the given symbols"""
+        ids = list(dict.fromkeys(definition.chunk_id for definition in definitions))
+        chunks = self._get_chunks(ids)
+        ids = [doc_id for doc_id in ids if doc_id in chunks]
+        return {
+            "ids": [ids],
+            "documents": [[chunks[doc_id][0] for doc_id in ids]],
+            "metadatas": [[chunks[doc_id][1] for doc_id in ids]],
+            # Exact definitions rank ahead of anything similarity search finds
+            "distances": [[0.0] * len(ids)],
+        }
+    
+    def _get_chunks(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Map chunk ids to (document, metadata); ids no longer stored are left out"""
+        if not ids:
+            return {}
+        try:
+            page = self.index.get(ids=ids, include=["documents", "metadatas"])
+        except Exception as e:
+            logger.error(f"Error fetching chunks: {e}")
+            return {}
+        return {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(
+                page.get("ids") or [], page.get("documents") or [], page.get("metadatas") or []
+            )
+        }
+    
+    def save_indexes(self) -> None:
+        """Persist the vector index, lexical index and symbol table if they changed"""
+        self.index.save()
+        self.lexical_index.save()
+        self.symbol_index.save()
     
     def delete_by_file(self, file_path: str) -> None:
         """Delete all chunks from a specific file"""
         try:
-            self.collection.delete(
+            self.index.delete(
                 where={"file_path": file_path}
             )
+            self.lexical_index.remove_file(file_path)
+            self.symbol_index.remove_file(file_path)
             logger.info(f"Deleted chunks for file: {file_path}")
         except Exception as e:
             logger.error(f"Error deleting file chunks: {e}")
     
+    def delete_ids(self, ids: List[str]) -> None:
+        """Delete specific chunks"""
+        if not ids:
+            return
+        try:
+            self.index.delete(ids=ids)
+            self.lexical_index.remove_many(ids)
+            self.symbol_index.remove_many(ids)
+            logger.debug(f"Deleted {len(ids)} chunks")
+        except Exception as e:
+            logger.error(f"Error deleting chunks: {e}")
+    
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace metadata of existing chunks without touching their embeddings"""
+        if not ids:
+            return
+        try:
+            self.index.update(ids=ids, metadatas=metadatas)
+            # Kept chunks may have moved to other lines
+            self.symbol_index.update(ids, metadatas)
+        except Exception as e:
+            logger.error(f"Error updating chunk metadata: {e}")
+    
+    def iter_chunk_files(self, page_size: int = 5000) -> Iterator[Tuple[str, str]]:
+        """Yield (chunk id, file path) for every stored chunk"""
+        offset = 0
+        while True:
+            page = self.index.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                return
+            for chunk_id, metadata in zip(ids, page.get("metadatas") or []):
+                yield chunk_id, (metadata or {}).get("file_path", "")
+            offset += len(ids)
+    
+    def prune_auxiliary(self, live_ids: set) -> int:
+        """Drop lexical and symbol entries of chunks the vector index no longer holds"""
+        stale_docs = [doc_id for doc_id in self.lexical_index.doc_ids() if doc_id not in live_ids]
+        stale_symbols = [chunk_id for chunk_id in self.symbol_index.chunk_ids() if chunk_id not in live_ids]
+        if stale_docs:
+            self.lexical_index.remove_many(stale_docs)
+        if stale_symbols:
+            self.symbol_index.remove_many(stale_symbols)
+        return len(set(stale_docs) | set(stale_symbols))
+    
     def clear_all(self) -> None:
         """Clear all documents from the collection"""
         try:
-            self.client.delete_collection(name=self.collection_name)
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            self.index.reset()
+            self.lexical_index.clear()
+            self.symbol_index.clear()
+            self.save_indexes()
             logger.info("Cleared all documents from vector store")
         except Exception as e:
             logger.error(f"Error clearing vector store: {e}")
@@ -155,7 +431,29 @@ class VectorStore:
     def get_collection_count(self) -> int:
         """Get total number of documents in collection"""
         try:
-            return self.collection.count()
+            return self.index.count()
         except Exception as e:
             logger.error(f"Error getting collection count: {e}")
             return 0
+    
+    def estimate_memory_bytes(self) -> int:
+        """Rough resident size of this store's vector index, lexical index and symbol table
+        
+        The embedding model is shared through the registry and not counted.
+        """
+        try:
+            dimension = self.embedding_model.get_sentence_embedding_dimension() or 384
+        except Exception:
+            dimension = 384
+        vector_bytes = self.index.estimate_memory_bytes(dimension)
+        postings = self.lexical_index.get_stats()["postings"]
+        # ~100 bytes per posting dict entry, ~300 per symbol definition
+        return vector_bytes + postings * 100 + len(self.symbol_index) * 300
+    
+    def close(self) -> None:
+        """Close the vector index and release the shared embedding model held by this store"""
+        if self._model_released:
+            return
+        self._model_released = True
+        self.index.close()
+        model_registry.release(self.embedding_model_name, self.embedding_backend)